@@ -0,0 +1,106 @@
+"""
+Cold storage for finished trips
+An archived trip's rows live in a gzip-compressed SQLite file under data/archive/ and
+leave the hot database. Reads still work: the archive is decompressed on first use into
+a temporary file that is opened read-only, and a bounded LRU keeps the recent ones.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import shards
+
+# Decompressed archives kept on disk at once (least recently read removed first)
+MAX_OPEN = int(os.environ.get("ARCHIVE_CACHE_SIZE", "16"))
+
+
+def archive_dir(database_path: str) -> str:
+    return os.path.join(os.path.dirname(database_path), "archive")
+
+
+def archive_path(database_path: str, trip_id: str) -> Optional[str]:
+    if not shards.is_safe_id(trip_id):
+        return None
+    return os.path.join(archive_dir(database_path), f"{trip_id}.db.gz")
+
+
+def write_archive(source: str, target: str, trip_id: str) -> Dict[str, int]:
+    """Copy one trip out of source into a compressed single-file database at target"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, scratch = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(target))
+    os.close(fd)
+    os.remove(scratch)
+    try:
+        shards.clone_schema(source, scratch)
+        shards.copy_trip(source, scratch, trip_id)
+        conn = sqlite3.connect(scratch)
+        try:
+            # A rollback-journal file needs no -wal/-shm beside it, so it opens read-only as is
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        with open(scratch, "rb") as raw, gzip.open(target + ".tmp", "wb", compresslevel=9) as packed:
+            shutil.copyfileobj(raw, packed)
+        os.replace(target + ".tmp", target)
+        return {"raw_bytes": os.path.getsize(scratch), "archive_bytes": os.path.getsize(target)}
+    finally:
+        if os.path.exists(scratch):
+            os.remove(scratch)
+
+
+def extract(archive: str, target: str):
+    with gzip.open(archive, "rb") as packed, open(target, "wb") as raw:
+        shutil.copyfileobj(packed, raw)
+
+
+class ArchiveCache:
+    """LRU of archives decompressed into a private temporary directory"""
+
+    def __init__(self, max_open: int = MAX_OPEN):
+        self.max_open = max_open
+        self._files: "OrderedDict[str, str]" = OrderedDict()  # archive -> decompressed copy
+        self._dir: Optional[str] = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0}
+
+    def connect(self, archive: str, opener: Callable[[str], Any]):
+        """opener(path) on the decompressed copy of the archive, extracting it on first use"""
+        with self._lock:
+            local = self._files.get(archive)
+            if local is not None:
+                self._files.move_to_end(archive)
+                self.stats["hits"] += 1
+            else:
+                local = self._load(archive)
+            # Opened under the lock so the copy can't be evicted in between
+            return opener(local)
+
+    def _load(self, archive: str) -> str:
+        if self._dir is None:
+            self._dir = tempfile.mkdtemp(prefix="trip-archives-")
+        fd, local = tempfile.mkstemp(suffix=".db", dir=self._dir)
+        os.close(fd)
+        extract(archive, local)
+        self._files[archive] = local
+        self.stats["loads"] += 1
+        while len(self._files) > self.max_open:
+            _, evicted = self._files.popitem(last=False)
+            os.remove(evicted)  # open connections keep reading the unlinked file
+            self.stats["evictions"] += 1
+        return local
+
+    def discard(self, archive: str):
+        with self._lock:
+            local = self._files.pop(archive, None)
+        if local is not None and os.path.exists(local):
+            os.remove(local)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "open": len(self._files), "max_open": self.max_open}
@@ -0,0 +1,50 @@
+"""
+Async access to database.py for Trip Expense Manager
+sqlite3 calls stay blocking; they run on a dedicated, bounded thread pool so async
+routes never block the event loop and DB work doesn't queue behind (or starve) the
+Starlette threadpool that sync routes and file uploads use.
+
+    from async_db import adb, run_db
+    expenses = await adb.get_all_expenses(trip_id)   # any database.py function
+    report = await run_db(some_blocking_helper, arg)
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+import database as db
+
+# SQLite work is mostly GIL-bound, so a handful of threads is enough to overlap I/O
+DB_THREADS = int(os.environ.get("DB_THREADS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+
+T = TypeVar("T")
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking function on the DB pool and await its result"""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context (request-scoped contextvars) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, fn, *args, **kwargs))
+
+
+class AsyncDatabase:
+    """Awaitable mirror of database.py: `await adb.name(...)` runs `database.name(...)` on the DB pool"""
+
+    def __getattr__(self, name: str):
+        fn = getattr(db, name)  # looked up per call so monkeypatched functions are honoured
+        if not callable(fn) or name.startswith("_"):
+            raise AttributeError(name)
+
+        @functools.wraps(fn)
+        async def call(*args, **kwargs):
+            return await run_db(fn, *args, **kwargs)
+        return call
+
+
+adb = AsyncDatabase()
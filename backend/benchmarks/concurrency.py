@@ -0,0 +1,152 @@
+"""
+Concurrency load test against a real uvicorn server
+
+Seeds a throwaway database, starts the app in a uvicorn subprocess (so the load
+generator doesn't share its GIL) and measures:
+  * throughput and latency of concurrent GET /api/expenses and /api/participants
+  * /health latency while that load runs and while a database backup is restored
+    (a blocked event loop shows up as a /health stall)
+
+Usage:
+    python benchmarks/concurrency.py [--expenses 2000] [--clients 50] [--seconds 5]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import database as db
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "admin123")
+
+
+def seed(expenses: int) -> str:
+    trip_id = db.create_trip("Load Test")
+    people = [db.add_participant(trip_id, f"Person {i}") for i in range(8)]
+    db.apply_expense_batch(trip_id, creates=[{
+        "name": f"Expense {i}", "amount": 100.0 + i, "currency": "THB" if i % 2 else "JPY",
+        "buffer_rate": 1.0 if i % 2 else 0.25, "participant_ids": people[:(i % 8) + 1],
+    } for i in range(expenses)], updates=[], deletes=[])
+    return trip_id
+
+
+def start_server(database_path: str):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    script = (
+        "import sys, uvicorn, database; "
+        f"database.DATABASE_PATH = {database_path!r}; "
+        "from main import app; "
+        f"uvicorn.run(app, host='127.0.0.1', port={port}, log_level='warning')"
+    )
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen([sys.executable, "-c", script], cwd=backend_dir)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(base_url + "/health")
+            return server, base_url
+        except httpx.TransportError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def summarise(label: str, latencies, elapsed: float = None):
+    if not latencies:
+        print(f"  {label}: no samples")
+        return
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    rate = f"{len(latencies) / elapsed:7.1f} req/s  " if elapsed else ""
+    print(f"  {label}: {rate}p50 {statistics.median(ordered) * 1000:7.1f} ms  "
+          f"p99 {p99 * 1000:7.1f} ms  max {ordered[-1] * 1000:7.1f} ms  (n={len(latencies)})")
+
+
+async def probe_health(client: httpx.AsyncClient, stop: asyncio.Event, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.02)
+
+
+async def read_load(base_url: str, trip_id: str, clients: int, seconds: float):
+    latencies = {"/api/expenses": [], "/api/participants": []}
+    health = []
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=clients + 1)
+    async with httpx.AsyncClient(base_url=base_url, headers={"X-Trip-ID": trip_id},
+                                 limits=limits, timeout=60) as client:
+        async def worker(n: int):
+            path = "/api/participants" if n % 5 == 0 else "/api/expenses"
+            while not stop.is_set():
+                start = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies[path].append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(worker(n)) for n in range(clients)]
+        tasks.append(asyncio.create_task(probe_health(client, stop, health)))
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    for path, samples in latencies.items():
+        summarise(f"{path:<18}", samples, elapsed)
+    summarise("/health under reads", health)
+
+
+async def restore_load(base_url: str):
+    health = []
+    stop = asyncio.Event()
+    headers = {"X-Admin-Token": ADMIN_TOKEN}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=120) as client:
+        backup = (await client.get("/api/export/db")).content
+        prober = asyncio.create_task(probe_health(client, stop, health))
+        await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        response = await client.post("/api/import/db", files={"file": ("backup.zip", backup, "application/zip")})
+        response.raise_for_status()
+        took = time.perf_counter() - start
+        await asyncio.sleep(0.1)
+        stop.set()
+        await prober
+    print(f"  restore took {took * 1000:.0f} ms")
+    summarise("/health during restore", health)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DATABASE_PATH = os.path.join(tmp, "load.db")
+        db.init_db()
+        trip_id = seed(args.expenses)
+        server, base_url = start_server(db.DATABASE_PATH)
+        try:
+            print(f"{args.expenses} expenses, {args.clients} concurrent clients, {args.seconds:.0f}s")
+            asyncio.run(read_load(base_url, trip_id, args.clients, args.seconds))
+            asyncio.run(restore_load(base_url))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+End-to-end load test: synthetic trips driven through scripted user journeys
+
+Generates trips straight into a fresh database (participants, expenses in several
+currencies, a share of them invoiced and a share of those invoices paid), starts the
+real app with uvicorn and lets `--users` virtual users walk the journeys below at
+random until `--seconds` have passed. Latency percentiles and throughput are
+reported per endpoint (by route template) and written to a JSON file, so runs on
+two commits can be compared with --compare.
+
+Usage:
+    python benchmarks/load_test.py [--trips 5] [--participants 8] [--expenses 500]
+        [--currencies THB JPY USD] [--invoice-ratio 0.5] [--receipt-ratio 0.5]
+        [--users 32] [--seconds 20] [--workers 1] [--output load_test.json] [--compare old.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+import database as db
+from workers import start_server
+
+# Baht per unit; expenses in a currency carry this as their buffer rate
+RATES = {"THB": 1.0, "JPY": 0.25, "USD": 35.0, "EUR": 38.0, "KRW": 0.026, "SGD": 26.0}
+
+PAYMENT_METHODS = ("Cash", "Transfer", "Card")
+
+
+# === Synthetic data ===
+
+def generate_trip(rng: random.Random, n: int, participants: int, expenses: int, currencies: List[str],
+                  invoice_ratio: float, receipt_ratio: float) -> Dict[str, Any]:
+    """One trip written through database.py; returns what the journeys need to address it"""
+    trip_id = db.create_trip(f"Synthetic Trip {n}")
+    names = [f"Traveller {n}-{i}" for i in range(participants)]
+    people = [db.add_participant(trip_id, name) for name in names]
+    creates = []
+    for i in range(expenses):
+        currency = rng.choice(currencies)
+        creates.append({
+            "name": f"{rng.choice(('Dinner', 'Taxi', 'Hotel', 'Tickets', 'Market'))} {i}",
+            "amount": round(rng.uniform(50, 5000), 2), "currency": currency,
+            "buffer_rate": RATES.get(currency, 1.0),
+            "participant_ids": rng.sample(people, rng.randint(1, participants)),
+        })
+    expense_ids = db.apply_expense_batch(trip_id, creates=creates, updates=[], deletes=[])
+
+    invoiced = 0
+    paid = 0
+    for person in rng.sample(people, round(participants * invoice_ratio)):
+        shares = [(e["id"], e["amount"] * e["buffer_rate"] / e["total_participants"])
+                  for e in db.get_participant_expenses(person)]
+        if not shares:
+            continue
+        invoice_id = db.issue_invoice(trip_id, person, round(sum(s for _, s in shares), 2), [i for i, _ in shares])
+        invoiced += 1
+        if rng.random() < receipt_ratio:
+            total = db.get_invoice_by_id(invoice_id)["total_thb"]
+            db.issue_receipt(trip_id, person, total, rng.choice(PAYMENT_METHODS), [invoice_id])
+            paid += 1
+    return {"trip_id": trip_id, "participants": names, "participant_ids": people,
+            "expense_ids": expense_ids,
+            "invoices": invoiced, "receipts": paid}
+
+
+# === Journeys ===
+# Each step is (label, method, path, body); the label is the route template results are grouped by.
+
+def browse(rng: random.Random, trip: Dict[str, Any]):
+    """Open the trip page and flip through its tabs"""
+    name = rng.choice(trip["participants"])
+    return [
+        ("GET /api/trips/{trip_id}", "GET", f"/api/trips/{trip['trip_id']}", None),
+        ("GET /api/participants", "GET", "/api/participants", None),
+        ("GET /api/expenses", "GET", "/api/expenses", None),
+        ("GET /api/refunds/reconciliation", "GET", "/api/refunds/reconciliation", None),
+        ("GET /api/invoices/", "GET", "/api/invoices/", None),
+        ("GET /api/receipts/", "GET", "/api/receipts/", None),
+        ("GET /api/refunds/{participant_name}", "GET", f"/api/refunds/{name}", None),
+    ]
+
+
+def edit(rng: random.Random, trip: Dict[str, Any]):
+    """Add an expense, correct it, and look it up"""
+    currency = rng.choice(list(RATES))
+    body = {"name": f"Snack {rng.randint(0, 10 ** 6)}", "amount": round(rng.uniform(20, 500), 2),
+            "currency": currency, "buffer_rate": RATES[currency],
+            "participant_ids": rng.sample(trip["participant_ids"], rng.randint(1, len(trip["participant_ids"])))}
+    expense_id = rng.choice(trip["expense_ids"])
+    return [
+        ("POST /api/expenses", "POST", "/api/expenses", body),
+        ("PUT /api/expenses/{expense_id}", "PUT", f"/api/expenses/{expense_id}", body),
+        ("GET /api/expenses/{expense_id}", "GET", f"/api/expenses/{expense_id}", None),
+        ("GET /api/search", "GET", f"/api/search?q={body['name'].split()[0]}", None),
+    ]
+
+
+def bill(rng: random.Random, trip: Dict[str, Any]):
+    """Preview a participant's invoice, issue it and download the PDF"""
+    name = rng.choice(trip["participants"])
+    return [
+        ("GET /api/invoices/{participant_name}", "GET", f"/api/invoices/{name}", None),
+        ("POST /api/invoices/{participant_name}/generate", "POST", f"/api/invoices/{name}/generate", {}),
+        ("GET /api/invoices/{participant_name}/pdf", "GET", f"/api/invoices/{name}/pdf", None),
+        ("GET /api/receipts/{participant_name}", "GET", f"/api/receipts/{name}", None),
+    ]
+
+
+# Relative frequency of each journey: mostly reading, some editing, a little billing
+JOURNEYS = ((browse, 6), (edit, 3), (bill, 1))
+
+# Expected answers that aren't failures (e.g. nothing new left to invoice)
+EXPECTED = {"POST /api/invoices/{participant_name}/generate": {400}, "GET /api/invoices/{participant_name}/pdf": {404}}
+
+
+async def virtual_user(client: httpx.AsyncClient, rng: random.Random, trips: List[Dict[str, Any]],
+                       deadline: float, samples: Dict[str, Dict[str, Any]]):
+    journeys, weights = zip(*JOURNEYS)
+    while time.perf_counter() < deadline:
+        trip = rng.choice(trips)
+        journey = rng.choices(journeys, weights)[0]
+        for label, method, path, body in journey(rng, trip):
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body, headers={"X-Trip-ID": trip["trip_id"]})
+            took = time.perf_counter() - start
+            entry = samples.setdefault(label, {"latencies": [], "errors": 0})
+            entry["latencies"].append(took)
+            if response.status_code >= 400 and response.status_code not in EXPECTED.get(label, ()):
+                entry["errors"] += 1
+
+
+async def run_load(base_url: str, trips: List[Dict[str, Any]], users: int, seconds: float, seed: int):
+    samples: Dict[str, Dict[str, Any]] = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=users), timeout=120) as client:
+        started = time.perf_counter()
+        deadline = started + seconds
+        await asyncio.gather(*(virtual_user(client, random.Random(seed + n), trips, deadline, samples)
+                               for n in range(users)))
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+# === Reporting ===
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarise(samples: Dict[str, Dict[str, Any]], elapsed: float) -> Dict[str, Dict[str, float]]:
+    endpoints = {}
+    for label, entry in sorted(samples.items()):
+        ordered = sorted(entry["latencies"])
+        endpoints[label] = {
+            "requests": len(ordered),
+            "errors": entry["errors"],
+            "rps": round(len(ordered) / elapsed, 2),
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+    return endpoints
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def print_report(endpoints: Dict[str, Dict[str, float]], previous: Dict[str, Dict[str, float]] = None):
+    print(f"  {'endpoint':<48} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>6}")
+    for label, row in endpoints.items():
+        line = (f"  {label:<48} {row['rps']:>8.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                f"{row['p99_ms']:>8.1f} {row['errors']:>6}")
+        old = (previous or {}).get(label)
+        if old and old["p95_ms"]:
+            line += f"   p95 {row['p95_ms'] / old['p95_ms']:.2f}x, req/s {row['rps'] / max(old['rps'], 0.01):.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--trips", type=int, default=5)
+    parser.add_argument("--participants", type=int, default=8)
+    parser.add_argument("--expenses", type=int, default=500, help="per trip")
+    parser.add_argument("--currencies", nargs="+", default=["THB", "JPY", "USD"], choices=sorted(RATES))
+    parser.add_argument("--invoice-ratio", type=float, default=0.5, help="share of participants already invoiced")
+    parser.add_argument("--receipt-ratio", type=float, default=0.5, help="share of those invoices already paid")
+    parser.add_argument("--users", type=int, default=32, help="concurrent virtual users")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="load_test.json")
+    parser.add_argument("--compare", help="earlier JSON result to show ratios against")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DATABASE_PATH = os.path.join(tmp, "load_test.db")
+        db.init_db()
+        start = time.perf_counter()
+        trips = [generate_trip(rng, n, args.participants, args.expenses, args.currencies,
+                               args.invoice_ratio, args.receipt_ratio) for n in range(args.trips)]
+        print(f"Generated {args.trips} trips x {args.participants} participants x {args.expenses} expenses "
+              f"({sum(t['invoices'] for t in trips)} invoices, {sum(t['receipts'] for t in trips)} receipts) "
+              f"in {time.perf_counter() - start:.1f}s")
+        server, base_url = start_server(db.DATABASE_PATH, args.workers)
+        try:
+            print(f"{args.users} users for {args.seconds:.0f}s against WORKERS={args.workers}")
+            samples, elapsed = asyncio.run(run_load(base_url, trips, args.users, args.seconds, args.seed))
+        finally:
+            server.terminate()
+            server.wait()
+
+    endpoints = summarise(samples, elapsed)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["endpoints"]
+    print_report(endpoints, previous)
+    total = sum(row["requests"] for row in endpoints.values())
+    print(f"  total {total / elapsed:.1f} req/s, {sum(row['errors'] for row in endpoints.values())} errors")
+
+    result = {
+        "commit": git_commit(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "elapsed_s": round(elapsed, 2),
+        "total_rps": round(total / elapsed, 2),
+        "endpoints": endpoints,
+    }
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+PDF rendering benchmark: invoice, receipt and refund documents by line-item count
+
+Renders each document with 5, 50, 500 and 5000 items, once with the Sarabun TTF
+font (the normal path) and once with the Helvetica fallback, and reports wall
+time (best of --repeat), peak Python memory during one render (tracemalloc) and
+the size of the PDF produced. Refund statements get the item count in each of
+their two tables.
+
+Usage:
+    python benchmarks/pdf_render.py [--items 5 50 500 5000] [--repeat 3] [--output pdf_render.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_generator import FONT_PATH, PDFGenerator
+from schemas import (InvoiceData, InvoiceExpenseItem, ReceiptData, ReceiptItem, RefundActualItem,
+                     RefundCollectedItem, RefundData)
+
+TRIP_NAME = "ทริปญี่ปุ่น Japan 2025"
+
+# Item names mix Thai and Latin text, as real trips do
+NAMES = ("ค่าอาหารเย็น Dinner", "Taxi to hotel", "ตั๋วรถไฟ JR Pass", "Hotel night", "ของฝาก Souvenirs")
+
+
+def item_name(i: int) -> str:
+    return f"{NAMES[i % len(NAMES)]} {i}"
+
+
+def invoice_data(items: int) -> InvoiceData:
+    expenses = [InvoiceExpenseItem(
+        expense_id=i, name=item_name(i), original_amount=1000.0 + i, currency="JPY" if i % 2 else "THB",
+        buffer_rate=0.25 if i % 2 else 1.0, share=f"1/{i % 8 + 1}", your_share_thb=round(100.0 + i / 7, 2),
+    ) for i in range(items)]
+    total = round(sum(e.your_share_thb for e in expenses), 2)
+    return InvoiceData(participant_name="สมชาย Somchai", version=42, generated_at="2025-01-31 10:00",
+                       new_expenses=expenses, this_invoice_total=total, grand_total=total, has_new_expenses=True)
+
+
+def receipt_data(items: int) -> ReceiptData:
+    rows = [ReceiptItem(
+        expense_name=item_name(i), original_amount=1000.0 + i, currency="JPY" if i % 2 else "THB",
+        buffer_rate=0.25 if i % 2 else None, share=f"1/{i % 8 + 1}", amount_paid=round(100.0 + i / 7, 2),
+    ) for i in range(items)]
+    return ReceiptData(participant_name="สมชาย Somchai", receipt_number=7, generated_at="2025-01-31 10:00",
+                       trip_name=TRIP_NAME, items=rows, total_paid=round(sum(r.amount_paid for r in rows), 2),
+                       payment_method="Transfer")
+
+
+def refund_data(items: int) -> RefundData:
+    collected = [RefundCollectedItem(
+        expense_name=item_name(i), original_amount=1000.0 + i, currency="JPY" if i % 2 else "THB",
+        buffer_rate=0.25 if i % 2 else None, share=f"1/{i % 8 + 1}", collected_thb=round(100.0 + i / 7, 2),
+    ) for i in range(items)]
+    actual = [RefundActualItem(
+        expense_name=item_name(i), paid_amount=950.0 + i, paid_currency="JPY" if i % 2 else "THB",
+        actual_thb=round(240.0 + i / 5, 2), share=f"1/{i % 8 + 1}", your_cost_thb=round(95.0 + i / 7, 2),
+    ) for i in range(items)]
+    total_collected = round(sum(c.collected_thb for c in collected), 2)
+    total_actual = round(sum(a.your_cost_thb for a in actual), 2)
+    return RefundData(participant_name="สมชาย Somchai", generated_at="2025-01-31 10:00", trip_name=TRIP_NAME,
+                      collected_items=collected, actual_items=actual, total_collected=total_collected,
+                      total_actual=total_actual, refund_amount=round(total_collected - total_actual, 2))
+
+
+# document -> (build its data, render it with a generator)
+DOCUMENTS: Dict[str, Any] = {
+    "invoice": (invoice_data, lambda gen, data: gen.generate_invoice_pdf(data, TRIP_NAME)),
+    "receipt": (receipt_data, lambda gen, data: gen.generate_receipt_pdf(data, TRIP_NAME)),
+    "refund": (refund_data, lambda gen, data: gen.generate_refund_pdf(data)),
+}
+
+
+def profile(render: Callable[[], bytes], repeat: int) -> Dict[str, Any]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pdf = render()
+        timings.append(time.perf_counter() - start)
+    # Traced separately: tracemalloc slows allocation down too much to time under it
+    tracemalloc.start()
+    try:
+        render()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "best_ms": round(min(timings) * 1000, 1),
+        "peak_mb": round(peak / 2 ** 20, 2),
+        "bytes": len(pdf),
+        "pages": pdf.count(b"/Type /Page\n") or pdf.count(b"/Type /Page"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[5, 50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--documents", nargs="+", choices=sorted(DOCUMENTS), default=list(DOCUMENTS))
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    generators = {"sarabun": PDFGenerator(FONT_PATH), "helvetica": PDFGenerator(font_path=None)}
+    if generators["sarabun"].font_name != "Sarabun":
+        print(f"Sarabun not found at {FONT_PATH}; both runs use Helvetica")
+
+    results: List[Dict[str, Any]] = []
+    print(f"  {'document':<9} {'font':<10} {'items':>6} {'best ms':>9} {'ms/item':>8} {'peak MB':>8} {'KB':>8} {'pages':>6}")
+    for document in args.documents:
+        make, render = DOCUMENTS[document]
+        for font, generator in generators.items():
+            for items in args.items:
+                data = make(items)
+                row = {"document": document, "font": font, "items": items,
+                       **profile(lambda: render(generator, data), args.repeat)}
+                results.append(row)
+                print(f"  {document:<9} {font:<10} {items:>6} {row['best_ms']:>9.1f} {row['best_ms'] / items:>8.2f} "
+                      f"{row['peak_mb']:>8.2f} {row['bytes'] / 1024:>8.1f} {row['pages']:>6}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"repeat": args.repeat, "results": results}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
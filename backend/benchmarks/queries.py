@@ -0,0 +1,273 @@
+"""
+Query benchmarks for database.py's read functions
+
+Seeds a database with `scale` expenses, split into trips of --trip-size expenses
+with 10 participants each (half of them invoiced, half of those paid). Each query
+function is timed against the first trip, pytest-benchmark style (warm-up, then
+rounds; min/median/mean/stddev). With the trip size fixed, a function that slows
+down as the scale grows is reading more than its own trip. The EXPLAIN QUERY PLAN
+of every statement a function runs is recorded next to its timings.
+
+Results are compared with the stored baseline (benchmarks/query_baseline.json).
+The run fails (exit status 1) when a function's fastest round is over --tolerance
+times its baseline (min is the statistic least disturbed by other load), or when
+a plan starts scanning a table it used to search. Record a new baseline with
+--save-baseline once a change is understood.
+
+test_query_benchmarks.py runs the same check under pytest when QUERY_BENCHMARKS=1.
+
+Usage:
+    python benchmarks/queries.py [--scales 1000 100000 1000000] [--rounds 20]
+        [--data-dir DIR] [--tolerance 2.0] [--save-baseline]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_baseline.json")
+
+# Differences below this are timer noise, whatever the ratio
+NOISE_FLOOR_MS = 2.0
+
+PARTICIPANTS = 10
+
+
+# === Seeding ===
+
+def seed(database_path: str, scale: int, trip_size: int) -> Dict[str, Any]:
+    """Fill a fresh database; returns ids of the first trip and one of its participants and expenses"""
+    db.DATABASE_PATH = database_path
+    db.init_db()
+    first = None
+    for n in range(max(1, scale // trip_size)):
+        trip_id = db.create_trip(f"Bench Trip {n}")
+        people = [db.add_participant(trip_id, f"Person {i}") for i in range(PARTICIPANTS)]
+        expense_ids = db.apply_expense_batch(trip_id, creates=[{
+            "name": f"{('Dinner', 'Taxi', 'Hotel', 'Tickets')[i % 4]} {i}", "amount": 100.0 + i,
+            "currency": "JPY" if i % 3 else "THB", "buffer_rate": 0.25 if i % 3 else 1.0,
+            "participant_ids": people[:(i % PARTICIPANTS) + 1],
+        } for i in range(min(trip_size, scale))], updates=[], deletes=[], refresh_balances=False)
+        # Person 0 shares every expense; invoice each of the first half once, and pay half of those
+        for i, person in enumerate(people[:PARTICIPANTS // 2]):
+            mine = [e["id"] for e in db.get_participant_expenses(person)]
+            invoice_id = db.issue_invoice(trip_id, person, 100.0 * len(mine), mine)
+            if i % 2 == 0:
+                db.issue_receipt(trip_id, person, 100.0 * len(mine), "Cash", [invoice_id])
+        if first is None:
+            first = {"trip_id": trip_id, "participant_id": people[0], "expense_id": expense_ids[len(expense_ids) // 2]}
+    db.rebuild_balance_ledger()
+    db.rebuild_daily_cash_flow()
+    with sqlite3.connect(database_path) as conn:
+        conn.execute("ANALYZE")
+    return first
+
+
+def open_or_seed(data_dir: str, scale: int, trip_size: int) -> Dict[str, Any]:
+    """Seeded database for this scale, reused from data_dir when an earlier run left one"""
+    path = os.path.join(data_dir, f"queries-{scale}-{trip_size}.db")
+    ids_path = path + ".json"
+    if os.path.exists(path) and os.path.exists(ids_path):
+        db.DATABASE_PATH = path
+        db.init_db()
+        with open(ids_path) as f:
+            return json.load(f)
+    for stale in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    ids = seed(path, scale, trip_size)
+    with open(ids_path, "w") as f:
+        json.dump(ids, f)
+    return ids
+
+
+# === Query functions ===
+# name -> call against the seeded ids
+
+QUERIES: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "get_all_expenses": lambda ids: db.get_all_expenses(ids["trip_id"]),
+    "get_expense_by_id": lambda ids: db.get_expense_by_id(ids["expense_id"]),
+    "get_all_participants": lambda ids: db.get_all_participants(ids["trip_id"]),
+    "get_participant_expenses": lambda ids: db.get_participant_expenses(ids["participant_id"]),
+    "get_invoiced_expense_ids": lambda ids: db.get_invoiced_expense_ids(ids["participant_id"]),
+    "get_participant_actuals": lambda ids: db.get_participant_actuals(ids["participant_id"]),
+    "get_participant_balances": lambda ids: db.get_participant_balances(ids["trip_id"]),
+    "get_all_invoices_with_status": lambda ids: db.get_all_invoices_with_status(ids["trip_id"]),
+    "get_all_receipts": lambda ids: db.get_all_receipts(ids["trip_id"]),
+    "get_overview_stats": lambda ids: db.get_overview_stats(ids["trip_id"]),
+    "get_cash_flow_stats": lambda ids: db.get_cash_flow_stats(ids["trip_id"]),
+    "get_expense_breakdown": lambda ids: db.get_expense_breakdown(ids["trip_id"]),
+    "get_financial_dashboard_data": lambda ids: db.get_financial_dashboard_data(ids["trip_id"]),
+    "search": lambda ids: db.search(ids["trip_id"], "Dinn"),
+    "get_admin_dashboard_stats": lambda ids: db.get_admin_dashboard_stats(),
+}
+
+
+# === Measuring ===
+
+def measure(fn: Callable[[], Any], rounds: int, warmup: int = 2) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "stddev_ms": round(statistics.stdev(timings), 3) if len(timings) > 1 else 0.0,
+        "rounds": rounds,
+    }
+
+
+@contextmanager
+def traced_statements():
+    """Collect the SQL of every statement run on connections get_db opens meanwhile"""
+    statements: List[str] = []
+    original = db.get_db_connection
+
+    def connect():
+        conn = original()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    db.get_db_connection = connect
+    try:
+        yield statements
+    finally:
+        db.get_db_connection = original
+
+
+def query_plans(fn: Callable[[], Any]) -> List[str]:
+    """EXPLAIN QUERY PLAN of each distinct SELECT fn runs, one indented line per plan step"""
+    with traced_statements() as statements:
+        fn()
+    lines = []
+    conn = sqlite3.connect(db.DATABASE_PATH)
+    try:
+        for sql in dict.fromkeys(s.strip() for s in statements):
+            if not sql.upper().startswith(("SELECT", "WITH")):
+                continue
+            depth = {0: -1}
+            lines.append(" ".join(sql.split())[:120])
+            for node, parent, _, detail in conn.execute("EXPLAIN QUERY PLAN " + sql):
+                depth[node] = depth.get(parent, -1) + 1
+                lines.append("  " * (depth[node] + 1) + detail)
+    finally:
+        conn.close()
+    return lines
+
+
+def full_scans(plan: List[str]) -> set:
+    """Tables read start to finish (SCAN without an index) somewhere in the plan"""
+    return {line.split()[1] for line in (l.strip() for l in plan)
+            if line.startswith("SCAN ") and " USING " not in line}
+
+
+def run_scale(ids: Dict[str, Any], rounds: int, names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name, query in QUERIES.items():
+        if names and name not in names:
+            continue
+        call = lambda: query(ids)
+        results[name] = {**measure(call, rounds), "plan": query_plans(call)}
+    return results
+
+
+# === Baseline ===
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"scales": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(scale: int, results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any],
+                tolerance: float) -> List[str]:
+    """Human-readable failures against the baseline (functions it doesn't know about pass)"""
+    failures = []
+    known = baseline["scales"].get(str(scale), {})
+    for name, result in results.items():
+        before = known.get(name)
+        if before is None:
+            continue
+        limit = max(before["min_ms"] * tolerance, before["min_ms"] + NOISE_FLOOR_MS)
+        if result["min_ms"] > limit:
+            failures.append(f"{name} at {scale}: min {result['min_ms']:.2f} ms, "
+                            f"baseline {before['min_ms']:.2f} ms (limit {limit:.2f} ms)")
+        new_scans = full_scans(result["plan"]) - full_scans(before["plan"])
+        if new_scans:
+            failures.append(f"{name} at {scale}: now scans {', '.join(sorted(new_scans))} in full")
+    return failures
+
+
+def save_baseline(results: Dict[int, Dict[str, Dict[str, Any]]], trip_size: int, path: str = BASELINE_PATH):
+    baseline = load_baseline(path)
+    baseline["recorded_on"] = {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                               "cpus": os.cpu_count(), "trip_size": trip_size,
+                               "recorded_at": time.strftime("%Y-%m-%d")}
+    for scale, result in results.items():
+        baseline["scales"][str(scale)] = result
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=1)
+        f.write("\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--trip-size", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--only", nargs="+", choices=sorted(QUERIES), help="benchmark just these functions")
+    parser.add_argument("--data-dir", help="keep seeded databases here and reuse them on later runs")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="allowed slowdown vs the baseline")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--plans", action="store_true", help="print each function's query plan")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline()
+    results: Dict[int, Dict[str, Dict[str, Any]]] = {}
+    failures: List[str] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        for scale in args.scales:
+            start = time.perf_counter()
+            ids = open_or_seed(data_dir, scale, args.trip_size)
+            print(f"{scale} expenses ({max(1, scale // args.trip_size)} trips), ready in {time.perf_counter() - start:.1f}s")
+            results[scale] = run_scale(ids, args.rounds, args.only)
+            known = baseline["scales"].get(str(scale), {})
+            for name, result in results[scale].items():
+                before = known.get(name)
+                ratio = f"{result['min_ms'] / before['min_ms']:5.2f}x" if before and before["min_ms"] else "  new"
+                print(f"  {name:<30} median {result['median_ms']:9.3f} ms  min {result['min_ms']:9.3f} ms  "
+                      f"stddev {result['stddev_ms']:7.3f}  {ratio}")
+                if args.plans:
+                    print("\n".join("      " + line for line in result["plan"]))
+            failures += regressions(scale, results[scale], baseline, args.tolerance)
+
+    if args.save_baseline:
+        save_baseline(results, args.trip_size)
+        print(f"Saved baseline to {BASELINE_PATH}")
+        return 0
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
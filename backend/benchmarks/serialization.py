@@ -0,0 +1,78 @@
+"""
+Serialisation benchmark for the expense list response
+
+Compares FastAPI's default path (validate every row against the response_model,
+jsonable_encoder, stdlib json) with fast_json (project trusted rows, one orjson pass).
+
+Usage:
+    python benchmarks/serialization.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import fast_json
+from schemas import ExpenseResponse
+
+
+def make_rows(count: int) -> List[dict]:
+    """Rows shaped like get_all_expenses() + calculate_expense_amounts(), extra columns included"""
+    return [{
+        "id": i, "trip_id": "bench", "name": f"Expense {i}", "amount": 1000.0 + i,
+        "currency": "JPY" if i % 2 else "THB", "buffer_rate": 0.25, "status": "unpaid",
+        "participants": ["Alice", "Bob", "Carol"], "participant_ids": [1, 2, 3],
+        "participant_names": "Alice,Bob,Carol", "invoices": [i % 7] if i % 3 else [],
+        "invoice_versions": None, "is_invoiced": bool(i % 3), "category": "Food",
+        "collected_thb": 250.0 + i, "per_person_thb": 83.33, "is_paid": False,
+        "actual_date": None, "actual_method": None, "actual_amount": None,
+        "actual_currency": None, "actual_thb": None, "created_at": "2025-01-10 12:00:00",
+    } for i in range(count)]
+
+
+def default_path(rows: List[dict]) -> bytes:
+    adapter = TypeAdapter(List[ExpenseResponse])
+    validated = adapter.dump_python(adapter.validate_python(rows), mode="json")
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(rows: List[dict]) -> bytes:
+    return fast_json.dumps(fast_json.project(rows, ExpenseResponse))
+
+
+def best_of(fn, rows, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    assert json.loads(default_path(rows)) == json.loads(fast_path(rows)), "paths disagree"
+
+    encoder = "orjson" if fast_json.orjson is not None else "json (orjson not installed)"
+    print(f"{args.rows} expense rows, best of {args.repeat}, fast path encoder: {encoder}")
+    default = best_of(default_path, rows, args.repeat)
+    fast = best_of(fast_path, rows, args.repeat)
+    print(f"  response_model + jsonable_encoder + json: {default * 1000:8.1f} ms")
+    print(f"  project + fast_json:                      {fast * 1000:8.1f} ms  ({default / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
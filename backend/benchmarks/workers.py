@@ -0,0 +1,136 @@
+"""
+Multi-worker scaling test: read throughput at 1, 2, 4... server processes
+
+Seeds a throwaway database, starts `python main.py` with WORKERS=n for each n and
+drives GET /api/expenses and /api/participants from several client processes (so
+the load generator isn't the bottleneck). After each run it checks coherence: an
+expense created through one worker must invalidate every worker's ETag at once.
+
+Usage:
+    python benchmarks/workers.py [--workers 1 2 4] [--expenses 2000] [--clients 64] [--seconds 5]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+import database as db
+from concurrency import ADMIN_TOKEN, seed, summarise
+
+PATHS = ("/api/expenses", "/api/participants")
+
+
+def start_server(database_path: str, workers: int):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, DATABASE_PATH=database_path, WORKERS=str(workers), PORT=str(port))
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen([sys.executable, "main.py"], cwd=backend_dir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(400):
+        try:
+            httpx.get(base_url + "/health")
+            return server, base_url
+        except httpx.TransportError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def client_process(args):
+    """One load-generating process: `clients` connections reading for `seconds`"""
+    base_url, trip_id, clients, seconds = args
+
+    async def run():
+        latencies = {path: [] for path in PATHS}
+        deadline = time.perf_counter() + seconds
+        async with httpx.AsyncClient(base_url=base_url, headers={"X-Trip-ID": trip_id},
+                                     limits=httpx.Limits(max_connections=clients), timeout=60) as client:
+            async def worker(n: int):
+                path = PATHS[1] if n % 5 == 0 else PATHS[0]
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    response = await client.get(path)
+                    response.raise_for_status()
+                    latencies[path].append(time.perf_counter() - start)
+            await asyncio.gather(*(worker(n) for n in range(clients)))
+        return latencies
+
+    return asyncio.run(run())
+
+
+def read_load(base_url: str, trip_id: str, clients: int, seconds: float, processes: int) -> float:
+    per_process = max(1, clients // processes)
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(client_process, [(base_url, trip_id, per_process, seconds)] * processes)
+    total = 0
+    for path in PATHS:
+        samples = [s for result in results for s in result[path]]
+        total += len(samples)
+        summarise(f"{path:<18}", samples, seconds)
+    return total / seconds
+
+
+def check_coherence(base_url: str, trip_id: str, rounds: int = 20) -> int:
+    """Create expenses and count reads (on any worker) that still answer 304 to the old ETag"""
+    stale = 0
+    headers = {"X-Trip-ID": trip_id}
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        people = [p["id"] for p in client.get("/api/participants", headers=headers).json()]
+        for i in range(rounds):
+            etag = client.get("/api/expenses", headers=headers).headers["etag"]
+            client.post("/api/expenses", headers={**headers, "X-Admin-Token": ADMIN_TOKEN}, json={
+                "name": f"Coherence {i}", "amount": 100, "currency": "THB",
+                "buffer_rate": 1.0, "participant_ids": people[:1],
+            }).raise_for_status()
+            # Fresh connections spread over the workers
+            for _ in range(8):
+                with httpx.Client(base_url=base_url, timeout=30) as fresh:
+                    response = fresh.get("/api/expenses", headers={**headers, "If-None-Match": etag})
+                    stale += response.status_code == 304
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--expenses", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--client-processes", type=int, default=max(1, min(4, os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    print(f"{args.expenses} expenses, {args.clients} clients in {args.client_processes} processes, "
+          f"{args.seconds:.0f}s per run, {os.cpu_count()} CPUs")
+    baseline = None
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as tmp:
+            db.DATABASE_PATH = os.path.join(tmp, "workers.db")
+            db.init_db()
+            trip_id = seed(args.expenses)
+            server, base_url = start_server(db.DATABASE_PATH, workers)
+            try:
+                print(f"WORKERS={workers}")
+                rate = read_load(base_url, trip_id, args.clients, args.seconds, args.client_processes)
+                baseline = baseline or rate
+                print(f"  total {rate:.1f} req/s ({rate / baseline:.2f}x of first run)")
+                print(f"  stale 304s after writes: {check_coherence(base_url, trip_id)}")
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Write burst benchmark: many threads creating expenses at once
+
+Compares direct writes (each call opens its own connection and fights for SQLite's
+write lock) with the single writer queue (group commit on one connection) and with
+sharded storage (one file per trip, so writers to different trips don't contend).
+
+Usage:
+    python benchmarks/write_burst.py [--threads 32] [--writes 50] [--trips 1]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+
+def burst(threads: int, writes: int, trips: int, mode: str):
+    db.SINGLE_WRITER = mode == "single writer"
+    db.SHARDED = mode == "sharded"
+    trip_ids = [db.create_trip(f"Burst {i}") for i in range(trips)]
+    people = [db.add_participant(trip_id, "Alice") for trip_id in trip_ids]
+    errors = []
+    barrier = threading.Barrier(threads)
+
+    def worker(n: int):
+        barrier.wait()
+        for i in range(writes):
+            try:
+                db.add_expense(trip_ids[n % trips], f"Expense {n}-{i}", 100, "THB", 1.0, [people[n % trips]])
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    written = sum(len(db.get_all_expenses(trip_id)) for trip_id in trip_ids)
+    print(f"  {mode:<13}: {written / elapsed:8.1f} writes/s  {written} written  {len(errors)} errors"
+          + (f"  ({errors[0]})" if errors else ""))
+    if mode == "single writer":
+        stats = db._writer.stats
+        print(f"                 {stats['operations']} operations in {stats['transactions']} transactions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--writes", type=int, default=50)
+    parser.add_argument("--trips", type=int, default=1, help="Spread the threads over this many trips")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DATABASE_PATH = os.path.join(tmp, "burst.db")
+        db.init_db()
+        print(f"{args.threads} threads x {args.writes} add_expense calls over {args.trips} trip(s)")
+        for mode in ("direct", "single writer", "sharded"):
+            burst(args.threads, args.writes, args.trips, mode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Response cache for expensive trip aggregates (overview, reconciliation, admin dashboard)
+Entries live in an in-process LRU with a TTL and can also be kept in an on-disk SQLite
+table so they survive restarts. Committed writes invalidate the affected trip.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import database as db
+import metrics
+
+# Key for cross-trip responses (admin dashboard); invalidated by a write to any trip
+GLOBAL = "*"
+
+CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "256"))
+CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+# Set to a file path to also keep trip entries in an on-disk SQLite table
+CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH") or None
+
+_MISS = object()
+
+
+class ResponseCache:
+    """LRU + TTL cache keyed by (trip_id, endpoint, params)"""
+
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl: float = CACHE_TTL, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        # Bumped on invalidation so a value computed across a write is not stored
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "invalidations": 0}
+        if path:
+            with self._disk() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS response_cache (
+                        trip_id TEXT NOT NULL,
+                        endpoint TEXT NOT NULL,
+                        params TEXT NOT NULL,
+                        version INTEGER NOT NULL,
+                        stored_at REAL NOT NULL,
+                        value TEXT NOT NULL,
+                        PRIMARY KEY (trip_id, endpoint, params)
+                    )
+                """)
+
+    # === Public API ===
+
+    def get_or_compute(self, trip_id: str, endpoint: str, params: Hashable, compute: Callable[[], Any]) -> Any:
+        """Cached value for the key, computing and storing it on a miss. Values must be JSON-serialisable.
+
+        A hit only touches memory. Other worker processes' commits invalidate entries through
+        the change listener once database's watch thread notices them (DB_EXTERNAL_POLL), or
+        sooner when a miss here checks for them.
+        """
+        key = (trip_id, endpoint, params)
+        value = self._get(key)
+        if value is not _MISS:
+            return value
+
+        # The miss runs on the computing thread, so the cross-process check can block here
+        db.check_external_writes()
+        generation = self._generation(trip_id)
+        version = db.get_trip_version(trip_id) if self.path and trip_id != GLOBAL else None
+        value = self._disk_get(key, version) if version is not None else _MISS
+        if value is _MISS:
+            value = compute()
+            if version is not None:
+                self._disk_put(key, version, value)
+        self._put(key, value, generation)
+        return value
+
+    def invalidate(self, trip_id: Optional[str] = None):
+        """Drop entries for a trip (and all cross-trip entries), or everything when trip_id is None"""
+        with self._lock:
+            self.counters["invalidations"] += 1
+            scopes = None if trip_id is None else {trip_id, GLOBAL}
+            for scope in (scopes or set(self._generations) | {GLOBAL}):
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+            for key in [k for k in self._entries if scopes is None or k[0] in scopes]:
+                del self._entries[key]
+        if self.path:
+            try:
+                with self._disk() as conn:
+                    if trip_id is None:
+                        conn.execute("DELETE FROM response_cache")
+                    else:
+                        conn.execute("DELETE FROM response_cache WHERE trip_id = ?", (trip_id,))
+            except sqlite3.Error as e:
+                # Stale disk rows are still rejected by their version stamp
+                print(f"Response cache invalidation failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hit_ratio": round(self.counters["hits"] / lookups, 4) if lookups else None,
+                "disk": self.path is not None,
+            }
+
+    # === Memory layer ===
+
+    def _generation(self, trip_id: str) -> Tuple[int, int]:
+        with self._lock:
+            return self._generations.get(trip_id, 0), self._generations.get(GLOBAL, 0)
+
+    def _get(self, key: Tuple) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.counters["misses"] += 1
+            return _MISS
+
+    def _put(self, key: Tuple, value: Any, generation: Tuple[int, int]):
+        with self._lock:
+            if (self._generations.get(key[0], 0), self._generations.get(GLOBAL, 0)) != generation:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    # === Disk layer ===
+
+    @contextmanager
+    def _disk(self):
+        conn = sqlite3.connect(self.path, timeout=1)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _disk_get(self, key: Tuple, version: int) -> Any:
+        try:
+            with self._disk() as conn:
+                row = conn.execute(
+                    "SELECT version, stored_at, value FROM response_cache WHERE trip_id = ? AND endpoint = ? AND params = ?",
+                    (key[0], key[1], json.dumps(key[2]))
+                ).fetchone()
+        except sqlite3.Error:
+            return _MISS
+        if row is None or row[0] != version or time.time() - row[1] >= self.ttl:
+            return _MISS
+        with self._lock:
+            self.counters["disk_hits"] += 1
+        return json.loads(row[2])
+
+    def _disk_put(self, key: Tuple, version: int, value: Any):
+        try:
+            with self._disk() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (trip_id, endpoint, params, version, stored_at, value) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key[0], key[1], json.dumps(key[2]), version, time.time(), json.dumps(value))
+                )
+        except sqlite3.Error as e:
+            # The disk layer is best effort; the memory layer still works
+            print(f"Response cache write failed: {e}")
+
+
+response_cache = ResponseCache(path=CACHE_PATH)
+
+# Every committed write reports its trip here (see database._publish_changes)
+db.add_change_listener(lambda trip_id, change: response_cache.invalidate(trip_id))
+
+metrics.REGISTRY.add_collector(
+    "response_cache_lookups_total", "counter", "Response cache lookups, by layer that answered (miss = computed)",
+    lambda: [({"result": "hit"}, response_cache.counters["hits"]),
+             ({"result": "disk_hit"}, response_cache.counters["disk_hits"]),
+             ({"result": "miss"}, response_cache.counters["misses"] - response_cache.counters["disk_hits"])])
+metrics.REGISTRY.add_collector(
+    "response_cache_hit_ratio", "gauge", "Share of response cache lookups answered from memory",
+    lambda: [({}, response_cache.stats()["hit_ratio"])])
+metrics.REGISTRY.add_collector(
+    "response_cache_entries", "gauge", "Entries held in the in-memory response cache",
+    lambda: [({}, response_cache.stats()["entries"])])
@@ -0,0 +1,72 @@
+"""
+Expense categorisation for Trip Expense Manager
+Keyword lists are compiled into a single regex so each expense name is scanned once.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_CATEGORY = "General"
+
+# Order matters: the first category with a matching keyword wins
+DEFAULT_KEYWORDS: Dict[str, List[str]] = {
+    "Food": ["sushi", "ramen", "dinner", "lunch", "breakfast", "cafe", "coffee", "7-11", "lawson", "family mart", "tea", "food", "snack", "beer", "water"],
+    "Transport": ["train", "bus", "taxi", "uber", "grab", "flight", "shinkansen", "subway", "metro", "suica"],
+    "Accommodation": ["hotel", "airbnb", "booking", "agoda", "hostel", "room"],
+    "Shopping": ["gift", "souvenir", "shop", "mall", "donki", "uniqlo"],
+    "Entertainment": ["ticket", "entry", "museum", "park", "disney", "universal", "show"]
+}
+
+CATEGORY_COLORS = {
+    "Food": "#fbbf24", # Amber
+    "Transport": "#60a5fa", # Blue
+    "Accommodation": "#8b5cf6", # Purple
+    "Shopping": "#f472b6", # Pink
+    "Entertainment": "#f87171", # Red
+    "General": "#9ca3af" # Gray
+}
+
+
+class CategoryMatcher:
+    """Classify names against ordered keyword lists with one compiled pattern.
+
+    Each category becomes a named group inside a zero-width lookahead, so every
+    position in the name is tried against all keywords in a single pass and
+    overlapping matches are still seen. The lowest-numbered category that
+    matched anywhere wins, which keeps the original "first category wins" rule.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]]):
+        self.categories = list(keywords)
+        groups = []
+        for index, words in enumerate(keywords.values()):
+            words = sorted({w.lower() for w in words if w and w.strip()}, key=len, reverse=True)
+            if words:
+                groups.append(f"(?P<c{index}>{'|'.join(re.escape(w) for w in words)})")
+        self._pattern = re.compile(f"(?=(?:{'|'.join(groups)}))") if groups else None
+
+    def classify(self, name: Optional[str]) -> str:
+        if not name or self._pattern is None:
+            return DEFAULT_CATEGORY
+        best = None
+        for match in self._pattern.finditer(name.lower()):
+            index = int(match.lastgroup[1:])
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return self.categories[best] if best is not None else DEFAULT_CATEGORY
+
+
+@lru_cache(maxsize=64)
+def _compiled(frozen: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> CategoryMatcher:
+    return CategoryMatcher({cat: list(words) for cat, words in frozen})
+
+
+def get_matcher(keywords: Dict[str, List[str]]) -> CategoryMatcher:
+    """Matcher for a keyword table, compiled once per distinct table"""
+    return _compiled(tuple((cat, tuple(words)) for cat, words in keywords.items()))
+
+
+def category_color(category: str) -> str:
+    return CATEGORY_COLORS.get(category, "#ccc")
@@ -0,0 +1,160 @@
+"""
+Response compression for Trip Expense Manager
+gzip (and brotli when the `brotli` package is installed) for text responses above a
+size threshold. Bodies that already carry a Content-Encoding and event streams pass
+through untouched.
+"""
+import gzip
+import zlib
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional
+    brotli = None
+
+# Smaller bodies aren't worth the CPU or the extra header
+MINIMUM_SIZE = 1024
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/javascript", "text/javascript",
+    "text/css", "text/html", "text/plain", "text/csv", "image/svg+xml",
+)
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best encoding we support from an Accept-Encoding header (br preferred), or None"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Compress a body; `level` None means a fast setting suited to per-request use"""
+    if encoding == "br":
+        return brotli.compress(body, quality=5 if level is None else level)
+    return gzip.compress(body, compresslevel=6 if level is None else level)
+
+
+def compressor(encoding: str):
+    """Incremental compressor with compress(chunk) / finish() for streamed bodies"""
+    if encoding == "br":
+        return _BrotliStream()
+    return _GzipStream()
+
+
+class _GzipStream:
+    def __init__(self):
+        self._obj = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._obj.compress(chunk)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._obj = brotli.Compressor(quality=5)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._obj.process(chunk)
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.split(";", 1)[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+class CompressionMiddleware:
+    """Compress text responses for clients that accept it.
+
+    The body is buffered until it reaches `minimum_size` (BaseHTTPMiddleware hands it
+    over as a stream), then compressed incrementally. Shorter bodies go out as they are.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        buffered: List[bytes] = []
+        stream = None
+
+        async def send_compressed(message: Message):
+            nonlocal start, stream
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if is_compressible(headers.get("content-type", "")):
+                    headers.add_vary_header("Accept-Encoding")
+                    if "content-encoding" not in headers:
+                        start = message  # held until we know the body is big enough
+                        return
+                await send(message)
+                return
+            if message["type"] != "http.response.body" or (start is None and stream is None):
+                await send(message)
+                return
+
+            more_body = message.get("more_body", False)
+            if stream is None:
+                buffered.append(message.get("body", b""))
+                size = sum(len(chunk) for chunk in buffered)
+                if size < self.minimum_size:
+                    if more_body:
+                        return
+                    await send(start)
+                    await send({"type": "http.response.body", "body": b"".join(buffered)})
+                    return
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                if not more_body:
+                    body = compress(b"".join(buffered), encoding)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["Content-Length"]
+                await send(start)
+                stream = compressor(encoding)
+                chunk = b"".join(buffered)
+            else:
+                chunk = message.get("body", b"")
+
+            body = stream.compress(chunk)
+            if not more_body:
+                body += stream.finish()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,54 @@
+"""
+Shared fixtures for the backend tests
+
+Every test gets a fresh database under tmp_path. Files that need more seeding
+override `trip` on top of `make_trip`.
+"""
+import os
+import sys
+
+import pytest
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Empty database in tmp_path (restored to the real path afterwards)"""
+    monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "test.db"))
+    db.init_db()
+    return tmp_path
+
+
+@pytest.fixture
+def make_trip(fresh_db):
+    """Create a trip and its participants; returns (trip_id, participant ids in order)"""
+    def make(name: str = "Test Trip", participants=("Alice",)):
+        trip_id = db.create_trip(name)
+        return trip_id, [db.add_participant(trip_id, person) for person in participants]
+    return make
+
+
+@pytest.fixture
+def trip(make_trip):
+    """A trip with one participant: (trip_id, alice)"""
+    trip_id, (alice,) = make_trip()
+    return trip_id, alice
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def trip_client(trip):
+    """Test client that sends the trip's X-Trip-ID with every request"""
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app, headers={"X-Trip-ID": trip[0]})
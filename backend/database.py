@@ -4,17 +4,145 @@ Using SQLite with raw SQL for simplicity
 """
 import sqlite3
 import os
+import threading
+import functools
+import inspect
+import contextvars
+import json
+import time
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 import uuid
 from contextlib import contextmanager
 
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), "data", "trip_expenses.db")
+import archive
+import categories
+import metrics
+import shards
+import sql_trace
+from db_writer import SingleWriter
+
+DATABASE_PATH = os.environ.get("DATABASE_PATH") or os.path.join(os.path.dirname(__file__), "data", "trip_expenses.db")
+
+# Route mutating functions through one writer thread (see db_writer); 0 = write directly
+SINGLE_WRITER = os.environ.get("DB_SINGLE_WRITER", "1") != "0"
+
+# Several server processes share the database file (set by main.py / gunicorn.conf.py);
+# in-process version caches are then checked against trip_versions (see check_external_writes)
+MULTI_PROCESS = int(os.environ.get("WORKERS", "1")) > 1
+
+# One SQLite file per trip under data/trips/ plus a catalog of trips (see shards.py)
+SHARDED = os.environ.get("DB_SHARDING", "0") == "1"
+
+# Set by init_db(); False when the SQLite build has no FTS5 (search then falls back to LIKE)
+FTS_AVAILABLE = False
+
+
+# Callbacks run after a commit that changed synced rows: listener(trip_id, change)
+_change_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+
+# database.py function currently running, which the statements it executes are counted against
+_current_function: "contextvars.ContextVar[str]" = contextvars.ContextVar("current_function", default="other")
+
+
+class MeteredCursor(sqlite3.Cursor):
+    """Cursor that counts its statements for /metrics and times them for sql_trace.
+
+    A statement's time includes fetching its rows; get_db passes the finished
+    records on when its block ends.
+    """
+    _record = None
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def _run(self, method, sql, parameters):
+        function = _current_function.get()
+        metrics.db_queries.inc(function)
+        self._record = None
+        if not sql_trace.recording():
+            return method(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return method(sql, parameters)
+        finally:
+            # Changed rows for writes; reads count their rows as they're fetched
+            rows = self.rowcount if self.description is None else 0
+            record = sql_trace.record(sql, function, time.perf_counter() - start, max(rows, 0))
+            self.connection.trace_records.append(record)
+            if self.description is not None:
+                self._record = record
+
+    def fetchone(self):
+        if self._record is None:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        if self._record is None:
+            return super().fetchmany(size or self.arraysize)
+        start = time.perf_counter()
+        rows = super().fetchmany(size or self.arraysize)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        if self._record is None:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows))
+        return rows
+
+    def _fetched(self, start: float, rows: int):
+        self._record["seconds"] += time.perf_counter() - start
+        self._record["rows"] += rows
+
+
+class TrackedConnection(sqlite3.Connection):
+    """Connection that remembers which synced rows the open transaction touched"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending_changes: Dict[str, Dict[str, Any]] = {}
+        # The single writer commits its group itself; commits from inside an operation are ignored
+        self.defer_commit = False
+        self.is_open = True
+        # Statements finished since the last get_db block ended (see sql_trace)
+        self.trace_records: List[Dict[str, Any]] = []
+        metrics.db_connections.inc("opened")
+
+    def cursor(self, factory=MeteredCursor):
+        return super().cursor(factory)
+
+    # sqlite3's shortcut methods don't go through cursor(), so route them there
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not self.defer_commit:
+            super().commit()
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            metrics.db_connections.inc("closed")
+        super().close()
 
 
 def get_db_connection():
     """Get a database connection with row factory"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(DATABASE_PATH, factory=TrackedConnection)
     conn.execute("PRAGMA foreign_keys = ON")
     conn.row_factory = sqlite3.Row
     return conn
@@ -23,15 +151,215 @@ def get_db_connection():
 @contextmanager
 def get_db():
     """Context manager for database connections"""
-    conn = get_db_connection()
+    shared = _writer.current_connection()
+    if shared is not None:
+        # Inside a queued write: join the writer's transaction, which commits the group
+        try:
+            yield shared
+        finally:
+            _flush_trace(shared)
+        return
+    conn, release = _acquire()
     try:
         yield conn
         conn.commit()
     except Exception:
         conn.rollback()
+        conn.pending_changes.clear()
         raise
     finally:
-        conn.close()
+        _flush_trace(conn)
+        release(conn)
+    _publish_changes(conn)
+
+
+def _flush_trace(conn):
+    if conn.trace_records:
+        records, conn.trace_records = conn.trace_records, []
+        sql_trace.flush(records, _current_trip.get())
+
+
+def _acquire():
+    """Connection for the current trip (its archive, its own file when sharded, or the main database)"""
+    archived = _archived.get(_current_trip.get()) if _archived else None
+    if archived is not None:
+        return _archives.connect(archived, _archive_connection), TrackedConnection.close
+    if SHARDED:
+        return _shards.acquire(_database_path()), _shards.release
+    return get_db_connection(), TrackedConnection.close
+
+
+# === Sharded Storage ===
+
+# Trip whose database get_db opens in sharded mode (set per request, or by trip_scope)
+_current_trip: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("current_trip", default=None)
+
+
+@contextmanager
+def trip_scope(trip_id: Optional[str]):
+    """Direct get_db at a trip's archive or (sharded mode) file; None means the main database / catalog"""
+    token = _current_trip.set(trip_id)
+    try:
+        yield
+    finally:
+        _current_trip.reset(token)
+
+
+class TripNotFoundError(LookupError):
+    """A sharded request names a trip that has no database file"""
+
+
+def _database_path() -> str:
+    trip_id = _current_trip.get()
+    if trip_id is None:
+        return shards.catalog_path(DATABASE_PATH)
+    path = shards.shard_path(DATABASE_PATH, trip_id)
+    # Unknown trips are refused rather than read from the catalog or given a file per bogus id
+    if path is None or not _shards.exists(path):
+        raise TripNotFoundError(f"Trip {trip_id} not found")
+    return path
+
+
+def shard_exists(trip_id: str) -> bool:
+    """Whether sharded mode can open trip_id (its own file, or its archive)"""
+    if trip_id in _archived:
+        return True
+    path = shards.shard_path(DATABASE_PATH, trip_id)
+    return path is not None and _shards.exists(path)
+
+
+def _pooled_connection(path: str):
+    conn = sqlite3.connect(path, factory=TrackedConnection, check_same_thread=False)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _init_shard(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    init_db()
+
+
+_shards = shards.ShardPool(connect=_pooled_connection, initialise=_init_shard)
+
+
+def create_shard(trip_id: str) -> str:
+    """Create (or open) a trip's database file and return its path"""
+    path = shards.shard_path(DATABASE_PATH, trip_id)
+    if path is None:
+        raise ValueError(f"Invalid trip id for sharded storage: {trip_id!r}")
+    with trip_scope(trip_id):  # a new file gets the schema through init_db, which opens the current trip
+        _shards.release(_shards.acquire(path))
+    return path
+
+
+def shard_stats() -> Dict[str, Any]:
+    """Counters of the open trip database LRU (sharded mode)"""
+    return _shards.snapshot()
+
+
+def _trip_argument(index: Optional[int], args: tuple, kwargs: dict) -> Optional[str]:
+    """trip_id as passed by position or keyword (None when left out, or fn takes none)"""
+    if index is None:
+        return None
+    return args[index] if len(args) > index else kwargs.get("trip_id")
+
+
+def _scoped(fn):
+    """Decorator running fn against its trip's archive or (sharded mode) file, taken from its trip_id argument"""
+    index = list(inspect.signature(fn).parameters).index("trip_id")  # fails at import if there is none
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not (SHARDED or _archived or _frozen):
+            return fn(*args, **kwargs)
+        trip_id = _trip_argument(index, args, kwargs)
+        if trip_id is None:
+            # Optional and left out: stay on the current database (see _every_shard)
+            return fn(*args, **kwargs)
+        with trip_scope(trip_id):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _every_shard(fn):
+    """Decorator for maintenance that covers all trips when called without a trip_id.
+
+    In sharded mode no single file holds every trip, so such a call (outside any
+    trip_scope) runs fn once in each trip's file; lists and counts are combined.
+    """
+    parameters = list(inspect.signature(fn).parameters)
+    index = parameters.index("trip_id") if "trip_id" in parameters else None
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not SHARDED or _current_trip.get() is not None or _trip_argument(index, args, kwargs) is not None:
+            return fn(*args, **kwargs)
+        results = []
+        for trip_id in shards.trip_ids(DATABASE_PATH):
+            with trip_scope(trip_id):
+                results.append(fn(*args, **kwargs))
+        if all(isinstance(result, list) for result in results):
+            return [item for result in results for item in result]
+        if all(isinstance(result, int) for result in results):
+            return sum(results)
+        return None
+    return wrapper
+
+
+def _writer_connection():
+    conn = get_db_connection()
+    conn.isolation_level = None  # the writer issues BEGIN / SAVEPOINT / COMMIT itself
+    conn.defer_commit = True
+    return conn
+
+
+def _publish_committed(changes: List[Dict[str, Any]]):
+    merged: Dict[str, Dict[str, Any]] = {}
+    for pending in changes:
+        for trip_id, change in pending.items():
+            target = merged.setdefault(trip_id, {"version": change["version"], "upserted": {}, "deleted": {}})
+            target["version"] = max(target["version"], change["version"])
+            for kind in ("upserted", "deleted"):
+                for entity, ids in change[kind].items():
+                    target[kind].setdefault(entity, set()).update(ids)
+    _publish(merged)
+
+
+_writer = SingleWriter(connect=_writer_connection, target=lambda: DATABASE_PATH, on_commit=_publish_committed)
+
+
+# Trip id (None for the catalog) -> lock held by writes to that file in sharded mode
+_shard_write_locks: Dict[Optional[str], threading.RLock] = {}
+_shard_write_locks_guard = threading.Lock()
+
+
+def _shard_write_lock(trip_id: Optional[str]) -> threading.RLock:
+    with _shard_write_locks_guard:
+        lock = _shard_write_locks.get(trip_id)
+        if lock is None:
+            # Re-entrant: a write may call another write on the same trip
+            lock = _shard_write_locks[trip_id] = threading.RLock()
+        return lock
+
+
+def _write(fn):
+    """Run a mutating function on the single writer thread, waiting for its commit"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _archived or _frozen:
+            trip_id = _current_trip.get()
+            if trip_id in _archived or trip_id in _frozen:
+                raise TripArchivedError(f"Trip {trip_id} is archived; unarchive it to make changes")
+        # Sharded trips don't share a writer; each file's writes are serialised on its own lock
+        if SHARDED:
+            with _shard_write_lock(_current_trip.get()):
+                return fn(*args, **kwargs)
+        if not SINGLE_WRITER:
+            return fn(*args, **kwargs)
+        # The caller's context goes along, so the writer's statements count against this function
+        return _writer.call(contextvars.copy_context().run, fn, *args, **kwargs)
+    return wrapper
 
 
 def init_db():
@@ -41,6 +369,9 @@ def init_db():
     with get_db() as conn:
         cursor = conn.cursor()
         
+        # WAL lets readers carry on while the writer thread holds a transaction (persists in the file)
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         # 1. Trips table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS trips (
@@ -55,13 +386,17 @@ def init_db():
         for table in tables:
             cursor.execute(f"PRAGMA table_info({table})")
             columns = [info[1] for info in cursor.fetchall()]
-            if 'trip_id' not in columns:
+            if columns and 'trip_id' not in columns:
                 print(f"Adding trip_id column to {table}...")
                 cursor.execute(f"ALTER TABLE {table} ADD COLUMN trip_id TEXT")
                 # Note: We cannot easily add FOREIGN KEY constraint to existing table in SQLite without recreating it.
                 # simpler to just have the column for now and enforce in app logic or recreate tables in a proper migration.
                 # For this task, we will rely on app logic + future migrations if strictness needed.
         
+        cursor.execute("PRAGMA table_info(trips)")
+        if 'archived_at' not in [info[1] for info in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE trips ADD COLUMN archived_at TIMESTAMP")
+        
         # 3. Settings table (ensure it exists)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS settings (
@@ -112,6 +447,11 @@ def init_db():
             cursor.execute("ALTER TABLE expenses ADD COLUMN actual_currency TEXT")
             cursor.execute("ALTER TABLE expenses ADD COLUMN actual_thb REAL")
 
+        # Stored category (classified at write time)
+        if 'category' not in columns:
+            cursor.execute("ALTER TABLE expenses ADD COLUMN category TEXT")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_expenses_trip_category ON expenses(trip_id, category)")
+
         # 6. Junctions (don't need trip_id, they link by ID)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS expense_participants (
@@ -187,6 +527,130 @@ def init_db():
             )
         """)
 
+        # 12. Participant balance ledger (materialised per-participant totals)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS participant_balances (
+                participant_id INTEGER PRIMARY KEY,
+                trip_id TEXT,
+                collected_thb REAL NOT NULL DEFAULT 0,
+                invoiced_thb REAL NOT NULL DEFAULT 0,
+                paid_thb REAL NOT NULL DEFAULT 0,
+                actual_thb REAL NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (participant_id) REFERENCES participants(id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_participant_balances_trip ON participant_balances(trip_id)")
+
+        # 13. Journal (append-only log of every financial mutation)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                trip_id TEXT,
+                entity TEXT NOT NULL,
+                entity_id INTEGER,
+                action TEXT NOT NULL,
+                payload TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_journal_trip_seq ON journal(trip_id, seq)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_journal_trip_created ON journal(trip_id, created_at)")
+
+        # 14. Projection checkpoints (head state) and periodic snapshots (for historical views)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS projection_checkpoints (
+                trip_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                events_since_snapshot INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL,
+                PRIMARY KEY (trip_id, name)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS projection_snapshots (
+                trip_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                PRIMARY KEY (trip_id, name, seq)
+            )
+        """)
+
+        # 15. Daily cash flow rollup (maintained by payment/receipt writes)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS daily_cash_flow (
+                trip_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                inflow REAL NOT NULL DEFAULT 0,
+                outflow REAL NOT NULL DEFAULT 0,
+                inflow_count INTEGER NOT NULL DEFAULT 0,
+                outflow_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (trip_id, day)
+            )
+        """)
+
+        # 16. Per-trip category keyword table (falls back to categories.DEFAULT_KEYWORDS when empty)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS category_keywords (
+                trip_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                keyword TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (trip_id, category, keyword)
+            )
+        """)
+
+        # 17. Full-text search index (FTS5), kept in sync by triggers
+        _init_search_index(cursor)
+
+        # 18. Per-trip change counter for delta sync (reset_version marks a restore)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS trip_versions (
+                trip_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0,
+                reset_version INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+        # 19. Version at which each synced row last changed (deleted rows stay as tombstones)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS row_versions (
+                trip_id TEXT NOT NULL,
+                entity TEXT NOT NULL,
+                entity_id INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (trip_id, entity, entity_id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_row_versions_trip_version ON row_versions(trip_id, version)")
+
+        # 20. Stored results of POSTs made with an Idempotency-Key (response NULL = still running)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                response TEXT,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (scope, key)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at)")
+
+        # 21. Admin dashboard figures per trip, kept in the catalog by sharded storage (see sync_catalog)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS trip_stats (
+                trip_id TEXT PRIMARY KEY,
+                participant_count INTEGER NOT NULL DEFAULT 0,
+                total_spend REAL NOT NULL DEFAULT 0,
+                expense_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
         # === Migration Logic ===
         # Check if we have any trips
         cursor.execute("SELECT COUNT(*) FROM trips")
@@ -276,13 +740,45 @@ def init_db():
             cursor.execute("ALTER TABLE participants_new RENAME TO participants")
             print("Participants table upgraded.")
 
+        # === Ledger Backfill ===
+        # Existing databases (or restored backups) have no ledger rows yet
+        cursor.execute("SELECT COUNT(*) FROM participants")
+        participant_count = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM participant_balances")
+        if cursor.fetchone()[0] != participant_count:
+            print("Rebuilding participant balance ledger...")
+            cursor.execute("DELETE FROM participant_balances")
+            _refresh_balances(cursor)
+
+        # === Category Backfill ===
+        cursor.execute("SELECT DISTINCT trip_id FROM expenses WHERE category IS NULL")
+        for row in cursor.fetchall():
+            _reclassify(cursor, row[0])
+
+        # === Cash Flow Backfill ===
+        cursor.execute("SELECT COUNT(*) FROM daily_cash_flow")
+        if cursor.fetchone()[0] == 0:
+            _rebuild_cash_flow(cursor)
+
+        # === Journal Backfill ===
+        # Databases created before the journal existed get synthetic events for their current rows
+        cursor.execute("SELECT COUNT(*) FROM journal")
+        if cursor.fetchone()[0] == 0:
+            _seed_journal(cursor)
+
+    if _current_trip.get() is None:
+        _load_archived()
+
 
 # === Trip Functions ===
 
+@_write
 def create_trip(name: str) -> str:
     """Create a new trip and return its ID"""
     trip_id = str(uuid.uuid4())
-    with get_db() as conn:
+    if SHARDED:
+        create_shard(trip_id)  # the catalog picks the trip up from the commit below
+    with trip_scope(trip_id), get_db() as conn:
         cursor = conn.cursor()
         cursor.execute("INSERT INTO trips (id, name) VALUES (?, ?)", (trip_id, name))
         
@@ -291,9 +787,11 @@ def create_trip(name: str) -> str:
             "INSERT INTO settings (trip_id, default_buffer_rate, trip_name) VALUES (?, 0.25, ?)",
             (trip_id, name)
         )
+        _journal(cursor, trip_id, "trip", "created", payload={"name": name})
     return trip_id
 
 
+@_scoped
 def get_trip(trip_id: str) -> Optional[Dict[str, Any]]:
     """Get trip details"""
     with get_db() as conn:
@@ -305,36 +803,218 @@ def get_trip(trip_id: str) -> Optional[Dict[str, Any]]:
 
 def list_trips() -> List[Dict[str, Any]]:
     """List all trips"""
-    with get_db() as conn:
+    with trip_scope(None), get_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM trips ORDER BY created_at DESC")
         return [dict(row) for row in cursor.fetchall()]
 
 
+# Use subqueries to avoid Cartesian products in joins
+# Total spend calculation: THB = amount, JPY = amount * buffer_rate (exchange rate)
+_TRIP_STATS_SQL = """
+    SELECT t.*,
+        (SELECT COUNT(*) FROM participants WHERE trip_id = t.id) as participant_count,
+        (SELECT COALESCE(SUM(
+            CASE 
+                WHEN currency = 'THB' THEN amount
+                ELSE amount * buffer_rate
+            END
+        ), 0) FROM expenses WHERE trip_id = t.id) as total_spend,
+        (SELECT COUNT(*) FROM expenses WHERE trip_id = t.id) as expense_count
+    FROM trips t
+"""
+
+
 def get_admin_dashboard_stats() -> List[Dict[str, Any]]:
     """Get summarized stats for all trips for the admin dashboard"""
-    with get_db() as conn:
+    with trip_scope(None), get_db() as conn:
+        cursor = conn.cursor()
+        if SHARDED:
+            # Trip rows live in their own files; the catalog keeps their figures (sync_catalog)
+            cursor.execute("""
+                SELECT t.*,
+                    COALESCE(s.participant_count, 0) as participant_count,
+                    COALESCE(s.total_spend, 0) as total_spend,
+                    COALESCE(s.expense_count, 0) as expense_count
+                FROM trips t LEFT JOIN trip_stats s ON s.trip_id = t.id
+                ORDER BY t.created_at DESC
+            """)
+        else:
+            cursor.execute(_TRIP_STATS_SQL + " ORDER BY t.created_at DESC")
+        rows = [dict(row) for row in cursor.fetchall()]
+        if _archived and not SHARDED:
+            # Archived trips have no rows here any more; their figures were kept when they left
+            cursor.execute("SELECT * FROM trip_stats")
+            kept = {row['trip_id']: dict(row) for row in cursor.fetchall()}
+            for row in rows:
+                if row['archived_at'] and row['id'] in kept:
+                    row.update({k: v for k, v in kept[row['id']].items() if k != 'trip_id'})
+        return rows
+
+
+def sync_catalog(trip_id: str, version: Optional[int] = None):
+    """Copy a trip's name and dashboard figures from its file into the catalog (sharded mode)"""
+    if not SHARDED:
+        return
+    with trip_scope(None), get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT version FROM trip_versions WHERE trip_id = ?", (trip_id,))
+        row = cursor.fetchone()
+        if version is not None and row and row[0] >= version:
+            return  # already recorded (e.g. by the process that made the change)
+    with trip_scope(trip_id), get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(_TRIP_STATS_SQL + " WHERE t.id = ?", (trip_id,))
+        stats = cursor.fetchone()
+        cursor.execute("SELECT version FROM trip_versions WHERE trip_id = ?", (trip_id,))
+        row = cursor.fetchone()
+        current = row[0] if row else 0
+    if stats is None:
+        return
+    with trip_scope(None), get_db() as conn:
         cursor = conn.cursor()
-        # Use subqueries to avoid Cartesian products in joins
-        # Total spend calculation: THB = amount, JPY = amount * buffer_rate (exchange rate)
         cursor.execute("""
-            SELECT t.*,
-                (SELECT COUNT(*) FROM participants WHERE trip_id = t.id) as participant_count,
-                (SELECT COALESCE(SUM(
-                    CASE 
-                        WHEN currency = 'THB' THEN amount
-                        ELSE amount * buffer_rate
-                    END
-                ), 0) FROM expenses WHERE trip_id = t.id) as total_spend,
-                (SELECT COUNT(*) FROM expenses WHERE trip_id = t.id) as expense_count
-            FROM trips t
-            ORDER BY t.created_at DESC
-        """)
-        return [dict(row) for row in cursor.fetchall()]
+            INSERT INTO trips (id, name, created_at) VALUES (?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET name = excluded.name
+        """, (trip_id, stats['name'], stats['created_at']))
+        cursor.execute("""
+            INSERT OR REPLACE INTO trip_stats (trip_id, participant_count, total_spend, expense_count)
+            VALUES (?, ?, ?, ?)
+        """, (trip_id, stats['participant_count'], stats['total_spend'], stats['expense_count']))
+        # Other worker processes watch the catalog's versions (check_external_writes)
+        cursor.execute("""
+            INSERT INTO trip_versions (trip_id, version) VALUES (?, ?)
+            ON CONFLICT(trip_id) DO UPDATE SET version = MAX(version, excluded.version)
+        """, (trip_id, current))
+
+
+# === Archived Trips ===
+
+class TripArchivedError(Exception):
+    """A write was attempted on a trip whose rows are in cold storage"""
+
+
+# Trip id -> compressed archive, for trips whose rows left the hot database
+_archived: Dict[str, str] = {}
+# Trips being archived or restored: reads still work, writes are refused
+_frozen = set()
+
+_archives = archive.ArchiveCache()
+
+
+def _archive_connection(path: str):
+    conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True,
+                           factory=TrackedConnection, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _set_archived(trip_ids: List[str]):
+    paths = {trip_id: archive.archive_path(DATABASE_PATH, trip_id) for trip_id in trip_ids}
+    found = {trip_id: path for trip_id, path in paths.items() if path and os.path.exists(path)}
+    _archived.clear()
+    _archived.update(found)
+
+
+def _load_archived():
+    with trip_scope(None), get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM trips WHERE archived_at IS NOT NULL")
+        _set_archived([row[0] for row in cursor.fetchall()])
+
+
+def is_archived(trip_id: str) -> bool:
+    return trip_id in _archived
+
+
+def archive_stats() -> Dict[str, Any]:
+    """Counters of the decompressed archive LRU"""
+    return {**_archives.snapshot(), "archived_trips": len(_archived)}
+
+
+def archive_trip(trip_id: str) -> Dict[str, Any]:
+    """Move a trip's rows into a compressed archive; it stays readable but refuses writes"""
+    target = archive.archive_path(DATABASE_PATH, trip_id)
+    if target is None or trip_id in _archived or trip_id in _frozen:
+        raise ValueError("Trip is already archived")
+    _frozen.add(trip_id)
+    try:
+        if SINGLE_WRITER and not SHARDED:
+            _writer.call(lambda: None)  # writes queued before the freeze land first
+        archived_at = datetime.now().isoformat(timespec="seconds")
+        with trip_scope(trip_id), get_db() as conn:
+            cursor = conn.cursor()
+            _journal(cursor, trip_id, "trip", "archived", payload={"archived_at": archived_at})
+            cursor.execute("UPDATE trips SET archived_at = ? WHERE id = ?", (archived_at, trip_id))
+            cursor.execute(_TRIP_STATS_SQL + " WHERE t.id = ?", (trip_id,))
+            stats = dict(cursor.fetchone())
+
+        source = shards.shard_path(DATABASE_PATH, trip_id) if SHARDED else DATABASE_PATH
+        try:
+            sizes = archive.write_archive(source, target, trip_id)
+        except Exception:
+            with trip_scope(trip_id), get_db() as conn:
+                conn.execute("UPDATE trips SET archived_at = NULL WHERE id = ?", (trip_id,))
+            raise
+
+        with trip_scope(None), get_db() as conn:
+            cursor = conn.cursor()
+            if not SHARDED:
+                # The trip row and its version counter stay, so ids and ETags carry on after a restore
+                for table, _, where, params in list(shards.trip_rows(conn, trip_id)):
+                    if table not in ("trips", "trip_versions"):
+                        cursor.execute(f"DELETE FROM {table} WHERE {where}", params)
+            cursor.execute("UPDATE trips SET archived_at = ? WHERE id = ?", (archived_at, trip_id))
+            cursor.execute("""
+                INSERT OR REPLACE INTO trip_stats (trip_id, participant_count, total_spend, expense_count)
+                VALUES (?, ?, ?, ?)
+            """, (trip_id, stats['participant_count'], stats['total_spend'], stats['expense_count']))
+        if SHARDED:
+            _shards.discard(source)
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(source + suffix):
+                    os.remove(source + suffix)
+        _archived[trip_id] = target
+    finally:
+        _frozen.discard(trip_id)
+    # Same rows, new home: the archived flag still has to reach cached trip lists and other processes
+    _publish({trip_id: {"version": get_trip_version(trip_id), "upserted": {}, "deleted": {}}})
+    return {"trip_id": trip_id, "archived_at": archived_at, **sizes}
+
+
+def unarchive_trip(trip_id: str) -> Dict[str, Any]:
+    """Move an archived trip's rows back into hot storage"""
+    source = _archived.get(trip_id)
+    if source is None or trip_id in _frozen:
+        raise ValueError("Trip is not archived")
+    _frozen.add(trip_id)
+    try:
+        scratch = source[:-len(".gz")] + ".restore"
+        archive.extract(source, scratch)
+        if SHARDED:
+            os.replace(scratch, shards.shard_path(DATABASE_PATH, trip_id))
+        else:
+            try:
+                shards.copy_trip(scratch, DATABASE_PATH, trip_id)
+            finally:
+                os.remove(scratch)
+        with trip_scope(None), get_db() as conn:
+            conn.execute("UPDATE trips SET archived_at = NULL WHERE id = ?", (trip_id,))
+        del _archived[trip_id]
+        _archives.discard(source)
+        os.remove(source)
+    finally:
+        _frozen.discard(trip_id)
+    with trip_scope(trip_id), get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE trips SET archived_at = NULL WHERE id = ?", (trip_id,))
+        _journal(cursor, trip_id, "trip", "unarchived")
+    return {"trip_id": trip_id}
 
 
 # === Settings Functions ===
 
+@_scoped
 def get_settings(trip_id: str) -> Dict[str, Any]:
     with get_db() as conn:
         cursor = conn.cursor()
@@ -350,6 +1030,8 @@ def get_settings(trip_id: str) -> Dict[str, Any]:
         return dict(row)
 
 
+@_scoped
+@_write
 def update_settings(trip_id: str, default_buffer_rate: Optional[float] = None, trip_name: Optional[str] = None):
     with get_db() as conn:
         cursor = conn.cursor()
@@ -358,36 +1040,78 @@ def update_settings(trip_id: str, default_buffer_rate: Optional[float] = None, t
         if trip_name is not None:
             cursor.execute("UPDATE settings SET trip_name = ? WHERE trip_id = ?", (trip_name, trip_id))
             cursor.execute("UPDATE trips SET name = ? WHERE id = ?", (trip_name, trip_id))
+        _journal(cursor, trip_id, "settings", "updated", payload={
+            "default_buffer_rate": default_buffer_rate, "trip_name": trip_name
+        })
 
 
 # === Participant Functions ===
 
-def get_all_participants(trip_id: str) -> List[Dict[str, Any]]:
+@_scoped
+def get_all_participants(trip_id: str, participant_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM participants WHERE trip_id = ? ORDER BY name", (trip_id,))
+        id_sql, id_params = _id_filter("id", participant_ids)
+        cursor.execute(f"SELECT * FROM participants WHERE trip_id = ?{id_sql} ORDER BY name", [trip_id, *id_params])
         return [dict(row) for row in cursor.fetchall()]
 
 
+@_scoped
+@_write
 def add_participant(trip_id: str, name: str) -> int:
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute("INSERT INTO participants (trip_id, name) VALUES (?, ?)", (trip_id, name))
-        return cursor.lastrowid
+        participant_id = cursor.lastrowid
+        _refresh_balances(cursor, [participant_id])
+        _journal(cursor, trip_id, "participant", "created", participant_id, {"name": name})
+        return participant_id
 
 
+@_write
 def delete_participant(participant_id: int): # ID is global unique (auto-inc), so strictly speaking trip_id not needed for delete but good for access control if we had it
     with get_db() as conn:
         cursor = conn.cursor()
+        # Shares of co-participants grow once this participant is removed from shared expenses
+        cursor.execute("""
+            SELECT DISTINCT ep2.participant_id
+            FROM expense_participants ep
+            JOIN expense_participants ep2 ON ep.expense_id = ep2.expense_id
+            WHERE ep.participant_id = ? AND ep2.participant_id != ?
+        """, (participant_id, participant_id))
+        co_participant_ids = [row[0] for row in cursor.fetchall()]
+        trip_id = _trip_of(cursor, "participants", participant_id)
+        # Receipts cascade with the participant, so their inflows leave the rollup too
+        cursor.execute("SELECT id, date(created_at), total_thb FROM receipts WHERE participant_id = ?", (participant_id,))
+        receipt_ids = []
+        for receipt_id, day, total_thb in cursor.fetchall():
+            receipt_ids.append(receipt_id)
+            _adjust_cash_flow(cursor, trip_id, day, -1, inflow=total_thb)
+        # Rows that cascade away or lose this participant/invoice, for delta sync
+        cursor.execute("SELECT id FROM invoices WHERE participant_id = ?", (participant_id,))
+        invoice_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT expense_id FROM expense_participants WHERE participant_id = ?
+            UNION
+            SELECT ii.expense_id FROM invoice_items ii JOIN invoices i ON ii.invoice_id = i.id WHERE i.participant_id = ?
+        """, (participant_id, participant_id))
+        expense_ids = [row[0] for row in cursor.fetchall()]
         cursor.execute("DELETE FROM participants WHERE id = ?", (participant_id,))
+        _refresh_balances(cursor, co_participant_ids)
+        _touch(cursor, trip_id, "expense", expense_ids)
+        _touch(cursor, trip_id, "invoice", invoice_ids, deleted=True)
+        _touch(cursor, trip_id, "receipt", receipt_ids, deleted=True)
+        _journal(cursor, trip_id, "participant", "deleted", participant_id)
 
 
 # === Expense Functions ===
 
-def get_all_expenses(trip_id: str) -> List[Dict[str, Any]]:
+@_scoped
+def get_all_expenses(trip_id: str, expense_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
+        id_sql, id_params = _id_filter("e.id", expense_ids)
+        cursor.execute(f"""
             SELECT e.*, GROUP_CONCAT(DISTINCT p.name) as participant_names, 
                    GROUP_CONCAT(DISTINCT p.id) as participant_ids,
                    GROUP_CONCAT(DISTINCT i.version) as invoice_versions
@@ -396,10 +1120,10 @@ def get_all_expenses(trip_id: str) -> List[Dict[str, Any]]:
             LEFT JOIN participants p ON ep.participant_id = p.id
             LEFT JOIN invoice_items ii ON e.id = ii.expense_id
             LEFT JOIN invoices i ON ii.invoice_id = i.id
-            WHERE e.trip_id = ?
+            WHERE e.trip_id = ?{id_sql}
             GROUP BY e.id
             ORDER BY e.created_at DESC
-        """, (trip_id,))
+        """, [trip_id, *id_params])
         expenses = []
         for row in cursor.fetchall():
             expense = dict(row)
@@ -440,12 +1164,14 @@ def get_expense_by_id(expense_id: int) -> Optional[Dict[str, Any]]:
         return None
 
 
+@_scoped
+@_write
 def add_expense(trip_id: str, name: str, amount: float, currency: str, buffer_rate: float, participant_ids: List[int]) -> int:
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO expenses (trip_id, name, amount, currency, buffer_rate, status) VALUES (?, ?, ?, ?, ?, 'pending')",
-            (trip_id, name, amount, currency.upper(), buffer_rate)
+            "INSERT INTO expenses (trip_id, name, amount, currency, buffer_rate, status, category) VALUES (?, ?, ?, ?, ?, 'pending', ?)",
+            (trip_id, name, amount, currency.upper(), buffer_rate, _classify(cursor, trip_id, name))
         )
         expense_id = cursor.lastrowid
         
@@ -454,41 +1180,69 @@ def add_expense(trip_id: str, name: str, amount: float, currency: str, buffer_ra
                 "INSERT INTO expense_participants (expense_id, participant_id) VALUES (?, ?)",
                 (expense_id, pid)
             )
+        _refresh_balances(cursor, participant_ids)
+        _journal(cursor, trip_id, "expense", "created", expense_id, {
+            "name": name, "amount": amount, "currency": currency.upper(),
+            "buffer_rate": buffer_rate, "participant_ids": list(participant_ids)
+        })
         return expense_id
 
 
+@_write
 def update_expense(expense_id: int, name: str, amount: float, currency: str, buffer_rate: float, participant_ids: List[int]):
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "UPDATE expenses SET name = ?, amount = ?, currency = ?, buffer_rate = ? WHERE id = ?",
-            (name, amount, currency.upper(), buffer_rate, expense_id)
+            "UPDATE expenses SET name = ?, amount = ?, currency = ?, buffer_rate = ?, category = ? WHERE id = ?",
+            (name, amount, currency.upper(), buffer_rate,
+             _classify(cursor, _trip_of(cursor, "expenses", expense_id), name), expense_id)
         )
+        previous_ids = _expense_participant_ids(cursor, expense_id)
         cursor.execute("DELETE FROM expense_participants WHERE expense_id = ?", (expense_id,))
         for pid in participant_ids:
             cursor.execute(
                 "INSERT INTO expense_participants (expense_id, participant_id) VALUES (?, ?)",
                 (expense_id, pid)
             )
+        _refresh_balances(cursor, previous_ids + list(participant_ids))
+        _journal(cursor, _trip_of(cursor, "expenses", expense_id), "expense", "updated", expense_id, {
+            "name": name, "amount": amount, "currency": currency.upper(),
+            "buffer_rate": buffer_rate, "participant_ids": list(participant_ids)
+        })
 
 
+@_write
 def update_expense_status(expense_id: int, status: str):
     with get_db() as conn:
         cursor = conn.cursor()
+        _expense_cash_flow(cursor, expense_id, -1)
         cursor.execute("UPDATE expenses SET status = ? WHERE id = ?", (status, expense_id))
+        _expense_cash_flow(cursor, expense_id, 1)
+        _refresh_balances(cursor, _expense_participant_ids(cursor, expense_id))
+        _journal(cursor, _trip_of(cursor, "expenses", expense_id), "expense", "status_changed", expense_id, {"status": status})
 
 
+@_write
 def log_expense_payment(expense_id: int, date: str, method: str, actual_amount: float, actual_currency: str, actual_thb: float):
     """Log actual payment details for an expense"""
     with get_db() as conn:
         cursor = conn.cursor()
+        # Re-logging a payment replaces the previous outflow
+        _expense_cash_flow(cursor, expense_id, -1)
         cursor.execute("""
             UPDATE expenses 
             SET actual_date = ?, actual_method = ?, actual_amount = ?, actual_currency = ?, actual_thb = ?, status = 'collected'
             WHERE id = ?
         """, (date, method, actual_amount, actual_currency, actual_thb, expense_id))
+        _expense_cash_flow(cursor, expense_id, 1)
+        _refresh_balances(cursor, _expense_participant_ids(cursor, expense_id))
+        _journal(cursor, _trip_of(cursor, "expenses", expense_id), "expense", "paid", expense_id, {
+            "date": date, "method": method, "actual_amount": actual_amount,
+            "actual_currency": actual_currency, "actual_thb": actual_thb
+        })
 
 
+@_write
 def delete_expense(expense_id: int):
     with get_db() as conn:
         cursor = conn.cursor()
@@ -500,8 +1254,87 @@ def delete_expense(expense_id: int):
             
         # No more 'actuals' table to clean up
         
+        participant_ids = _expense_participant_ids(cursor, expense_id)
+        trip_id = _trip_of(cursor, "expenses", expense_id)
+        _expense_cash_flow(cursor, expense_id, -1)
+        
         # Delete expense (cascade deletes participants)
         cursor.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
+        _refresh_balances(cursor, participant_ids)
+        _journal(cursor, trip_id, "expense", "deleted", expense_id)
+
+
+@_scoped
+@_write
+def apply_expense_batch(trip_id: str, creates: List[Dict[str, Any]], updates: List[Dict[str, Any]],
+                        deletes: List[int], refresh_balances: bool = True) -> List[int]:
+    """Create, update and delete many expenses in one transaction; returns the created ids in order.
+
+    creates/updates use the add_expense/update_expense fields (updates also carry "id").
+    Raises ValueError (rolling everything back) if a deleted expense is invoiced.
+    refresh_balances=False leaves the ledger to the caller (bulk imports rebuild it once at the end).
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        matcher = categories.get_matcher(_trip_category_keywords(cursor, trip_id))
+        touched_participants = set()
+
+        # Deletes first so their outflows leave the rollup before anything else moves
+        if deletes:
+            id_sql, id_params = _id_filter("expense_id", deletes)
+            cursor.execute(f"SELECT expense_id FROM invoice_items WHERE 1{id_sql} LIMIT 1", id_params)
+            row = cursor.fetchone()
+            if row:
+                raise ValueError(f"Cannot delete expense {row[0]}: it is included in an invoice. Please delete the invoice first.")
+            for expense_id in deletes:
+                touched_participants.update(_expense_participant_ids(cursor, expense_id))
+                _expense_cash_flow(cursor, expense_id, -1)
+            cursor.executemany("DELETE FROM expenses WHERE id = ? AND trip_id = ?", [(eid, trip_id) for eid in deletes])
+
+        if updates:
+            update_ids = [u['id'] for u in updates]
+            for expense_id in update_ids:
+                touched_participants.update(_expense_participant_ids(cursor, expense_id))
+            cursor.executemany(
+                "UPDATE expenses SET name = ?, amount = ?, currency = ?, buffer_rate = ?, category = ? WHERE id = ? AND trip_id = ?",
+                [(u['name'], u['amount'], u['currency'].upper(), u['buffer_rate'], matcher.classify(u['name']), u['id'], trip_id)
+                 for u in updates]
+            )
+            cursor.executemany("DELETE FROM expense_participants WHERE expense_id = ?", [(eid,) for eid in update_ids])
+            cursor.executemany(
+                "INSERT INTO expense_participants (expense_id, participant_id) VALUES (?, ?)",
+                [(u['id'], pid) for u in updates for pid in u['participant_ids']]
+            )
+
+        created_ids: List[int] = []
+        if creates:
+            cursor.executemany(
+                "INSERT INTO expenses (trip_id, name, amount, currency, buffer_rate, status, category) VALUES (?, ?, ?, ?, ?, 'pending', ?)",
+                [(trip_id, c['name'], c['amount'], c['currency'].upper(), c['buffer_rate'], matcher.classify(c['name']))
+                 for c in creates]
+            )
+            # The write lock is held since the first insert, so ours are the newest ids
+            cursor.execute("SELECT id FROM expenses ORDER BY id DESC LIMIT ?", (len(creates),))
+            created_ids = sorted(row[0] for row in cursor.fetchall())
+            cursor.executemany(
+                "INSERT INTO expense_participants (expense_id, participant_id) VALUES (?, ?)",
+                [(eid, pid) for eid, c in zip(created_ids, creates) for pid in c['participant_ids']]
+            )
+
+        if refresh_balances:
+            for item in updates + creates:
+                touched_participants.update(item['participant_ids'])
+            _refresh_balances(cursor, list(touched_participants))
+
+        events = [("deleted", expense_id, None) for expense_id in deletes]
+        for action, items in (("updated", [(u['id'], u) for u in updates]), ("created", list(zip(created_ids, creates)))):
+            for expense_id, item in items:
+                events.append((action, expense_id, {
+                    "name": item['name'], "amount": item['amount'], "currency": item['currency'].upper(),
+                    "buffer_rate": item['buffer_rate'], "participant_ids": list(item['participant_ids'])
+                }))
+        _journal_many(cursor, trip_id, "expense", events)
+        return created_ids
 
 
 # === Invoice Functions ===
@@ -546,21 +1379,35 @@ def get_next_invoice_version(participant_id: int) -> int:
         return (result or 0) + 1
 
 
+def _begin_immediate(conn):
+    """Take the write lock before reading what a write depends on.
+
+    sqlite3 only opens its implicit transaction at the first write, so checks made before
+    it would race other connections. The single writer's connection is already inside one.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def _next_id(cursor, table: str) -> int:
+    """Estimate of the id the next row of an AUTOINCREMENT table gets, for previews only.
+
+    Issuing takes its number from the inserted row instead (see issue_invoice).
+    """
+    cursor.execute(f"""
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0),
+                   COALESCE((SELECT MAX(id) FROM {table}), 0)) + 1
+    """, (table,))
+    return cursor.fetchone()[0]
+
+
 def get_next_global_invoice_id() -> int:
-    """Estimate next invoice ID based on current max ID"""
+    """Number the next issued invoice will probably get, for previews"""
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name='invoices'")
-        row = cursor.fetchone()
-        if row:
-            return row[0] + 1
-        
-        # Fallback if no sequence yet (empty table)
-        cursor.execute("SELECT MAX(id) FROM invoices")
-        row = cursor.fetchone()
-        return (row[0] or 0) + 1
+        return _next_id(conn.cursor(), "invoices")
 
 
+@_write
 def update_invoice_pdf(invoice_id: int, pdf_path: str, version: int):
     """Update invoice with generated PDF path and confirmed version/ID"""
     with get_db() as conn:
@@ -569,6 +1416,13 @@ def update_invoice_pdf(invoice_id: int, pdf_path: str, version: int):
             "UPDATE invoices SET pdf_path = ?, version = ? WHERE id = ?",
             (pdf_path, version, invoice_id)
         )
+        trip_id = _trip_of(cursor, "invoices", invoice_id)
+        # Expenses and receipts list the invoice version
+        cursor.execute("SELECT expense_id FROM invoice_items WHERE invoice_id = ?", (invoice_id,))
+        _touch(cursor, trip_id, "expense", [row[0] for row in cursor.fetchall()])
+        cursor.execute("SELECT receipt_id FROM receipt_items WHERE invoice_id = ?", (invoice_id,))
+        _touch(cursor, trip_id, "receipt", [row[0] for row in cursor.fetchall()])
+        _journal(cursor, trip_id, "invoice", "updated", invoice_id, {"version": version})
 
 
 def get_previous_invoices(participant_id: int) -> List[Dict[str, Any]]:
@@ -582,21 +1436,66 @@ def get_previous_invoices(participant_id: int) -> List[Dict[str, Any]]:
         return [dict(row) for row in cursor.fetchall()]
 
 
+@_scoped
+@_write
 def create_invoice(trip_id: str, participant_id: int, version: int, total_thb: float, pdf_path: str, expense_ids: List[int]) -> int:
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO invoices (trip_id, participant_id, version, total_thb, pdf_path) VALUES (?, ?, ?, ?, ?)",
-            (trip_id, participant_id, version, total_thb, pdf_path)
-        )
-        invoice_id = cursor.lastrowid
-        
-        for eid in expense_ids:
-            cursor.execute(
-                "INSERT INTO invoice_items (invoice_id, expense_id) VALUES (?, ?)",
-                (invoice_id, eid)
-            )
-        return invoice_id
+        return _insert_invoice(conn.cursor(), trip_id, participant_id, version, total_thb, pdf_path, expense_ids)
+
+
+@_scoped
+@_write
+def issue_invoice(trip_id: str, participant_id: int, total_thb: float, expense_ids: List[int],
+                  idempotency=None, respond: Optional[Callable[[int], Dict[str, Any]]] = None) -> int:
+    """Create a numbered invoice (version = id) with its items in a single transaction.
+
+    With an idempotency claim, respond(invoice_id) is stored as the key's response in
+    the same transaction. Raises ValueError if any of the expenses was invoiced in the meantime.
+    """
+    try:
+        with get_db() as conn:
+            _begin_immediate(conn)
+            cursor = conn.cursor()
+            # Shared expenses are invoiced once per participant
+            id_sql, id_params = _id_filter("ii.expense_id", expense_ids)
+            cursor.execute(f"""
+                SELECT ii.expense_id FROM invoice_items ii JOIN invoices i ON ii.invoice_id = i.id
+                WHERE i.participant_id = ?{id_sql}
+            """, (participant_id, *id_params))
+            already = [row[0] for row in cursor.fetchall()]
+            if already:
+                raise ValueError(f"Expenses already invoiced: {', '.join(map(str, sorted(already)))}")
+            invoice_id = _insert_invoice(cursor, trip_id, participant_id, None, total_thb, "", expense_ids)
+            _store_idempotent_response(cursor, idempotency, respond, invoice_id)
+            return invoice_id
+    except sqlite3.IntegrityError as e:
+        raise ValueError(f"Invoice conflicts with a concurrent change: {e}")
+
+
+def _insert_invoice(cursor, trip_id: str, participant_id: int, version: Optional[int], total_thb: float,
+                    pdf_path: str, expense_ids: List[int]) -> int:
+    """Insert an invoice and its items; version None numbers it with the id AUTOINCREMENT assigns"""
+    cursor.execute(
+        "INSERT INTO invoices (trip_id, participant_id, version, total_thb, pdf_path) VALUES (?, ?, ?, ?, ?)",
+        (trip_id, participant_id, version or 0, total_thb, pdf_path)
+    )
+    invoice_id = cursor.lastrowid
+    if version is None:
+        # Same transaction, so no reader ever sees the placeholder
+        version = invoice_id
+        cursor.execute("UPDATE invoices SET version = ? WHERE id = ?", (version, invoice_id))
+    
+    cursor.executemany(
+        "INSERT INTO invoice_items (invoice_id, expense_id) VALUES (?, ?)",
+        [(invoice_id, eid) for eid in expense_ids]
+    )
+    _refresh_balances(cursor, [participant_id])
+    _touch(cursor, trip_id, "expense", expense_ids)
+    _journal(cursor, trip_id, "invoice", "created", invoice_id, {
+        "participant_id": participant_id, "version": version,
+        "total_thb": total_thb, "expense_ids": list(expense_ids)
+    })
+    return invoice_id
 
 
 def get_invoice_by_id(invoice_id: int) -> Optional[Dict[str, Any]]:
@@ -612,6 +1511,7 @@ def get_invoice_by_id(invoice_id: int) -> Optional[Dict[str, Any]]:
         return dict(row) if row else None
 
 
+@_write
 def delete_invoice(invoice_id: int):
     """Delete an invoice if not paid"""
     with get_db() as conn:
@@ -622,11 +1522,20 @@ def delete_invoice(invoice_id: int):
         if cursor.fetchone():
             raise ValueError("Cannot delete invoice that has been paid. Please void the receipt first.")
             
+        cursor.execute("SELECT participant_id, trip_id FROM invoices WHERE id = ?", (invoice_id,))
+        row = cursor.fetchone()
+        cursor.execute("SELECT expense_id FROM invoice_items WHERE invoice_id = ?", (invoice_id,))
+        expense_ids = [r[0] for r in cursor.fetchall()]
+        
         # Delete items (unlinks expenses)
         cursor.execute("DELETE FROM invoice_items WHERE invoice_id = ?", (invoice_id,))
         
         # Delete invoice
         cursor.execute("DELETE FROM invoices WHERE id = ?", (invoice_id,))
+        if row:
+            _refresh_balances(cursor, [row[0]])
+            _touch(cursor, row[1], "expense", expense_ids)
+            _journal(cursor, row[1], "invoice", "deleted", invoice_id)
 
 
 # === Receipt Functions ===
@@ -657,19 +1566,12 @@ def get_next_receipt_number(participant_id: int) -> int:
 
 
 def get_next_global_receipt_id() -> int:
-    """Estimate next receipt ID"""
+    """Number the next issued receipt will probably get, for previews"""
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name='receipts'")
-        row = cursor.fetchone()
-        if row:
-            return row[0] + 1
-            
-        cursor.execute("SELECT MAX(id) FROM receipts")
-        row = cursor.fetchone()
-        return (row[0] or 0) + 1
+        return _next_id(conn.cursor(), "receipts")
 
 
+@_write
 def update_receipt_pdf(receipt_id: int, pdf_path: str, receipt_number: int):
     """Update receipt with PDF path and confirmed number"""
     with get_db() as conn:
@@ -678,6 +1580,11 @@ def update_receipt_pdf(receipt_id: int, pdf_path: str, receipt_number: int):
             "UPDATE receipts SET pdf_path = ?, receipt_number = ? WHERE id = ?",
             (pdf_path, receipt_number, receipt_id)
         )
+        trip_id = _trip_of(cursor, "receipts", receipt_id)
+        # Invoices show the receipt number they were paid with
+        cursor.execute("SELECT invoice_id FROM receipt_items WHERE receipt_id = ?", (receipt_id,))
+        _touch(cursor, trip_id, "invoice", [row[0] for row in cursor.fetchall()])
+        _journal(cursor, trip_id, "receipt", "updated", receipt_id, {"receipt_number": receipt_number})
 
 
 def get_previous_receipts(participant_id: int) -> List[Dict[str, Any]]:
@@ -691,21 +1598,67 @@ def get_previous_receipts(participant_id: int) -> List[Dict[str, Any]]:
         return [dict(row) for row in cursor.fetchall()]
 
 
+@_scoped
+@_write
 def create_receipt(trip_id: str, participant_id: int, receipt_number: int, total_thb: float, payment_method: str, pdf_path: str, invoice_ids: List[int]) -> int:
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO receipts (trip_id, participant_id, receipt_number, total_thb, payment_method, pdf_path) VALUES (?, ?, ?, ?, ?, ?)",
-            (trip_id, participant_id, receipt_number, total_thb, payment_method, pdf_path)
-        )
-        receipt_id = cursor.lastrowid
-        
-        for inv_id in invoice_ids:
-            cursor.execute(
-                "INSERT INTO receipt_items (receipt_id, invoice_id) VALUES (?, ?)",
-                (receipt_id, inv_id)
-            )
-        return receipt_id
+        return _insert_receipt(conn.cursor(), trip_id, participant_id, receipt_number, total_thb,
+                               payment_method, pdf_path, invoice_ids)
+
+
+@_scoped
+@_write
+def issue_receipt(trip_id: str, participant_id: int, total_thb: float, payment_method: str, invoice_ids: List[int],
+                  idempotency=None, respond: Optional[Callable[[int], Dict[str, Any]]] = None) -> int:
+    """Create a numbered receipt (receipt_number = id) with its items in a single transaction.
+
+    With an idempotency claim, respond(receipt_id) is stored as the key's response in
+    the same transaction. Raises ValueError if any of the invoices was paid in the meantime.
+    """
+    try:
+        with get_db() as conn:
+            _begin_immediate(conn)
+            cursor = conn.cursor()
+            id_sql, id_params = _id_filter("invoice_id", invoice_ids)
+            cursor.execute(f"SELECT invoice_id FROM receipt_items WHERE 1{id_sql}", id_params)
+            already = [row[0] for row in cursor.fetchall()]
+            if already:
+                raise ValueError(f"Invoices already paid: {', '.join(map(str, sorted(already)))}")
+            receipt_id = _insert_receipt(cursor, trip_id, participant_id, None, total_thb, payment_method, "",
+                                         invoice_ids)
+            _store_idempotent_response(cursor, idempotency, respond, receipt_id)
+            return receipt_id
+    except sqlite3.IntegrityError as e:
+        raise ValueError(f"Receipt conflicts with a concurrent change: {e}")
+
+
+def _insert_receipt(cursor, trip_id: str, participant_id: int, receipt_number: Optional[int], total_thb: float,
+                    payment_method: str, pdf_path: str, invoice_ids: List[int]) -> int:
+    """Insert a receipt and its items; receipt_number None numbers it with the id AUTOINCREMENT assigns"""
+    cursor.execute(
+        "INSERT INTO receipts (trip_id, participant_id, receipt_number, total_thb, payment_method, pdf_path) VALUES (?, ?, ?, ?, ?, ?)",
+        (trip_id, participant_id, receipt_number or 0, total_thb, payment_method, pdf_path)
+    )
+    receipt_id = cursor.lastrowid
+    if receipt_number is None:
+        receipt_number = receipt_id
+        cursor.execute("UPDATE receipts SET receipt_number = ? WHERE id = ?", (receipt_number, receipt_id))
+    
+    cursor.executemany(
+        "INSERT INTO receipt_items (receipt_id, invoice_id) VALUES (?, ?)",
+        [(receipt_id, inv_id) for inv_id in invoice_ids]
+    )
+    _refresh_balances(cursor, [participant_id])
+    cursor.execute("SELECT date(created_at) FROM receipts WHERE id = ?", (receipt_id,))
+    day = cursor.fetchone()[0]
+    _adjust_cash_flow(cursor, trip_id, day, 1, inflow=total_thb)
+    _touch(cursor, trip_id, "invoice", invoice_ids)
+    _journal(cursor, trip_id, "receipt", "created", receipt_id, {
+        "participant_id": participant_id, "receipt_number": receipt_number,
+        "total_thb": total_thb, "payment_method": payment_method,
+        "invoice_ids": list(invoice_ids), "day": day
+    })
+    return receipt_id
 
 
 def get_receipt_by_id(receipt_id: int) -> Optional[Dict[str, Any]]:
@@ -734,16 +1687,27 @@ def get_receipt_invoices(receipt_id: int) -> List[Dict[str, Any]]:
         return [dict(row) for row in cursor.fetchall()]
 
 
+@_write
 def delete_receipt(receipt_id: int):
     """Delete (void) a receipt"""
     with get_db() as conn:
         cursor = conn.cursor()
         
+        cursor.execute("SELECT participant_id, trip_id, date(created_at), total_thb FROM receipts WHERE id = ?", (receipt_id,))
+        row = cursor.fetchone()
+        cursor.execute("SELECT invoice_id FROM receipt_items WHERE receipt_id = ?", (receipt_id,))
+        invoice_ids = [r[0] for r in cursor.fetchall()]
+        
         # Delete items (unlinks invoices)
         cursor.execute("DELETE FROM receipt_items WHERE receipt_id = ?", (receipt_id,))
         
         # Delete receipt
         cursor.execute("DELETE FROM receipts WHERE id = ?", (receipt_id,))
+        if row:
+            _refresh_balances(cursor, [row[0]])
+            _adjust_cash_flow(cursor, row[1], row[2], -1, inflow=row[3])
+            _touch(cursor, row[1], "invoice", invoice_ids)
+            _journal(cursor, row[1], "receipt", "deleted", receipt_id)
 
 
 def get_invoice_expenses(invoice_id: int) -> List[Dict[str, Any]]:
@@ -762,6 +1726,7 @@ def get_invoice_expenses(invoice_id: int) -> List[Dict[str, Any]]:
 
 # === Reconciliation Functions ===
 
+@_scoped
 def get_participant_by_name(trip_id: str, name: str) -> Optional[Dict[str, Any]]:
     with get_db() as conn:
         cursor = conn.cursor()
@@ -785,13 +1750,414 @@ def get_participant_actuals(participant_id: int) -> List[Dict[str, Any]]:
         return [dict(row) for row in cursor.fetchall()]
 
 
+# === Balance Ledger Functions ===
+
+# Recompute ledger totals from the raw tables.
+# Collected mirrors routes/refunds.py: JPY is converted with the buffer rate, anything else is THB.
+_BALANCE_SELECT = """
+    SELECT p.id, p.trip_id,
+        COALESCE((
+            SELECT SUM(CASE WHEN e.currency = 'JPY' THEN e.amount * e.buffer_rate ELSE e.amount END
+                       / (SELECT COUNT(*) FROM expense_participants WHERE expense_id = e.id))
+            FROM expenses e
+            JOIN expense_participants ep ON e.id = ep.expense_id
+            WHERE ep.participant_id = p.id
+        ), 0) as collected_thb,
+        COALESCE((SELECT SUM(total_thb) FROM invoices WHERE participant_id = p.id), 0) as invoiced_thb,
+        COALESCE((SELECT SUM(total_thb) FROM receipts WHERE participant_id = p.id), 0) as paid_thb,
+        COALESCE((
+            SELECT SUM(e.actual_thb / (SELECT COUNT(*) FROM expense_participants WHERE expense_id = e.id))
+            FROM expenses e
+            JOIN expense_participants ep ON e.id = ep.expense_id
+            WHERE ep.participant_id = p.id AND e.status = 'collected'
+        ), 0) as actual_thb
+    FROM participants p
+"""
+
+_BALANCE_COLUMNS = ('collected_thb', 'invoiced_thb', 'paid_thb', 'actual_thb')
+
+
+def _refresh_balances(cursor, participant_ids: Optional[List[int]] = None):
+    """Recompute ledger rows inside the caller's transaction (all participants if ids is None)"""
+    sql = f"""
+        INSERT OR REPLACE INTO participant_balances
+            (participant_id, trip_id, collected_thb, invoiced_thb, paid_thb, actual_thb, updated_at)
+        SELECT *, CURRENT_TIMESTAMP FROM ({_BALANCE_SELECT}
+    """
+    if participant_ids is None:
+        cursor.execute(sql + ")")
+        return
+    ids = sorted(set(participant_ids))
+    if not ids:
+        return
+    placeholders = ", ".join(["?"] * len(ids))
+    cursor.execute(sql + f" WHERE p.id IN ({placeholders}))", ids)
+
+
+def _expense_participant_ids(cursor, expense_id: int) -> List[int]:
+    cursor.execute("SELECT participant_id FROM expense_participants WHERE expense_id = ?", (expense_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+@_scoped
+def get_participant_balances(trip_id: str) -> List[Dict[str, Any]]:
+    """Get ledger rows for every participant in a trip (one indexed scan, no re-derivation)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT p.id as participant_id, p.name as participant_name,
+                   COALESCE(b.collected_thb, 0) as collected_thb,
+                   COALESCE(b.invoiced_thb, 0) as invoiced_thb,
+                   COALESCE(b.paid_thb, 0) as paid_thb,
+                   COALESCE(b.actual_thb, 0) as actual_thb
+            FROM participants p
+            LEFT JOIN participant_balances b ON b.participant_id = p.id
+            WHERE p.trip_id = ?
+            ORDER BY p.name
+        """, (trip_id,))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+@_every_shard
+@_scoped
+def verify_balance_ledger(trip_id: Optional[str] = None, tolerance: float = 0.005) -> List[Dict[str, Any]]:
+    """Compare ledger rows against freshly derived totals and return any mismatches"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        where, params = ("WHERE p.trip_id = ?", (trip_id,)) if trip_id else ("", ())
+        cursor.execute(f"""
+            SELECT expected.*, p.name as participant_name,
+                   b.participant_id IS NOT NULL as has_row,
+                   b.collected_thb as stored_collected_thb, b.invoiced_thb as stored_invoiced_thb,
+                   b.paid_thb as stored_paid_thb, b.actual_thb as stored_actual_thb
+            FROM ({_BALANCE_SELECT} {where}) expected
+            JOIN participants p ON p.id = expected.id
+            LEFT JOIN participant_balances b ON b.participant_id = expected.id
+        """, params)
+
+        mismatches = []
+        for row in cursor.fetchall():
+            row = dict(row)
+            diffs = {}
+            for col in _BALANCE_COLUMNS:
+                stored = row[f'stored_{col}']
+                if not row['has_row'] or abs((stored or 0) - row[col]) > tolerance:
+                    diffs[col] = {"stored": stored, "expected": round(row[col], 2)}
+            if diffs:
+                mismatches.append({
+                    "participant_id": row['id'],
+                    "participant_name": row['participant_name'],
+                    "trip_id": row['trip_id'],
+                    "missing": not row['has_row'],
+                    "differences": diffs
+                })
+        return mismatches
+
+
+@_every_shard
+@_scoped
+@_write
+def rebuild_balance_ledger(trip_id: Optional[str] = None) -> int:
+    """Rebuild ledger rows from scratch; returns the number of participants rebuilt"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if trip_id:
+            cursor.execute("SELECT id FROM participants WHERE trip_id = ?", (trip_id,))
+            ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DELETE FROM participant_balances WHERE trip_id = ?", (trip_id,))
+            _refresh_balances(cursor, ids)
+            return len(ids)
+
+        cursor.execute("DELETE FROM participant_balances")
+        _refresh_balances(cursor)
+        cursor.execute("SELECT COUNT(*) FROM participant_balances")
+        return cursor.fetchone()[0]
+
+
+# === Journal Functions ===
+
+def _journal(cursor, trip_id: Optional[str], entity: str, action: str, entity_id: Optional[int] = None,
+             payload: Optional[Dict[str, Any]] = None, created_at: Optional[str] = None, sync: bool = True):
+    """Append a mutation to the journal inside the caller's transaction (and mark the row for delta sync)"""
+    if sync:
+        if entity in ("trip", "settings"):
+            _touch(cursor, trip_id, "settings", [0])
+        else:
+            _touch(cursor, trip_id, entity, [entity_id], deleted=action == "deleted")
+    body = json.dumps(payload) if payload is not None else None
+    if created_at:
+        cursor.execute(
+            "INSERT INTO journal (trip_id, entity, entity_id, action, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (trip_id, entity, entity_id, action, body, created_at)
+        )
+    else:
+        cursor.execute(
+            "INSERT INTO journal (trip_id, entity, entity_id, action, payload) VALUES (?, ?, ?, ?, ?)",
+            (trip_id, entity, entity_id, action, body)
+        )
+
+
+def _journal_many(cursor, trip_id: str, entity: str, events: List[Any]):
+    """Append (action, entity_id, payload) events for one entity type with a single version bump"""
+    if not events:
+        return
+    for deleted in (False, True):
+        _touch(cursor, trip_id, entity, [eid for action, eid, _ in events if (action == "deleted") == deleted], deleted=deleted)
+    cursor.executemany(
+        "INSERT INTO journal (trip_id, entity, entity_id, action, payload) VALUES (?, ?, ?, ?, ?)",
+        [(trip_id, entity, eid, action, json.dumps(payload) if payload is not None else None)
+         for action, eid, payload in events]
+    )
+
+
+def _trip_of(cursor, table: str, row_id: int) -> Optional[str]:
+    cursor.execute(f"SELECT trip_id FROM {table} WHERE id = ?", (row_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _seed_journal(cursor):
+    """Write synthetic 'created' events for existing rows, stamped with their original timestamps"""
+    events = []
+
+    cursor.execute("SELECT id, name, created_at FROM trips")
+    for row in cursor.fetchall():
+        events.append((row['created_at'], row['id'], "trip", "created", None, {"name": row['name']}))
+
+    cursor.execute("SELECT id, trip_id, name, created_at FROM participants")
+    for row in cursor.fetchall():
+        events.append((row['created_at'], row['trip_id'], "participant", "created", row['id'], {"name": row['name']}))
+
+    cursor.execute("SELECT * FROM expenses")
+    for row in cursor.fetchall():
+        events.append((row['created_at'], row['trip_id'], "expense", "created", row['id'], {
+            "name": row['name'], "amount": row['amount'], "currency": row['currency'],
+            "buffer_rate": row['buffer_rate'],
+            "participant_ids": _expense_participant_ids(cursor, row['id'])
+        }))
+        if row['actual_date'] is not None:
+            events.append((row['created_at'], row['trip_id'], "expense", "paid", row['id'], {
+                "date": row['actual_date'], "method": row['actual_method'], "actual_amount": row['actual_amount'],
+                "actual_currency": row['actual_currency'], "actual_thb": row['actual_thb']
+            }))
+        if row['status'] != ('collected' if row['actual_date'] is not None else 'pending'):
+            events.append((row['created_at'], row['trip_id'], "expense", "status_changed", row['id'], {"status": row['status']}))
+
+    cursor.execute("SELECT * FROM invoices")
+    for row in cursor.fetchall():
+        cursor.execute("SELECT expense_id FROM invoice_items WHERE invoice_id = ?", (row['id'],))
+        events.append((row['created_at'], row['trip_id'], "invoice", "created", row['id'], {
+            "participant_id": row['participant_id'], "version": row['version'],
+            "total_thb": row['total_thb'], "expense_ids": [r[0] for r in cursor.fetchall()]
+        }))
+
+    cursor.execute("SELECT *, date(created_at) as day FROM receipts")
+    for row in cursor.fetchall():
+        cursor.execute("SELECT invoice_id FROM receipt_items WHERE receipt_id = ?", (row['id'],))
+        events.append((row['created_at'], row['trip_id'], "receipt", "created", row['id'], {
+            "participant_id": row['participant_id'], "receipt_number": row['receipt_number'],
+            "total_thb": row['total_thb'], "payment_method": row['payment_method'],
+            "invoice_ids": [r[0] for r in cursor.fetchall()], "day": row['day']
+        }))
+
+    # Stable sort keeps per-row event order (created, paid, status) for equal timestamps
+    events.sort(key=lambda e: e[0] or "")
+    for created_at, trip_id, entity, action, entity_id, payload in events:
+        _journal(cursor, trip_id, entity, action, entity_id, payload, created_at=created_at, sync=False)
+
+
+@_scoped
+def get_journal_events(trip_id: str, after_seq: int = 0, until_seq: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Get journal events for a trip in sequence order"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        sql = "SELECT * FROM journal WHERE trip_id = ? AND seq > ?"
+        params = [trip_id, after_seq]
+        if until_seq is not None:
+            sql += " AND seq <= ?"
+            params.append(until_seq)
+        cursor.execute(sql + " ORDER BY seq", params)
+        events = []
+        for row in cursor.fetchall():
+            event = dict(row)
+            event['payload'] = json.loads(event['payload']) if event['payload'] else {}
+            events.append(event)
+        return events
+
+
+@_scoped
+def get_journal_seq_at(trip_id: str, as_of: str) -> int:
+    """Last journal sequence number for a trip at or before a timestamp (0 if none)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(seq) FROM journal WHERE trip_id = ? AND created_at <= ?", (trip_id, as_of))
+        return cursor.fetchone()[0] or 0
+
+
+@_scoped
+def get_projection_checkpoint(trip_id: str, name: str) -> Optional[Dict[str, Any]]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT seq, events_since_snapshot, state FROM projection_checkpoints WHERE trip_id = ? AND name = ?",
+            (trip_id, name)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return None
+        return {"seq": row['seq'], "events_since_snapshot": row['events_since_snapshot'], "state": json.loads(row['state'])}
+
+
+@_scoped
+def get_projection_backlog(trip_id: str, names: List[str]) -> Dict[str, int]:
+    """Journal events of a trip that each named projection's checkpoint hasn't folded yet"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        backlog = {}
+        for name in names:
+            cursor.execute("""
+                SELECT COUNT(*) FROM journal WHERE trip_id = ? AND seq > COALESCE(
+                    (SELECT seq FROM projection_checkpoints WHERE trip_id = ? AND name = ?), 0)
+            """, (trip_id, trip_id, name))
+            backlog[name] = cursor.fetchone()[0]
+        return backlog
+
+
+@_scoped
+@_write
+def save_projection_checkpoint(trip_id: str, name: str, seq: int, events_since_snapshot: int,
+                               state: Dict[str, Any], snapshots: Optional[List[Any]] = None):
+    """Store the head state of a projection plus any snapshots taken while folding"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for snap_seq, snap_state in snapshots or []:
+            cursor.execute(
+                "INSERT OR IGNORE INTO projection_snapshots (trip_id, name, seq, state) VALUES (?, ?, ?, ?)",
+                (trip_id, name, snap_seq, json.dumps(snap_state))
+            )
+        # Never move a checkpoint backwards if a concurrent fold got further
+        cursor.execute("""
+            INSERT INTO projection_checkpoints (trip_id, name, seq, events_since_snapshot, state)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(trip_id, name) DO UPDATE SET
+                seq = excluded.seq,
+                events_since_snapshot = excluded.events_since_snapshot,
+                state = excluded.state
+            WHERE excluded.seq > projection_checkpoints.seq
+        """, (trip_id, name, seq, events_since_snapshot, json.dumps(state)))
+
+
+@_scoped
+def get_projection_snapshot(trip_id: str, name: str, max_seq: int) -> Optional[Dict[str, Any]]:
+    """Latest snapshot at or before max_seq"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT seq, state FROM projection_snapshots
+            WHERE trip_id = ? AND name = ? AND seq <= ?
+            ORDER BY seq DESC LIMIT 1
+        """, (trip_id, name, max_seq))
+        row = cursor.fetchone()
+        return {"seq": row['seq'], "state": json.loads(row['state'])} if row else None
+
+
+@_write
+def reset_journal():
+    """Discard the journal and projections and re-seed them from the current rows"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM projection_snapshots")
+        cursor.execute("DELETE FROM projection_checkpoints")
+        cursor.execute("DELETE FROM journal")
+        _seed_journal(cursor)
+
+
+@_write
+def reset_projections():
+    """Discard projection checkpoints and snapshots; the journal is kept and they are re-folded from it"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM projection_snapshots")
+        cursor.execute("DELETE FROM projection_checkpoints")
+        # Backups from before the journal existed bring none: seed it, as init_db does
+        cursor.execute("SELECT COUNT(*) FROM journal")
+        if cursor.fetchone()[0] == 0:
+            _seed_journal(cursor)
+
+
+@_every_shard
+@_write
+def rebuild_derived_data():
+    """Rebuild every table derived from the core rows (used after a backup restore)"""
+    rebuild_balance_ledger()
+    rebuild_daily_cash_flow()
+    rebuild_search_index()
+    reset_projections()
+    reset_sync_versions()
+    clear_idempotency_keys()
+
+
+# === Idempotency Keys ===
+
+@_write
+def claim_idempotency_key(scope: str, key: str, fingerprint: str, ttl: float, lease: float) -> Optional[Dict[str, Any]]:
+    """Reserve a key for a new request. Returns None when claimed, else the existing entry.
+
+    An entry still running after `lease` seconds (the request died) can be claimed again.
+    """
+    now = time.time()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM idempotency_keys WHERE expires_at < ?", (now,))
+        cursor.execute("SELECT fingerprint, response, created_at FROM idempotency_keys WHERE scope = ? AND key = ?",
+                       (scope, key))
+        row = cursor.fetchone()
+        if row and (row['response'] is not None or now - row['created_at'] < lease):
+            return dict(row)
+        cursor.execute("""
+            INSERT OR REPLACE INTO idempotency_keys (scope, key, fingerprint, response, created_at, expires_at)
+            VALUES (?, ?, ?, NULL, ?, ?)
+        """, (scope, key, fingerprint, now, now + ttl))
+        return None
+
+
+@_write
+def complete_idempotency_key(scope: str, key: str, response: str):
+    with get_db() as conn:
+        conn.execute("UPDATE idempotency_keys SET response = ? WHERE scope = ? AND key = ?", (response, scope, key))
+
+
+def _store_idempotent_response(cursor, claim, respond: Optional[Callable[[int], Dict[str, Any]]], document_id: int):
+    """Complete a claimed key inside the transaction that issues its document (see idempotency.Claim)"""
+    if claim is None:
+        return
+    cursor.execute("UPDATE idempotency_keys SET response = ? WHERE scope = ? AND key = ?",
+                   (json.dumps(respond(document_id)), claim.scope, claim.key))
+    claim.stored = True
+
+
+@_write
+def release_idempotency_key(scope: str, key: str):
+    """Forget a claimed key whose request failed, so the client can retry it"""
+    with get_db() as conn:
+        conn.execute("DELETE FROM idempotency_keys WHERE scope = ? AND key = ? AND response IS NULL", (scope, key))
+
+
+@_write
+def clear_idempotency_keys():
+    with get_db() as conn:
+        conn.execute("DELETE FROM idempotency_keys")
+
+
 # === Overview Functions ===
 
-def get_all_invoices_with_status(trip_id: str) -> List[Dict[str, Any]]:
+@_scoped
+def get_all_invoices_with_status(trip_id: str, invoice_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
     """Get all invoices with their payment status and receipt info"""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
+        id_sql, id_params = _id_filter("i.id", invoice_ids)
+        cursor.execute(f"""
             SELECT i.*, p.name as participant_name,
                    CASE WHEN ri.receipt_id IS NOT NULL THEN 'paid' ELSE 'unpaid' END as status,
                    r.receipt_number
@@ -799,23 +2165,25 @@ def get_all_invoices_with_status(trip_id: str) -> List[Dict[str, Any]]:
             JOIN participants p ON i.participant_id = p.id
             LEFT JOIN receipt_items ri ON i.id = ri.invoice_id
             LEFT JOIN receipts r ON ri.receipt_id = r.id
-            WHERE i.trip_id = ?
+            WHERE i.trip_id = ?{id_sql}
             ORDER BY i.created_at DESC
-        """, (trip_id,))
+        """, [trip_id, *id_params])
         return [dict(row) for row in cursor.fetchall()]
 
 
-def get_all_receipts(trip_id: str) -> List[Dict[str, Any]]:
+@_scoped
+def get_all_receipts(trip_id: str, receipt_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
     """Get all receipts with linked invoices"""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
+        id_sql, id_params = _id_filter("r.id", receipt_ids)
+        cursor.execute(f"""
             SELECT r.*, p.name as participant_name
             FROM receipts r
             JOIN participants p ON r.participant_id = p.id
-            WHERE r.trip_id = ?
+            WHERE r.trip_id = ?{id_sql}
             ORDER BY r.created_at DESC
-        """, (trip_id,))
+        """, [trip_id, *id_params])
         receipts = [dict(row) for row in cursor.fetchall()]
         
         # Get linked invoices for each receipt
@@ -832,6 +2200,7 @@ def get_all_receipts(trip_id: str) -> List[Dict[str, Any]]:
 
 
 
+@_scoped
 def get_overview_stats(trip_id: str) -> Dict[str, Any]:
     """Get overview statistics"""
     with get_db() as conn:
@@ -866,53 +2235,104 @@ def get_overview_stats(trip_id: str) -> Dict[str, Any]:
         }
 
 
+@_scoped
 def get_cash_flow_stats(trip_id: str) -> Dict[str, Any]:
-    """Get daily cash flow statistics (inflows vs outflows)"""
+    """Get daily cash flow statistics (inflows vs outflows) from the daily_cash_flow rollup"""
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Outflows (Expenses paid)
-        # We use actual_date for paid expenses
-        cursor.execute("""
-            SELECT actual_date, SUM(actual_thb) 
-            FROM expenses 
-            WHERE status = 'collected' AND actual_date IS NOT NULL AND trip_id = ?
-            GROUP BY actual_date
-        """, (trip_id,))
-        outflows = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # Inflows (Receipts generated)
+        # Inflows = receipts by day, outflows = paid expenses by actual_date.
+        # Cumulative net flow is a running window sum over the (trip_id, day) primary key.
         cursor.execute("""
-            SELECT date(created_at), SUM(total_thb) 
-            FROM receipts 
+            SELECT day,
+                   ROUND(inflow, 2) as inflow,
+                   ROUND(outflow, 2) as outflow,
+                   ROUND(SUM(inflow - outflow) OVER (ORDER BY day ROWS UNBOUNDED PRECEDING), 2) as cumulative
+            FROM daily_cash_flow
             WHERE trip_id = ?
-            GROUP BY date(created_at)
+            ORDER BY day
         """, (trip_id,))
-        inflows = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # Merge dates
-        all_dates = sorted(list(set(outflows.keys()) | set(inflows.keys())))
-        
-        inflow_list = [inflows.get(d, 0) for d in all_dates]
-        outflow_list = [outflows.get(d, 0) for d in all_dates]
+        rows = cursor.fetchall()
         
-        # Calculate cumulative net flow
-        cumulative = []
-        running_balance = 0
-        for i, o in zip(inflow_list, outflow_list):
-            net = i - o
-            running_balance += net
-            cumulative.append(running_balance)
+        cumulative = [row['cumulative'] for row in rows]
         
         return {
-            "labels": all_dates,
-            "inflow": inflow_list,
-            "outflow": outflow_list,
+            "labels": [row['day'] for row in rows],
+            "inflow": [row['inflow'] for row in rows],
+            "outflow": [row['outflow'] for row in rows],
             "cumulative": cumulative,
-            "net_position": running_balance
+            "net_position": cumulative[-1] if cumulative else 0
         }
 
 
+# === Cash Flow Rollup Functions ===
+
+def _adjust_cash_flow(cursor, trip_id: str, day: Optional[str], sign: int,
+                      inflow: Optional[float] = None, outflow: Optional[float] = None):
+    """Add (sign=1) or remove (sign=-1) one receipt inflow or expense outflow from a day's rollup row"""
+    if day is None:
+        return
+    inflow_count = sign if inflow is not None else 0
+    outflow_count = sign if outflow is not None else 0
+    cursor.execute("""
+        INSERT INTO daily_cash_flow (trip_id, day, inflow, outflow, inflow_count, outflow_count)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(trip_id, day) DO UPDATE SET
+            inflow = inflow + excluded.inflow,
+            outflow = outflow + excluded.outflow,
+            inflow_count = inflow_count + excluded.inflow_count,
+            outflow_count = outflow_count + excluded.outflow_count
+    """, (trip_id, day, sign * (inflow or 0), sign * (outflow or 0), inflow_count, outflow_count))
+    # A day disappears from the chart once nothing is left on it
+    cursor.execute("""
+        DELETE FROM daily_cash_flow
+        WHERE trip_id = ? AND day = ? AND inflow_count <= 0 AND outflow_count <= 0
+    """, (trip_id, day))
+
+
+def _expense_cash_flow(cursor, expense_id: int, sign: int):
+    """Apply a paid expense's current outflow to the rollup (call with -1 before and 1 after a change)"""
+    cursor.execute("""
+        SELECT trip_id, actual_date, actual_thb FROM expenses
+        WHERE id = ? AND status = 'collected' AND actual_date IS NOT NULL
+    """, (expense_id,))
+    row = cursor.fetchone()
+    if row:
+        _adjust_cash_flow(cursor, row['trip_id'], row['actual_date'], sign, outflow=row['actual_thb'] or 0)
+
+
+def _rebuild_cash_flow(cursor, trip_id: Optional[str] = None):
+    """Recompute rollup rows from expenses and receipts (one trip, or all when trip_id is None)"""
+    where, params = ("AND trip_id = ?", (trip_id,)) if trip_id else ("", ())
+    cursor.execute(f"DELETE FROM daily_cash_flow WHERE 1 = 1 {where}", params)
+    cursor.execute(f"""
+        INSERT INTO daily_cash_flow (trip_id, day, inflow, outflow, inflow_count, outflow_count)
+        SELECT trip_id, day, SUM(inflow), SUM(outflow), SUM(inflow_count), SUM(outflow_count)
+        FROM (
+            SELECT trip_id, actual_date as day, 0 as inflow, COALESCE(actual_thb, 0) as outflow,
+                   0 as inflow_count, 1 as outflow_count
+            FROM expenses
+            WHERE status = 'collected' AND actual_date IS NOT NULL {where}
+            UNION ALL
+            SELECT trip_id, date(created_at) as day, total_thb as inflow, 0 as outflow,
+                   1 as inflow_count, 0 as outflow_count
+            FROM receipts
+            WHERE 1 = 1 {where}
+        )
+        GROUP BY trip_id, day
+    """, params + params)
+
+
+@_every_shard
+@_scoped
+@_write
+def rebuild_daily_cash_flow(trip_id: Optional[str] = None):
+    """Rebuild the daily cash flow rollup from the raw tables"""
+    with get_db() as conn:
+        _rebuild_cash_flow(conn.cursor(), trip_id)
+
+
+@_scoped
 def get_financial_dashboard_data(trip_id: str) -> Dict[str, Any]:
     """Get high-level financial KPIs for the dashboard"""
     with get_db() as conn:
@@ -1036,59 +2456,33 @@ def get_financial_dashboard_data(trip_id: str) -> Dict[str, Any]:
         }
 
 
+@_scoped
 def get_expense_breakdown(trip_id: str) -> Dict[str, Any]:
-    """Get expense breakdown by category (heuristic)"""
+    """Get expense breakdown by stored category"""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT name, COALESCE(actual_thb, amount * buffer_rate) as val FROM expenses WHERE trip_id = ?", (trip_id,))
-        rows = cursor.fetchall()
-        
-        categories = {
-            "Food": 0,
-            "Transport": 0,
-            "Accommodation": 0,
-            "Shopping": 0,
-            "Entertainment": 0,
-            "General": 0
-        }
+        cursor.execute("""
+            SELECT COALESCE(category, ?) as category, SUM(COALESCE(actual_thb, amount * buffer_rate)) as total
+            FROM expenses
+            WHERE trip_id = ?
+            GROUP BY COALESCE(category, ?)
+        """, (categories.DEFAULT_CATEGORY, trip_id, categories.DEFAULT_CATEGORY))
+        totals = {row['category']: row['total'] or 0 for row in cursor.fetchall()}
         
-        keywords = {
-            "Food": ["sushi", "ramen", "dinner", "lunch", "breakfast", "cafe", "coffee", "7-11", "lawson", "family mart", "tea", "food", "snack", "beer", "water"],
-            "Transport": ["train", "bus", "taxi", "uber", "grab", "flight", "shinkansen", "subway", "metro", "suica"],
-            "Accommodation": ["hotel", "airbnb", "booking", "agoda", "hostel", "room"],
-            "Shopping": ["gift", "souvenir", "shop", "mall", "donki", "uniqlo"],
-            "Entertainment": ["ticket", "entry", "museum", "park", "disney", "universal", "show"]
-        }
+        # Keep the keyword table's order, with General last
+        order = list(_trip_category_keywords(cursor, trip_id)) + [categories.DEFAULT_CATEGORY]
+        order += sorted(cat for cat in totals if cat not in order)
         
-        for name, amount in rows:
-            lower_name = name.lower()
-            matched = False
-            for cat, words in keywords.items():
-                if any(w in lower_name for w in words):
-                    categories[cat] += amount
-                    matched = True
-                    break
-            if not matched:
-                categories["General"] += amount
-                
         # Filter out zero categories and format for Chart.js
         labels = []
         data = []
         colors = []
-        color_map = {
-            "Food": "#fbbf24", # Amber
-            "Transport": "#60a5fa", # Blue
-            "Accommodation": "#8b5cf6", # Purple
-            "Shopping": "#f472b6", # Pink
-            "Entertainment": "#f87171", # Red
-            "General": "#9ca3af" # Gray
-        }
-        
-        for cat, amount in categories.items():
+        for cat in order:
+            amount = totals.get(cat, 0)
             if amount > 0:
                 labels.append(cat)
                 data.append(round(amount, 2))
-                colors.append(color_map.get(cat, "#ccc"))
+                colors.append(categories.category_color(cat))
                 
         return {
             "labels": labels,
@@ -1097,5 +2491,507 @@ def get_expense_breakdown(trip_id: str) -> Dict[str, Any]:
         }
 
 
+# === Category Functions ===
+
+def _trip_category_keywords(cursor, trip_id: str) -> Dict[str, List[str]]:
+    cursor.execute("""
+        SELECT category, keyword FROM category_keywords
+        WHERE trip_id = ?
+        ORDER BY priority, keyword
+    """, (trip_id,))
+    keywords: Dict[str, List[str]] = {}
+    for row in cursor.fetchall():
+        keywords.setdefault(row['category'], []).append(row['keyword'])
+    return keywords or categories.DEFAULT_KEYWORDS
+
+
+def _classify(cursor, trip_id: Optional[str], name: str) -> str:
+    return categories.get_matcher(_trip_category_keywords(cursor, trip_id)).classify(name)
+
+
+def _reclassify(cursor, trip_id: str) -> List[int]:
+    """Re-run the trip's matcher over all its expenses; returns the ids of rows changed"""
+    matcher = categories.get_matcher(_trip_category_keywords(cursor, trip_id))
+    cursor.execute("SELECT id, name, category FROM expenses WHERE trip_id = ?", (trip_id,))
+    changes = []
+    for row in cursor.fetchall():
+        category = matcher.classify(row['name'])
+        if category != row['category']:
+            changes.append((category, row['id']))
+    cursor.executemany("UPDATE expenses SET category = ? WHERE id = ?", changes)
+    return [expense_id for _, expense_id in changes]
+
+
+@_scoped
+def get_category_keywords(trip_id: str) -> Dict[str, Any]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM category_keywords WHERE trip_id = ?", (trip_id,))
+        is_default = cursor.fetchone()[0] == 0
+        return {
+            "categories": _trip_category_keywords(cursor, trip_id),
+            "is_default": is_default
+        }
+
+
+@_scoped
+@_write
+def set_category_keywords(trip_id: str, keywords: Optional[Dict[str, List[str]]]) -> int:
+    """Replace the trip's keyword table (empty/None resets to defaults) and reclassify its expenses"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM category_keywords WHERE trip_id = ?", (trip_id,))
+        rows = []
+        for priority, (category, words) in enumerate((keywords or {}).items()):
+            for word in {w.strip().lower() for w in words if w and w.strip()}:
+                rows.append((trip_id, category, word, priority))
+        cursor.executemany(
+            "INSERT INTO category_keywords (trip_id, category, keyword, priority) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        changed_ids = _reclassify(cursor, trip_id)
+        _touch(cursor, trip_id, "expense", changed_ids)
+        # The keyword table itself is trip data too (cached/ETagged responses depend on it)
+        _bump_version(cursor, trip_id)
+        return len(changed_ids)
+
+
+# === Search Functions ===
+
+# FTS rowids encode the source row so triggers can update/delete by rowid: id * 8 + kind
+_SEARCH_KINDS = {"expense": 1, "participant": 2, "invoice": 3}
+
+_INVOICE_TITLE = "'Invoice #' || {row}.version || ' ' || COALESCE((SELECT name FROM participants WHERE id = {row}.participant_id), '')"
+
+_SEARCH_TRIGGERS = [
+    # Expenses: name
+    """CREATE TRIGGER IF NOT EXISTS search_expenses_ai AFTER INSERT ON expenses BEGIN
+        INSERT INTO search_index (rowid, title, trip_id, entity, entity_id)
+        VALUES (new.id * 8 + 1, new.name, new.trip_id, 'expense', new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_expenses_au AFTER UPDATE OF name, trip_id ON expenses BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 8 + 1;
+        INSERT INTO search_index (rowid, title, trip_id, entity, entity_id)
+        VALUES (new.id * 8 + 1, new.name, new.trip_id, 'expense', new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_expenses_ad AFTER DELETE ON expenses BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 8 + 1;
+    END""",
+    # Participants: name
+    """CREATE TRIGGER IF NOT EXISTS search_participants_ai AFTER INSERT ON participants BEGIN
+        INSERT INTO search_index (rowid, title, trip_id, entity, entity_id)
+        VALUES (new.id * 8 + 2, new.name, new.trip_id, 'participant', new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_participants_au AFTER UPDATE OF name, trip_id ON participants BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 8 + 2;
+        INSERT INTO search_index (rowid, title, trip_id, entity, entity_id)
+        VALUES (new.id * 8 + 2, new.name, new.trip_id, 'participant', new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_participants_ad AFTER DELETE ON participants BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 8 + 2;
+    END""",
+    # Invoices: number (version) and participant name
+    f"""CREATE TRIGGER IF NOT EXISTS search_invoices_ai AFTER INSERT ON invoices BEGIN
+        INSERT INTO search_index (rowid, title, trip_id, entity, entity_id)
+        VALUES (new.id * 8 + 3, {_INVOICE_TITLE.format(row='new')}, new.trip_id, 'invoice', new.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_invoices_au AFTER UPDATE OF version, participant_id, trip_id ON invoices BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 8 + 3;
+        INSERT INTO search_index (rowid, title, trip_id, entity, entity_id)
+        VALUES (new.id * 8 + 3, {_INVOICE_TITLE.format(row='new')}, new.trip_id, 'invoice', new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_invoices_ad AFTER DELETE ON invoices BEGIN
+        DELETE FROM search_index WHERE rowid = old.id * 8 + 3;
+    END""",
+]
+
+
+def _init_search_index(cursor):
+    global FTS_AVAILABLE
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'search_index'")
+    row = cursor.fetchone()
+    exists = row is not None
+    if exists and "trip_id UNINDEXED" in row[0]:
+        # Older layout that couldn't scope MATCH to a trip; rebuilt below
+        cursor.execute("DROP TABLE search_index")
+        exists = False
+    try:
+        # trip_id is indexed so MATCH only visits the trip's own rows (see search)
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                title,
+                trip_id,
+                entity UNINDEXED,
+                entity_id UNINDEXED,
+                prefix = '2 3'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"Warning: FTS5 unavailable ({e}), search will use LIKE")
+        FTS_AVAILABLE = False
+        return
+    for trigger in _SEARCH_TRIGGERS:
+        cursor.execute(trigger)
+    FTS_AVAILABLE = True
+    if not exists:
+        _populate_search_index(cursor)
+
+
+def _populate_search_index(cursor):
+    cursor.execute("""
+        INSERT INTO search_index (rowid, title, trip_id, entity, entity_id)
+        SELECT id * 8 + 1, name, trip_id, 'expense', id FROM expenses
+    """)
+    cursor.execute("""
+        INSERT INTO search_index (rowid, title, trip_id, entity, entity_id)
+        SELECT id * 8 + 2, name, trip_id, 'participant', id FROM participants
+    """)
+    cursor.execute(f"""
+        INSERT INTO search_index (rowid, title, trip_id, entity, entity_id)
+        SELECT i.id * 8 + 3, {_INVOICE_TITLE.format(row='i')}, i.trip_id, 'invoice', i.id FROM invoices i
+    """)
+
+
+@_write
+def rebuild_search_index():
+    """Drop and repopulate the FTS index from the source tables"""
+    if not FTS_AVAILABLE:
+        return
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM search_index")
+        _populate_search_index(cursor)
+
+
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every term must match a title as a prefix"""
+    terms = [t.replace('"', '""') for t in text.split() if t.strip()]
+    if not terms:
+        return ""
+    return "title : (" + " AND ".join(f'"{t}"*' for t in terms) + ")"
+
+
+def _fts_trip_query(trip_id: str, query: str) -> str:
+    """Scope an FTS5 query to one trip's rows: its id is matched as a phrase anchored at the column start"""
+    return 'trip_id : ^"' + trip_id.replace('"', '""') + '" AND ' + query
+
+
+@_scoped
+def search(trip_id: str, text: str, entities: Optional[List[str]] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    """Prefix search over expense names, participant names and invoice numbers, best matches first"""
+    query = _fts_query(text)
+    if not query:
+        return []
+    kinds = [e for e in (entities or _SEARCH_KINDS) if e in _SEARCH_KINDS]
+    if not kinds:
+        return []
+    kind_placeholders = ", ".join(["?"] * len(kinds))
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if FTS_AVAILABLE:
+            cursor.execute(f"""
+                SELECT entity, entity_id as id, title, bm25(search_index, 1.0, 0.0) as score
+                FROM search_index
+                WHERE search_index MATCH ? AND trip_id = ? AND entity IN ({kind_placeholders})
+                ORDER BY score
+                LIMIT ?
+            """, [_fts_trip_query(trip_id, query), trip_id, *kinds, limit])
+        else:
+            like = f"%{text.strip()}%"
+            cursor.execute(f"""
+                SELECT * FROM (
+                    SELECT 'expense' as entity, id, name as title, 0 as score FROM expenses WHERE trip_id = ? AND name LIKE ?
+                    UNION ALL
+                    SELECT 'participant', id, name, 0 FROM participants WHERE trip_id = ? AND name LIKE ?
+                    UNION ALL
+                    SELECT 'invoice', id, 'Invoice #' || version, 0 FROM invoices WHERE trip_id = ? AND CAST(version AS TEXT) LIKE ?
+                ) WHERE entity IN ({kind_placeholders})
+                LIMIT ?
+            """, [trip_id, like, trip_id, like, trip_id, like, *kinds, limit])
+        return [dict(row) for row in cursor.fetchall()]
+
+
+# === Sync Functions ===
+
+# Entities reported by /api/sync; "settings" has a single row per trip (entity_id 0)
+SYNC_ENTITIES = ("settings", "participant", "expense", "invoice", "receipt")
+
+# Beyond this many changed rows a full refetch is cheaper (and keeps IN lists short)
+SYNC_MAX_CHANGES = 500
+
+# Last committed version per trip, filled on first read and advanced after each commit
+_known_versions: Dict[str, int] = {}
+_versions_lock = threading.Lock()
+
+
+def _id_filter(column: str, ids: Optional[List[int]]):
+    """SQL fragment restricting a query to the given ids (None means no restriction)"""
+    if ids is None:
+        return "", []
+    if not ids:
+        return " AND 0", []
+    return f" AND {column} IN ({','.join('?' * len(ids))})", list(ids)
+
+
+def _bump_version(cursor, trip_id: str) -> int:
+    """Advance the trip's change counter and return the new value"""
+    cursor.execute("""
+        INSERT INTO trip_versions (trip_id, version) VALUES (?, 1)
+        ON CONFLICT(trip_id) DO UPDATE SET version = version + 1
+    """, (trip_id,))
+    cursor.execute("SELECT version FROM trip_versions WHERE trip_id = ?", (trip_id,))
+    version = cursor.fetchone()[0]
+    _record_change(cursor.connection, trip_id, version)
+    return version
+
+
+def _touch(cursor, trip_id: Optional[str], entity: str, ids: List[int], deleted: bool = False):
+    """Stamp rows with a fresh trip version inside the caller's transaction"""
+    ids = [i for i in ids if i is not None]
+    if not trip_id or not ids:
+        return
+    version = _bump_version(cursor, trip_id)
+    _record_change(cursor.connection, trip_id, version, entity, ids, deleted)
+    cursor.executemany("""
+        INSERT INTO row_versions (trip_id, entity, entity_id, version, deleted) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(trip_id, entity, entity_id) DO UPDATE SET
+            version = excluded.version, deleted = excluded.deleted
+    """, [(trip_id, entity, i, version, int(deleted)) for i in set(ids)])
+
+
+def _record_change(conn, trip_id: str, version: int, entity: Optional[str] = None,
+                   ids: Optional[List[int]] = None, deleted: bool = False):
+    """Accumulate a per-trip summary of the transaction, published once it commits"""
+    pending = getattr(conn, "pending_changes", None)
+    if pending is None:
+        return
+    change = pending.setdefault(trip_id, {"version": version, "upserted": {}, "deleted": {}})
+    change["version"] = version
+    if entity is not None:
+        bucket = change["deleted"] if deleted else change["upserted"]
+        bucket.setdefault(entity, set()).update(ids or [])
+
+
+def _publish_changes(conn):
+    pending, conn.pending_changes = conn.pending_changes, {}
+    _publish(pending)
+
+
+def _publish(pending: Dict[str, Dict[str, Any]]):
+    for trip_id, change in pending.items():
+        _remember_version(trip_id, change["version"])
+        change = {
+            "version": change["version"],
+            "upserted": {entity: sorted(ids) for entity, ids in change["upserted"].items()},
+            "deleted": {entity: sorted(ids) for entity, ids in change["deleted"].items()},
+        }
+        for listener in list(_change_listeners):
+            try:
+                listener(trip_id, change)
+            except Exception as e:
+                print(f"Change listener failed: {e}")
+
+
+def add_change_listener(listener: Callable[[str, Dict[str, Any]], None]):
+    """Register a callback for committed changes (e.g. the SSE broker)"""
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+
+def remove_change_listener(listener: Callable[[str, Dict[str, Any]], None]):
+    if listener in _change_listeners:
+        _change_listeners.remove(listener)
+
+
+def _remember_version(trip_id: str, version: int):
+    # Versions only grow, so a slow reader can never roll a newer commit back
+    with _versions_lock:
+        if version > _known_versions.get(trip_id, -1):
+            _known_versions[trip_id] = version
+
+
+@_scoped
+def get_trip_version(trip_id: str) -> int:
+    """Current change counter of a trip; answered from memory once known (writes keep it current)"""
+    check_external_writes()
+    version = _known_versions.get(trip_id)
+    if version is not None:
+        return version
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT version FROM trip_versions WHERE trip_id = ?", (trip_id,))
+        row = cursor.fetchone()
+        version = row[0] if row else 0
+    _remember_version(trip_id, version)
+    return version
+
+
+@_scoped
+def get_changes_since(trip_id: str, since: int) -> Dict[str, Any]:
+    """Rows changed after version `since`, as {"version", "full", "upserted": {entity: ids}, "deleted": {entity: ids}}.
+
+    full=True means the client cannot be caught up incrementally (first load, a
+    restore happened after `since`, `since` is from another database, or too many
+    rows changed) and should replace its collections wholesale.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT version, reset_version FROM trip_versions WHERE trip_id = ?", (trip_id,))
+        row = cursor.fetchone()
+        version, reset_version = (row[0], row[1]) if row else (0, 0)
+        result = {
+            "version": version,
+            "full": since <= 0 or since < reset_version or since > version,
+            "upserted": {entity: [] for entity in SYNC_ENTITIES},
+            "deleted": {entity: [] for entity in SYNC_ENTITIES},
+        }
+        if result["full"] or since == version:
+            return result
+
+        cursor.execute(
+            "SELECT entity, entity_id, deleted FROM row_versions WHERE trip_id = ? AND version > ? LIMIT ?",
+            (trip_id, since, SYNC_MAX_CHANGES + 1)
+        )
+        rows = cursor.fetchall()
+        if len(rows) > SYNC_MAX_CHANGES:
+            result["full"] = True
+            return result
+        for row in rows:
+            bucket = result["deleted"] if row['deleted'] else result["upserted"]
+            bucket.setdefault(row['entity'], []).append(row['entity_id'])
+        return result
+
+
+@_write
+def reset_sync_versions():
+    """Force every client to refetch (used after a restore replaced the rows)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM row_versions")
+        cursor.execute("INSERT OR IGNORE INTO trip_versions (trip_id) SELECT id FROM trips")
+        cursor.execute("UPDATE trip_versions SET version = version + 1, reset_version = version + 1")
+        # Published after commit like any write, so caches and live clients drop what they hold
+        cursor.execute("SELECT trip_id, version FROM trip_versions")
+        for row in cursor.fetchall():
+            _record_change(conn, row[0], row[1])
+    with _versions_lock:
+        _known_versions.clear()
+
+
+# === Multi-Process Coherence ===
+
+# How often an idle process looks for other processes' commits (live event streams rely on it)
+EXTERNAL_POLL_SECONDS = float(os.environ.get("DB_EXTERNAL_POLL", "0.5"))
+
+# Long-lived connection whose PRAGMA data_version moves whenever another connection commits
+_watch: Dict[str, Any] = {"path": None, "conn": None, "data_version": None, "versions": {}, "thread": None}
+_watch_lock = threading.Lock()
+
+
+def check_external_writes():
+    """Publish commits made by other server processes, as if they had happened here.
+
+    Changes committed in this process are published by get_db / the writer and keep
+    _known_versions current; another process's commits only show up in trip_versions.
+    Costs one PRAGMA when nothing changed. The watch thread runs it every DB_EXTERNAL_POLL
+    seconds; readers already off the event loop call it before trusting memory.
+    """
+    if not MULTI_PROCESS:
+        return
+    _start_external_watch()
+    # Sharded trips report their versions to the catalog (sync_catalog)
+    watched = shards.catalog_path(DATABASE_PATH) if SHARDED else DATABASE_PATH
+    with _watch_lock:
+        if _watch["conn"] is None or _watch["path"] != watched:
+            if _watch["conn"] is not None:
+                _watch["conn"].close()
+            _watch.update(path=watched, data_version=None, versions={},
+                          conn=sqlite3.connect(watched, check_same_thread=False))
+        conn = _watch["conn"]
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == _watch["data_version"]:
+            return
+        first = _watch["data_version"] is None
+        versions = dict(conn.execute("SELECT trip_id, version FROM trip_versions").fetchall())
+        # Another process may have archived or restored a trip
+        _set_archived([row[0] for row in conn.execute("SELECT id FROM trips WHERE archived_at IS NOT NULL")])
+        if first:
+            # Only versions this process already holds can be stale
+            changed = {t: v for t, v in versions.items() if t in _known_versions}
+        else:
+            changed = {t: v for t, v in versions.items() if v != _watch["versions"].get(t)}
+        _watch.update(data_version=data_version, versions=versions)
+    # Commits from this process were already published (and remembered) by their writer
+    _publish({trip_id: {"version": version, "upserted": {}, "deleted": {}}
+              for trip_id, version in changed.items() if version > _known_versions.get(trip_id, -1)})
+
+
+def _start_external_watch():
+    if _watch["thread"] is not None:
+        return
+    with _watch_lock:
+        if _watch["thread"] is None:
+            _watch["thread"] = threading.Thread(target=_poll_external_writes, name="db-watch", daemon=True)
+            _watch["thread"].start()
+
+
+def _poll_external_writes():
+    while True:
+        time.sleep(EXTERNAL_POLL_SECONDS)
+        try:
+            check_external_writes()
+        except Exception as e:
+            print(f"External write check failed: {e}")
+
+
+def _metered(fn):
+    """Time fn and count the statements it runs against its name (GET /metrics)"""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current_function.set(name)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            metrics.db_function_duration.observe(time.perf_counter() - start, name)
+            _current_function.reset(token)
+    return wrapper
+
+
+for _name, _fn in list(globals().items()):
+    if (inspect.isfunction(_fn) and _fn.__module__ == __name__ and not _name.startswith("_")
+            and _name not in ("get_db", "get_db_connection", "trip_scope", "add_change_listener", "remove_change_listener")):
+        globals()[_name] = _metered(_fn)
+
+metrics.REGISTRY.add_collector(
+    "db_connections_open", "gauge", "SQLite connections currently open",
+    lambda: [({}, metrics.db_connections.value("opened") - metrics.db_connections.value("closed"))])
+metrics.REGISTRY.add_collector(
+    "db_writer_operations_total", "counter", "Write operations run through the single writer",
+    lambda: [({}, _writer.stats["operations"])])
+metrics.REGISTRY.add_collector(
+    "db_writer_failed_operations_total", "counter", "Single-writer operations that raised or whose transaction failed",
+    lambda: [({}, _writer.stats["failed_operations"])])
+metrics.REGISTRY.add_collector(
+    "db_writer_transactions_total", "counter", "Group-commit transactions run by the single writer",
+    lambda: [({}, _writer.stats["transactions"])])
+metrics.REGISTRY.add_collector(
+    "db_pool_lookups_total", "counter", "Sharded connection pool lookups, by whether an idle connection was reused",
+    lambda: [({"result": "hit"}, _shards.stats["hits"]), ({"result": "open"}, _shards.stats["opens"])])
+metrics.REGISTRY.add_collector(
+    "db_pool_hit_ratio", "gauge", "Share of sharded pool lookups served by an idle connection",
+    lambda: [({}, metrics.ratio(_shards.stats["hits"], _shards.stats["opens"]))])
+metrics.REGISTRY.add_collector(
+    "archive_cache_lookups_total", "counter", "Archived trip reads, by whether the archive was already decompressed",
+    lambda: [({"result": "hit"}, _archives.stats["hits"]), ({"result": "load"}, _archives.stats["loads"])])
+metrics.REGISTRY.add_collector(
+    "archive_cache_hit_ratio", "gauge", "Share of archived trip reads served without decompressing",
+    lambda: [({}, metrics.ratio(_archives.stats["hits"], _archives.stats["loads"]))])
+
+add_change_listener(lambda trip_id, change: sync_catalog(trip_id, change["version"]))
+
 # Initialize database on import
 init_db()
@@ -0,0 +1,142 @@
+"""
+Single-writer queue for SQLite mutations
+One thread owns a dedicated connection and applies queued write operations. Operations
+that are waiting together are group-committed in one transaction, each inside its own
+savepoint so a failing operation doesn't take the rest of the group down with it.
+Callers get the result (or exception) through a Future once the transaction commits.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Upper bound on operations sharing one transaction
+MAX_GROUP = 64
+
+
+class SingleWriter:
+    """Serialises write operations onto one thread and connection"""
+
+    def __init__(self, connect: Callable[[], Any], target: Callable[[], str],
+                 on_commit: Callable[[List[Dict[str, Any]]], None], max_group: int = MAX_GROUP):
+        self._connect = connect      # opens the writer's connection
+        self._target = target        # current database path; the connection is reopened when it changes
+        self._on_commit = on_commit  # receives each committed operation's pending changes
+        self.max_group = max_group
+        self._queue: "queue.Queue[Tuple[Callable, tuple, dict, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._conn = None
+        self._conn_target: Optional[str] = None
+        self._active = None  # connection of the group being applied (writer thread only)
+        self.stats = {"operations": 0, "transactions": 0, "failed_operations": 0}
+
+    # === Public API ===
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs); the future resolves after its transaction commits"""
+        future: Future = Future()
+        self._ensure_started()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn through the queue and wait; calls made by a queued operation run inline"""
+        if self.on_writer_thread():
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def on_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def current_connection(self):
+        """The shared connection while a group is being applied on this thread, else None"""
+        return self._active if self.on_writer_thread() else None
+
+    # === Writer thread ===
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread = thread
+                thread.start()
+
+    def _run(self):
+        while True:
+            group = [self._queue.get()]
+            while len(group) < self.max_group:
+                try:
+                    group.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._apply(group)
+
+    def _connection(self):
+        target = self._target()
+        if self._conn is None or self._conn_target != target:
+            self._close()
+            self._conn = self._connect()
+            self._conn_target = target
+        return self._conn
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+    def _apply(self, group):
+        outcomes = []  # (future, result, error)
+        committed: List[Dict[str, Any]] = []
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            self._active = conn
+            try:
+                for fn, args, kwargs, future in group:
+                    conn.pending_changes = {}
+                    conn.execute("SAVEPOINT writer_op")
+                    try:
+                        result = fn(*args, **kwargs)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO writer_op")
+                        conn.execute("RELEASE writer_op")
+                        outcomes.append((future, None, e))
+                    else:
+                        conn.execute("RELEASE writer_op")
+                        committed.append(conn.pending_changes)
+                        outcomes.append((future, result, None))
+                conn.execute("COMMIT")
+            finally:
+                self._active = None
+                conn.pending_changes = {}
+        except Exception as e:
+            # The transaction itself failed (lock timeout, I/O error): nothing was written
+            if self._conn is not None:
+                try:
+                    self._conn.execute("ROLLBACK")
+                except Exception:
+                    pass
+            self._close()
+            for _, _, _, future in group:
+                future.set_exception(e)
+            self.stats["failed_operations"] += len(group)
+            return
+
+        self.stats["operations"] += len(group)
+        self.stats["transactions"] += 1
+        try:
+            self._on_commit(committed)
+        except Exception as e:
+            print(f"Writer commit hook failed: {e}")
+        for future, result, error in outcomes:
+            if error is not None:
+                self.stats["failed_operations"] += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
@@ -0,0 +1,149 @@
+"""
+Bulk expense import from CSV for Trip Expense Manager
+Rows are parsed as a stream, validated one by one and written in batches.
+"""
+import csv
+import io
+import math
+import re
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional
+
+import database as db
+
+REQUIRED_COLUMNS = ("name", "amount", "currency", "participants")
+CURRENCIES = ("JPY", "THB")
+
+# Rows per transaction
+BATCH_SIZE = 1000
+
+# Errors beyond this are counted but not listed
+MAX_REPORTED_ERRORS = 500
+
+# Participant lists may be separated with ; | or ,
+_NAME_SEPARATOR = re.compile(r"[;|,]")
+
+
+class ImportFormatError(ValueError):
+    """The file as a whole can't be imported (not CSV, missing columns)"""
+
+
+class ParticipantLookup:
+    """Resolve participant names for one trip from a single query"""
+
+    def __init__(self, participants: Iterable[Dict[str, Any]]):
+        self.exact = {p['name']: p['id'] for p in participants}
+        self.folded = {}
+        for name, pid in self.exact.items():
+            self.folded.setdefault(name.casefold(), pid)
+
+    def resolve(self, names: List[str]):
+        """Returns (ids, unknown names); exact match first, then case-insensitive"""
+        ids, unknown = [], []
+        for name in names:
+            pid = self.exact.get(name, self.folded.get(name.casefold()))
+            if pid is None:
+                unknown.append(name)
+            elif pid not in ids:
+                ids.append(pid)
+        return ids, unknown
+
+
+def parse_row(row: Dict[str, Optional[str]], lookup: ParticipantLookup, default_buffer_rate: float) -> Dict[str, Any]:
+    """Turn a CSV row into add_expense fields; raises ValueError with a readable message"""
+    name = (row.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+
+    try:
+        amount = float((row.get("amount") or "").replace(",", "").strip())
+    except ValueError:
+        raise ValueError(f"amount '{row.get('amount')}' is not a number")
+    # float() accepts "nan" and "inf", which would poison the ledger and rollups
+    if not math.isfinite(amount):
+        raise ValueError(f"amount '{row.get('amount')}' is not a number")
+    if amount <= 0:
+        raise ValueError("amount must be positive")
+
+    currency = (row.get("currency") or "").strip().upper()
+    if currency not in CURRENCIES:
+        raise ValueError(f"currency must be one of {', '.join(CURRENCIES)}")
+
+    raw_rate = (row.get("buffer_rate") or "").strip()
+    if raw_rate:
+        try:
+            buffer_rate = float(raw_rate)
+        except ValueError:
+            raise ValueError(f"buffer_rate '{raw_rate}' is not a number")
+        if not math.isfinite(buffer_rate):
+            raise ValueError(f"buffer_rate '{raw_rate}' is not a number")
+    else:
+        buffer_rate = default_buffer_rate if currency == "JPY" else 1.0
+
+    names = [n.strip() for n in _NAME_SEPARATOR.split(row.get("participants") or "") if n.strip()]
+    if not names:
+        raise ValueError("at least one participant is required")
+    participant_ids, unknown = lookup.resolve(names)
+    if unknown:
+        raise ValueError(f"unknown participant(s): {', '.join(unknown)}")
+
+    return {"name": name, "amount": amount, "currency": currency,
+            "buffer_rate": buffer_rate, "participant_ids": participant_ids}
+
+
+def import_expenses_csv(trip_id: str, stream: BinaryIO, dry_run: bool = False,
+                        batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """Import expenses from a CSV byte stream.
+
+    Valid rows are inserted in batches of `batch_size` (one transaction each); invalid
+    rows are skipped and reported with their line number. With dry_run nothing is written.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    try:
+        header = reader.fieldnames
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFormatError(f"Could not read CSV header: {e}")
+    if not header:
+        raise ImportFormatError("The file is empty")
+    reader.fieldnames = [(h or "").strip().lower() for h in header]
+    missing = [c for c in REQUIRED_COLUMNS if c not in reader.fieldnames]
+    if missing:
+        raise ImportFormatError(f"Missing column(s): {', '.join(missing)}")
+
+    lookup = ParticipantLookup(db.get_all_participants(trip_id))
+    default_buffer_rate = db.get_settings(trip_id).get("default_buffer_rate") or 0.25
+
+    report = {"total_rows": 0, "imported": 0, "error_count": 0, "errors": [], "dry_run": dry_run}
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        if batch and not dry_run:
+            # The ledger is a full recompute per participant, so it is refreshed once at the end
+            db.apply_expense_batch(trip_id, creates=batch, updates=[], deletes=[], refresh_balances=False)
+        report["imported"] += len(batch)
+        batch.clear()
+
+    try:
+        try:
+            for row in reader:
+                if not any((v or "").strip() for v in row.values() if isinstance(v, str)):
+                    continue  # blank line
+                report["total_rows"] += 1
+                try:
+                    batch.append(parse_row(row, lookup, default_buffer_rate))
+                except ValueError as e:
+                    report["error_count"] += 1
+                    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                        report["errors"].append({"line": reader.line_num, "error": str(e)})
+                    continue
+                if len(batch) >= batch_size:
+                    flush()
+        except (UnicodeDecodeError, csv.Error) as e:
+            # Keep what was read so far; the report says where reading stopped
+            report["error_count"] += 1
+            report["errors"].append({"line": reader.line_num, "error": f"Stopped reading: {e}"})
+        flush()
+    finally:
+        if report["imported"] and not dry_run:
+            db.rebuild_balance_ledger(trip_id)
+    return report
@@ -0,0 +1,62 @@
+"""
+Fast JSON responses for Trip Expense Manager
+List and overview endpoints return rows straight from database.py, so they skip the
+response_model validation and jsonable_encoder passes and are encoded once with orjson.
+Falls back to the stdlib json module when orjson isn't installed.
+"""
+import json
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple, Type
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Encode what orjson / json don't know natively (models, sets, Decimals)"""
+    return jsonable_encoder(value)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson when available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class EncodedJSONResponse(Response):
+    """Body already encoded with dumps (e.g. on the DB pool, to keep big lists off the event loop)"""
+
+    media_type = "application/json"
+
+
+@lru_cache(maxsize=None)
+def _fields(model: Type[BaseModel]) -> Tuple[Tuple[str, Any], ...]:
+    return tuple(
+        (name, None if field.is_required() else field.get_default(call_default_factory=True))
+        for name, field in model.model_fields.items()
+    )
+
+
+def project(rows: Iterable[Dict[str, Any]], model: Type[BaseModel]) -> List[Dict[str, Any]]:
+    """Shape trusted DB rows like `model` without validating them.
+
+    Keeps only the model's fields (in its order) and fills defaults for missing ones,
+    which is what response_model filtering would produce for rows that already have
+    the right types. Only use this on rows built by database.py.
+    """
+    fields = _fields(model)
+    return [{name: row.get(name, default) for name, default in fields} for row in rows]
@@ -0,0 +1,19 @@
+"""
+Gunicorn settings for serving Trip Expense Manager from several processes
+
+Usage (gunicorn is not in requirements.txt; `python main.py` honours WORKERS too):
+    pip install gunicorn
+    WORKERS=4 gunicorn main:app -c gunicorn.conf.py
+"""
+import multiprocessing
+import os
+
+workers = int(os.environ.get("WORKERS") or multiprocessing.cpu_count())
+# database.py reads this in every worker to keep its caches coherent across processes
+os.environ["WORKERS"] = str(workers)
+
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+forwarded_allow_ips = "*"
+# Each worker opens its own connections and writer thread after the fork
+preload_app = False
@@ -0,0 +1,76 @@
+"""
+Conditional GET support for Trip Expense Manager
+Trip-scoped GET responses carry a weak ETag derived from the trip's change counter,
+so a matching If-None-Match is answered with 304 before the route runs.
+"""
+import re
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+import database as db
+from async_db import run_db
+from version import APP_VERSION
+
+# Trip-scoped read endpoints whose body depends only on the X-Trip-ID trip's data.
+# Left out: previews (/invoices/{name} etc.) embed the current time and the next
+# global document number; lookups by global row id aren't scoped by the header;
+# PDFs and streams.
+ETAG_PATHS = re.compile(r"""^/api/(
+      settings(/categories)?
+    | participants
+    | expenses
+    | invoices/(overview/all|[^/]+/history)?
+    | receipts/([^/]+/history)?
+    | refunds/reconciliation
+    | search
+    | sync
+    | journal(/projections/[^/]+)?
+)$""", re.VERBOSE)
+
+
+def trip_etag(trip_id: str, version: int) -> str:
+    # Trip id keeps two trips at the same version apart; APP_VERSION invalidates across deploys
+    return f'W/"{trip_id}.{version}.{APP_VERSION}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison against an If-None-Match header value"""
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def is_etag_path(path: str) -> bool:
+    return ETAG_PATHS.match(path) is not None
+
+
+class ConditionalGetMiddleware(BaseHTTPMiddleware):
+    """Answer unchanged trip reads with 304 and stamp fresh ones with an ETag"""
+
+    async def dispatch(self, request: Request, call_next):
+        trip_id = request.headers.get("X-Trip-ID")
+        if request.method not in ("GET", "HEAD") or not trip_id or not is_etag_path(request.url.path):
+            return await call_next(request)
+
+        # Read the version before the route runs: a write racing the route only makes the
+        # body newer than its ETag, which costs one extra refetch but never a stale 304.
+        # A miss opens SQLite and other workers' commits are checked first: keep it off the loop
+        etag = trip_etag(trip_id, await run_db(db.get_trip_version, trip_id))
+        headers = {"ETag": etag, "Vary": "X-Trip-ID", "Cache-Control": "no-cache"}
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        response = await call_next(request)
+        if response.status_code == 200:
+            response.headers.update(headers)
+        return response
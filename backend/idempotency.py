@@ -0,0 +1,70 @@
+"""
+Idempotency-Key support for Trip Expense Manager
+A POST carrying an Idempotency-Key header runs once; retries with the same key get
+the stored response back without touching the documents again. The write that issues
+the document stores the response in its own transaction, so a request that dies after
+committing is replayed on retry, never run twice.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, Response
+
+import database as db
+
+# How long a completed response is kept for replay
+IDEMPOTENCY_TTL = float(os.environ.get("IDEMPOTENCY_TTL", str(24 * 3600)))
+# A request still marked as running after this long is assumed dead and may be retried
+IDEMPOTENCY_LEASE = 120.0
+
+MAX_KEY_LENGTH = 255
+
+
+def fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Claim:
+    """A claimed key. compute() passes it to the database write that issues the document,
+    which stores the response in the same transaction (see database.issue_invoice)."""
+
+    def __init__(self, scope: str, key: str):
+        self.scope = scope
+        self.key = key
+        self.stored = False
+
+
+def run_idempotent(key: Optional[str], scope: str, payload: Any, response: Response,
+                   compute: Callable[[Optional[Claim]], Dict[str, Any]]) -> Dict[str, Any]:
+    """Run compute(claim) once per (scope, key); without a key it simply runs, with claim None.
+
+    `payload` identifies the request; reusing a key for a different payload is a 422.
+    A retry that arrives while the first request is still running gets a 409.
+    """
+    if not key:
+        return compute(None)
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key may be at most {MAX_KEY_LENGTH} characters")
+
+    digest = fingerprint(payload)
+    existing = db.claim_idempotency_key(scope, key, digest, IDEMPOTENCY_TTL, IDEMPOTENCY_LEASE)
+    if existing is not None:
+        if existing['fingerprint'] != digest:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if existing['response'] is None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        response.headers["Idempotent-Replayed"] = "true"
+        return json.loads(existing['response'])
+
+    claim = Claim(scope, key)
+    try:
+        result = compute(claim)
+    except BaseException:
+        # Errors aren't stored: the client may fix the problem and retry with the same key
+        db.release_idempotency_key(scope, key)
+        raise
+    if not claim.stored:
+        db.complete_idempotency_key(scope, key, json.dumps(result))
+    return result
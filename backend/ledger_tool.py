@@ -0,0 +1,47 @@
+"""
+Verify or rebuild the participant balance ledger
+
+Usage:
+    python ledger_tool.py verify [--trip TRIP_ID]
+    python ledger_tool.py rebuild [--trip TRIP_ID]
+"""
+import argparse
+import sys
+
+import database as db
+
+
+def verify(trip_id=None) -> int:
+    mismatches = db.verify_balance_ledger(trip_id)
+    if not mismatches:
+        print("Ledger OK")
+        return 0
+
+    for m in mismatches:
+        label = "missing row" if m['missing'] else "mismatch"
+        print(f"[{label}] participant {m['participant_id']} ({m['participant_name']}), trip {m['trip_id']}")
+        for col, diff in m['differences'].items():
+            print(f"    {col}: stored={diff['stored']} expected={diff['expected']}")
+    print(f"{len(mismatches)} participant(s) out of sync")
+    return 1
+
+
+def rebuild(trip_id=None) -> int:
+    count = db.rebuild_balance_ledger(trip_id)
+    print(f"Rebuilt ledger for {count} participant(s)")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Participant balance ledger maintenance")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--trip", dest="trip_id", default=None, help="Limit to a single trip")
+    args = parser.parse_args(argv)
+
+    if args.command == "verify":
+        return verify(args.trip_id)
+    return rebuild(args.trip_id)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
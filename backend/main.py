@@ -5,14 +5,15 @@ Main application entry point
 from fastapi import FastAPI, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, Response
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, QueryParams
 from pydantic import BaseModel
 from typing import Optional
 import os
 
 # Import routers
-from routes import settings, participants, expenses, invoices, refunds, receipts, export, import_db, trips
+from routes import settings, participants, expenses, invoices, refunds, receipts, export, import_db, trips, journal, search, sync, events
 
 # Import database to initialize on startup
 import database
@@ -20,6 +21,14 @@ import database
 # Import auth module
 from auth import ADMIN_TOKEN, verify_admin_token
 
+from http_cache import ConditionalGetMiddleware
+from fast_json import FastJSONResponse
+from compression import CompressionMiddleware
+from metrics import MetricsMiddleware
+from sql_trace import SQLTraceMiddleware
+import metrics
+from static_assets import StaticAssets
+
 
 # Import version
 from version import APP_VERSION
@@ -31,7 +40,8 @@ class LoginRequest(BaseModel):
 app = FastAPI(
     title="Trip Expense Manager",
     description="API for managing group travel expenses with currency conversion and PDF invoices",
-    version=APP_VERSION
+    version=APP_VERSION,
+    default_response_class=FastJSONResponse
 )
 
 
@@ -69,6 +79,43 @@ class AuthMiddleware(BaseHTTPMiddleware):
         return await call_next(request)
 
 
+class TripScopeMiddleware:
+    """Bind each request to its trip so get_db opens that trip's archive or (sharded) database file"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # EventSource can't send headers, so /api/events passes the trip as ?trip_id=
+        trip_id = Headers(scope=scope).get("x-trip-id") or QueryParams(scope["query_string"]).get("trip_id")
+        # Sharded storage has no shared tables to fall back on for a trip it doesn't know
+        if trip_id and database.SHARDED and not database.shard_exists(trip_id):
+            response = JSONResponse(status_code=404, content={"detail": f"Trip {trip_id} not found"})
+            await response(scope, receive, send)
+            return
+        with database.trip_scope(trip_id):
+            await self.app(scope, receive, send)
+
+
+@app.exception_handler(database.TripArchivedError)
+async def trip_archived(request: Request, exc: database.TripArchivedError):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+
+@app.exception_handler(database.TripNotFoundError)
+async def trip_not_found(request: Request, exc: database.TripNotFoundError):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+# 304 Not Modified for unchanged trip reads (innermost, so it only sees authorised requests)
+app.add_middleware(ConditionalGetMiddleware)
+
+# Row lookups by id (expenses, invoices...) need the trip's archive or sharded file; outside the
+# ETag check, so unknown sharded trips are refused before it reads their version
+app.add_middleware(TripScopeMiddleware)
+
 # Add auth middleware BEFORE CORS
 app.add_middleware(AuthMiddleware)
 
@@ -81,6 +128,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large API responses (outside the others, so it sees the final body and headers)
+app.add_middleware(CompressionMiddleware)
+
+# Per-request SQL timings (X-SQL-Trace) and request names for the slow-query log
+app.add_middleware(SQLTraceMiddleware)
+
+# Request timings for /metrics (outermost, so every middleware's time is included)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(settings.router)
 app.include_router(participants.router)
@@ -92,6 +148,10 @@ app.include_router(receipts.router)
 app.include_router(trips.router)
 app.include_router(export.router)
 app.include_router(import_db.router)
+app.include_router(journal.router)
+app.include_router(search.router)
+app.include_router(sync.router)
+app.include_router(events.router)
 
 
 # ========================
@@ -121,18 +181,24 @@ pdf_dir = os.path.join(os.path.dirname(__file__), "data", "pdfs")
 os.makedirs(pdf_dir, exist_ok=True)
 app.mount("/pdfs", StaticFiles(directory=pdf_dir), name="pdfs")
 
-# Mount static frontend files (CSS, JS)
+# Static frontend files (CSS, JS), loaded, hashed and precompressed once at startup
 static_dir = os.path.join(os.path.dirname(__file__), "static")
-if os.path.exists(static_dir):
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
+static_assets = StaticAssets(static_dir) if os.path.isdir(static_dir) else None
+
+
+@app.get("/static/{path:path}", include_in_schema=False)
+def serve_static(path: str, request: Request):
+    """Serve a frontend asset; content-hashed URLs are cached forever"""
+    if static_assets is None:
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+    return static_assets.serve(path, request)
 
 
 @app.get("/")
-def root():
+def root(request: Request):
     """Serve the frontend index.html"""
-    index_path = os.path.join(os.path.dirname(__file__), "static", "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
+    if static_assets is not None and static_assets.index is not None:
+        return static_assets.serve_index(request)
     return {
         "name": "Trip Expense Manager API",
         "version": "1.0.0",
@@ -141,29 +207,36 @@ def root():
 
 
 @app.get("/admin")
-def serve_admin():
+def serve_admin(request: Request):
     """Serve SPA for admin dashboard"""
-    index_path = os.path.join(os.path.dirname(__file__), "static", "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
+    if static_assets is not None and static_assets.index is not None:
+        return static_assets.serve_index(request)
     return JSONResponse(status_code=404, content={"message": "Frontend not found"})
 
 
 @app.get("/t/{full_path:path}")
-def serve_spa(full_path: str):
+def serve_spa(full_path: str, request: Request):
     """Serve SPA for trip routes"""
-    index_path = os.path.join(os.path.dirname(__file__), "static", "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
+    if static_assets is not None and static_assets.index is not None:
+        return static_assets.serve_index(request)
     return JSONResponse(status_code=404, content={"message": "Frontend not found"})
 
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus metrics for this process"""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, proxy_headers=True, forwarded_allow_ips="*")
+    # WORKERS > 1 serves from that many processes sharing the database (see database.MULTI_PROCESS)
+    workers = int(os.environ.get("WORKERS", "1"))
+    uvicorn.run("main:app" if workers > 1 else app, host="0.0.0.0", port=int(os.environ.get("PORT", "8000")),
+                workers=workers, proxy_headers=True, forwarded_allow_ips="*")
 
@@ -0,0 +1,223 @@
+"""
+Prometheus metrics for Trip Expense Manager
+Counters and histograms kept in process memory and rendered in the Prometheus text
+format at GET /metrics. Recording is a dict lookup and a few additions under a lock;
+figures other modules already keep (cache counters, pool sizes) are read only when
+/metrics is scraped, through collectors.
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds (Prometheus' defaults, plus finer steps for single queries)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PDF_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (labels, value) pairs a collector reports for one metric
+Samples = List[Tuple[Dict[str, str], float]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Observations counted into fixed buckets per label combination, with their sum"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = REQUEST_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> Iterable[str]:
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket = _labels(self.label_names, labels, 'le="' + le + '"')
+                yield f"{self.name}_bucket{bucket} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(round(total, 6))}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+class Registry:
+    """The metrics this process exposes, plus collectors read at scrape time"""
+
+    def __init__(self):
+        self._metrics: List = []
+        # name -> (type, help, callable returning samples)
+        self._collectors: Dict[str, Tuple[str, str, Callable[[], Samples]]] = {}
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, name: str, type: str, help: str, collect: Callable[[], Samples]):
+        self._collectors[name] = (type, help, collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.type}"]
+            lines += metric.render()
+        for name, (type, help, collect) in self._collectors.items():
+            try:
+                samples = collect()
+            except Exception as e:  # a broken collector mustn't take the whole scrape down
+                print(f"Metrics collector {name} failed: {e}")
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_request_duration = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to answer HTTP requests, by route template",
+    labels=("method", "route", "status")))
+db_function_duration = REGISTRY.register(Histogram(
+    "db_function_duration_seconds", "Time spent in database.py functions",
+    labels=("function",), buckets=DB_BUCKETS))
+db_queries = REGISTRY.register(Counter(
+    "db_queries_total", "SQL statements executed, by the database.py function that ran them",
+    labels=("function",)))
+db_connections = REGISTRY.register(Counter(
+    "db_connections_total", "SQLite connections opened and closed", labels=("event",)))
+pdf_render_duration = REGISTRY.register(Histogram(
+    "pdf_render_duration_seconds", "Time to render PDF documents", labels=("document",), buckets=PDF_BUCKETS))
+
+
+def timed(histogram: Histogram, *labels: str):
+    """Decorator observing each call's duration in histogram"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with histogram.time(*labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def ratio(hits: float, misses: float):
+    lookups = hits + misses
+    return hits / lookups if lookups else None
+
+
+# === Request metrics ===
+
+def route_template(scope: Scope) -> str:
+    """Path template of the route that handled (or would handle) the request"""
+    route = scope.get("route")
+    if route is None:
+        # Answered before routing (304s, auth failures): find the route the path belongs to
+        app = scope.get("app")
+        for candidate in getattr(getattr(app, "router", None), "routes", ()):
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    # Unmatched paths share one label so scanners can't grow the series without bound
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Time every HTTP request under its method, route template and status code"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_with_status(message: Message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], route_template(scope),
+                                          str(status[0]))
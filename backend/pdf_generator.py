@@ -12,8 +12,9 @@ from reportlab.lib.units import inch, cm
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, HRFlowable
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
+import metrics
 from schemas import InvoiceData, RefundData, InvoiceExpenseItem
 
 
@@ -21,22 +22,25 @@ from schemas import InvoiceData, RefundData, InvoiceExpenseItem
 # Company branding
 COMPANY_NAME = "Nine Travel Co., Ltd."
 
+# Thai-capable font; without it documents fall back to Helvetica
+FONT_PATH = os.path.join(os.path.dirname(__file__), "data", "fonts", "Sarabun-Regular.ttf")
+
 
 class PDFGenerator:
-    def __init__(self):
-        self._register_fonts()
+    def __init__(self, font_path: Optional[str] = FONT_PATH):
+        self._register_fonts(font_path)
         self.styles = getSampleStyleSheet()
         self._setup_custom_styles()
     
-    def _register_fonts(self):
+    def _register_fonts(self, font_path: Optional[str]):
         """Register Sarabun font (Thai support)"""
-        font_path = os.path.join(os.path.dirname(__file__), "data", "fonts", "Sarabun-Regular.ttf")
-        if os.path.exists(font_path):
+        if font_path and os.path.exists(font_path):
             pdfmetrics.registerFont(TTFont('Sarabun', font_path))
             self.font_name = 'Sarabun'
             self.bold_font_name = 'Sarabun' # Using regular for bold since we only have regular
         else:
-            print(f"Warning: Font not found at {font_path}, using Helvetica")
+            if font_path:
+                print(f"Warning: Font not found at {font_path}, using Helvetica")
             self.font_name = 'Helvetica'
             self.bold_font_name = 'Helvetica-Bold'
 
@@ -101,6 +105,7 @@ class PDFGenerator:
             ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
         ])
     
+    @metrics.timed(metrics.pdf_render_duration, "invoice")
     def generate_invoice_pdf(self, data: InvoiceData, trip_name: str) -> bytes:
         """Generate invoice PDF and return bytes (on-the-fly)"""
         buffer = io.BytesIO()
@@ -168,6 +173,7 @@ class PDFGenerator:
         buffer.seek(0)
         return buffer.getvalue()
     
+    @metrics.timed(metrics.pdf_render_duration, "refund")
     def generate_refund_pdf(self, data: RefundData) -> bytes:
         """Generate detailed refund statement PDF (on-the-fly)"""
         buffer = io.BytesIO()
@@ -279,6 +285,7 @@ class PDFGenerator:
         buffer.seek(0)
         return buffer.getvalue()
     
+    @metrics.timed(metrics.pdf_render_duration, "receipt")
     def generate_receipt_pdf(self, data, trip_name: str) -> bytes:
         """Generate receipt PDF confirming payment received (on-the-fly)"""
         buffer = io.BytesIO()
@@ -0,0 +1,305 @@
+"""
+Journal projections for Trip Expense Manager
+Folds journal events into overview stats, cash flow and balance views.
+
+Each projection keeps a per-trip checkpoint so a call only reads events newer
+than the checkpoint. Reads never store anything: checkpoints are advanced after
+commits, once CHECKPOINT_EVERY events have piled up behind them. Snapshots taken
+every SNAPSHOT_INTERVAL events let historical (as_of) views start from the
+nearest earlier state.
+"""
+import copy
+from typing import Optional, Dict, Any, List
+
+import database as db
+
+SNAPSHOT_INTERVAL = 200
+# Events a read may have to fold past the stored checkpoint before a commit advances it
+CHECKPOINT_EVERY = 50
+
+
+def _collected_thb(expense: Dict[str, Any]) -> float:
+    """Collected THB for a whole expense (JPY uses the buffer rate)"""
+    if expense['currency'] == 'JPY':
+        return expense['amount'] * expense['buffer_rate']
+    return expense['amount']
+
+
+def _drop_participant(state: Dict[str, Any], participant_id: int):
+    """Mirror ON DELETE CASCADE from participants to invoices and receipts"""
+    for collection in ('invoices', 'receipts'):
+        items = state.get(collection, {})
+        for key in [k for k, v in items.items() if v['participant_id'] == participant_id]:
+            del items[key]
+
+
+class OverviewStatsProjection:
+    """Invoice and receipt totals (same shape as database.get_overview_stats)"""
+    name = "overview_stats"
+
+    def initial(self) -> Dict[str, Any]:
+        return {"invoices": {}, "receipts": {}}
+
+    def apply(self, state: Dict[str, Any], event: Dict[str, Any]):
+        entity, action, payload = event['entity'], event['action'], event['payload']
+        key = str(event['entity_id'])
+
+        if entity == 'invoice' and action == 'created':
+            state['invoices'][key] = {"participant_id": payload['participant_id'], "total_thb": payload['total_thb']}
+        elif entity == 'invoice' and action == 'deleted':
+            state['invoices'].pop(key, None)
+        elif entity == 'receipt' and action == 'created':
+            state['receipts'][key] = {
+                "participant_id": payload['participant_id'],
+                "total_thb": payload['total_thb'],
+                "invoice_ids": [str(i) for i in payload['invoice_ids']]
+            }
+        elif entity == 'receipt' and action == 'deleted':
+            state['receipts'].pop(key, None)
+        elif entity == 'participant' and action == 'deleted':
+            _drop_participant(state, event['entity_id'])
+
+    def view(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        invoices = state['invoices']
+        paid_ids = {i for r in state['receipts'].values() for i in r['invoice_ids'] if i in invoices}
+
+        inv_total = sum(i['total_thb'] for i in invoices.values())
+        paid_total = sum(invoices[i]['total_thb'] for i in paid_ids)
+        receipt_total = sum(r['total_thb'] for r in state['receipts'].values())
+
+        return {
+            "total_invoices": len(invoices),
+            "total_invoiced_amount": round(inv_total, 2),
+            "paid_invoices": len(paid_ids),
+            "paid_amount": round(paid_total, 2),
+            "unpaid_invoices": len(invoices) - len(paid_ids),
+            "unpaid_amount": round(inv_total - paid_total, 2),
+            "total_receipts": len(state['receipts']),
+            "total_received": round(receipt_total, 2)
+        }
+
+
+class CashFlowProjection:
+    """Daily inflows (receipts) vs outflows (paid expenses), same shape as database.get_cash_flow_stats"""
+    name = "cash_flow"
+
+    def initial(self) -> Dict[str, Any]:
+        return {"expenses": {}, "receipts": {}}
+
+    def apply(self, state: Dict[str, Any], event: Dict[str, Any]):
+        entity, action, payload = event['entity'], event['action'], event['payload']
+        key = str(event['entity_id'])
+
+        if entity == 'expense':
+            if action == 'created':
+                state['expenses'][key] = {"status": "pending", "date": None, "thb": None}
+            elif action == 'paid' and key in state['expenses']:
+                state['expenses'][key].update(status="collected", date=payload['date'], thb=payload['actual_thb'])
+            elif action == 'status_changed' and key in state['expenses']:
+                state['expenses'][key]['status'] = payload['status']
+            elif action == 'deleted':
+                state['expenses'].pop(key, None)
+        elif entity == 'receipt':
+            if action == 'created':
+                state['receipts'][key] = {
+                    "participant_id": payload['participant_id'],
+                    "day": payload['day'],
+                    "total_thb": payload['total_thb']
+                }
+            elif action == 'deleted':
+                state['receipts'].pop(key, None)
+        elif entity == 'participant' and action == 'deleted':
+            _drop_participant(state, event['entity_id'])
+
+    def view(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        outflows: Dict[str, float] = {}
+        for e in state['expenses'].values():
+            if e['status'] == 'collected' and e['date'] is not None:
+                outflows[e['date']] = outflows.get(e['date'], 0) + (e['thb'] or 0)
+
+        inflows: Dict[str, float] = {}
+        for r in state['receipts'].values():
+            inflows[r['day']] = inflows.get(r['day'], 0) + r['total_thb']
+
+        all_dates = sorted(set(outflows) | set(inflows))
+        inflow_list = [inflows.get(d, 0) for d in all_dates]
+        outflow_list = [outflows.get(d, 0) for d in all_dates]
+
+        cumulative = []
+        running_balance = 0
+        for i, o in zip(inflow_list, outflow_list):
+            running_balance += i - o
+            cumulative.append(running_balance)
+
+        return {
+            "labels": all_dates,
+            "inflow": inflow_list,
+            "outflow": outflow_list,
+            "cumulative": cumulative,
+            "net_position": running_balance
+        }
+
+
+class BalancesProjection:
+    """Per-participant collected / invoiced / paid / actual totals (same columns as the balance ledger)"""
+    name = "balances"
+
+    def initial(self) -> Dict[str, Any]:
+        return {"participants": {}, "expenses": {}, "invoices": {}, "receipts": {}}
+
+    def apply(self, state: Dict[str, Any], event: Dict[str, Any]):
+        entity, action, payload = event['entity'], event['action'], event['payload']
+        key = str(event['entity_id'])
+
+        if entity == 'participant':
+            if action == 'created':
+                state['participants'][key] = payload['name']
+            elif action == 'deleted':
+                state['participants'].pop(key, None)
+                for e in state['expenses'].values():
+                    if event['entity_id'] in e['participant_ids']:
+                        e['participant_ids'].remove(event['entity_id'])
+                _drop_participant(state, event['entity_id'])
+        elif entity == 'expense':
+            if action in ('created', 'updated'):
+                expense = state['expenses'].setdefault(key, {"status": "pending", "actual_thb": None})
+                expense.update(
+                    amount=payload['amount'],
+                    currency=payload['currency'],
+                    buffer_rate=payload['buffer_rate'],
+                    participant_ids=list(payload['participant_ids'])
+                )
+            elif action == 'paid' and key in state['expenses']:
+                state['expenses'][key].update(status="collected", actual_thb=payload['actual_thb'])
+            elif action == 'status_changed' and key in state['expenses']:
+                state['expenses'][key]['status'] = payload['status']
+            elif action == 'deleted':
+                state['expenses'].pop(key, None)
+        elif entity in ('invoice', 'receipt'):
+            collection = state[entity + 's']
+            if action == 'created':
+                collection[key] = {"participant_id": payload['participant_id'], "total_thb": payload['total_thb']}
+            elif action == 'deleted':
+                collection.pop(key, None)
+
+    def view(self, state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        totals = {
+            int(pid): {"collected_thb": 0.0, "invoiced_thb": 0.0, "paid_thb": 0.0, "actual_thb": 0.0}
+            for pid in state['participants']
+        }
+
+        for e in state['expenses'].values():
+            members = [pid for pid in e['participant_ids'] if pid in totals]
+            if not e['participant_ids']:
+                continue
+            share = _collected_thb(e) / len(e['participant_ids'])
+            actual_share = (e['actual_thb'] or 0) / len(e['participant_ids'])
+            for pid in members:
+                totals[pid]['collected_thb'] += share
+                if e['status'] == 'collected':
+                    totals[pid]['actual_thb'] += actual_share
+
+        for collection, column in (('invoices', 'invoiced_thb'), ('receipts', 'paid_thb')):
+            for item in state[collection].values():
+                if item['participant_id'] in totals:
+                    totals[item['participant_id']][column] += item['total_thb']
+
+        rows = []
+        for pid, row in totals.items():
+            rows.append({
+                "participant_id": pid,
+                "participant_name": state['participants'][str(pid)],
+                **{col: round(value, 2) for col, value in row.items()}
+            })
+        return sorted(rows, key=lambda r: r['participant_name'])
+
+
+PROJECTIONS = {p.name: p for p in (OverviewStatsProjection(), CashFlowProjection(), BalancesProjection())}
+
+
+def _normalise_as_of(as_of: str) -> str:
+    """A bare date means 'end of that day'; journal timestamps are 'YYYY-MM-DD HH:MM:SS'"""
+    as_of = as_of.replace("T", " ")
+    if len(as_of) == 10:
+        return f"{as_of} 23:59:59"
+    return as_of
+
+
+def _fold_to_head(trip_id: str, projection):
+    """Fold the events after the stored checkpoint: (state, head seq or None if nothing new, snapshots due)"""
+    checkpoint = db.get_projection_checkpoint(trip_id, projection.name)
+    if checkpoint:
+        seq, since_snapshot, state = checkpoint['seq'], checkpoint['events_since_snapshot'], checkpoint['state']
+    else:
+        seq, since_snapshot, state = 0, 0, projection.initial()
+
+    events = db.get_journal_events(trip_id, after_seq=seq)
+    snapshots = []
+    for event in events:
+        projection.apply(state, event)
+        since_snapshot += 1
+        if since_snapshot >= SNAPSHOT_INTERVAL:
+            snapshots.append((event['seq'], copy.deepcopy(state)))
+            since_snapshot = 0
+    head = events[-1]['seq'] if events else None
+    return state, head, since_snapshot, snapshots
+
+
+def _fold_current(trip_id: str, projection) -> Dict[str, Any]:
+    """State at the head of the journal, folded on top of the stored checkpoint (which is left alone)"""
+    return _fold_to_head(trip_id, projection)[0]
+
+
+def advance_checkpoints(trip_id: str, every: Optional[int] = None) -> List[str]:
+    """Store the head state of each projection at least `every` events behind; returns their names"""
+    if db.is_archived(trip_id):  # archives are read-only; folding them again is cheap enough
+        return []
+    every = CHECKPOINT_EVERY if every is None else every
+    backlog = db.get_projection_backlog(trip_id, list(PROJECTIONS))
+    advanced = []
+    for name, behind in backlog.items():
+        if behind == 0 or behind < every:
+            continue
+        projection = PROJECTIONS[name]
+        state, head, since_snapshot, snapshots = _fold_to_head(trip_id, projection)
+        db.save_projection_checkpoint(trip_id, name, head, since_snapshot, state, snapshots)
+        advanced.append(name)
+    return advanced
+
+
+def _fold_historical(trip_id: str, projection, as_of: str) -> Dict[str, Any]:
+    """Fold up to the last event at or before as_of, starting from the closest stored state"""
+    target_seq = db.get_journal_seq_at(trip_id, _normalise_as_of(as_of))
+
+    base_seq, state = 0, None
+    snapshot = db.get_projection_snapshot(trip_id, projection.name, target_seq)
+    if snapshot:
+        base_seq, state = snapshot['seq'], snapshot['state']
+
+    checkpoint = db.get_projection_checkpoint(trip_id, projection.name)
+    if checkpoint and base_seq < checkpoint['seq'] <= target_seq:
+        base_seq, state = checkpoint['seq'], checkpoint['state']
+
+    if state is None:
+        state = projection.initial()
+    for event in db.get_journal_events(trip_id, after_seq=base_seq, until_seq=target_seq):
+        projection.apply(state, event)
+    return state
+
+
+def _on_change(trip_id: str, change: Dict[str, Any]):
+    # Runs after the commit, so checkpoints are only ever written on the back of a write
+    advance_checkpoints(trip_id)
+
+
+db.add_change_listener(_on_change)
+
+
+def get_projection(trip_id: str, name: str, as_of: Optional[str] = None):
+    """Current (or historical, when as_of is given) view of a named projection"""
+    projection = PROJECTIONS[name]
+    if as_of:
+        state = _fold_historical(trip_id, projection, as_of)
+    else:
+        state = _fold_current(trip_id, projection)
+    return projection.view(state)
@@ -0,0 +1,78 @@
+"""
+In-process pub/sub of trip change notifications for Trip Expense Manager
+database.py publishes after each commit (usually from a worker thread); subscribers are
+asyncio queues on the server's event loop, so an idle subscriber costs a queue, not a thread.
+"""
+import asyncio
+import threading
+from typing import Any, Dict, Optional, Set
+
+import database as db
+
+# Per-subscriber backlog before it is told to resync instead
+QUEUE_SIZE = 100
+
+
+class ChangeBroker:
+    """Fan out committed changes to the subscribers of each trip"""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, trip_id: str) -> asyncio.Queue:
+        """Register a subscriber (call from the event loop)"""
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(trip_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, trip_id: str, queue: asyncio.Queue):
+        with self._lock:
+            queues = self._subscribers.get(trip_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[trip_id]
+
+    def subscriber_count(self, trip_id: Optional[str] = None) -> int:
+        with self._lock:
+            if trip_id is not None:
+                return len(self._subscribers.get(trip_id, ()))
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, trip_id: str, change: Dict[str, Any]):
+        """Thread-safe; a no-op when nobody is listening to the trip"""
+        with self._lock:
+            if not self._subscribers.get(trip_id):
+                return
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(trip_id, change)
+        else:
+            loop.call_soon_threadsafe(self._deliver, trip_id, change)
+
+    def _deliver(self, trip_id: str, change: Dict[str, Any]):
+        with self._lock:
+            queues = list(self._subscribers.get(trip_id, ()))
+        for queue in queues:
+            if queue.full():
+                # Slow consumer: drop its backlog, it only needs to know to resync
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"version": change["version"], "resync": True})
+            else:
+                queue.put_nowait(change)
+
+
+broker = ChangeBroker()
+db.add_change_listener(broker.publish)
@@ -0,0 +1,56 @@
+"""
+Events API routes - Server-Sent Events stream of trip changes
+"""
+import asyncio
+import json
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import database as db
+from pubsub import broker
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+# Comment line sent on idle streams so proxies keep them open and dead clients are noticed
+KEEPALIVE_SECONDS = 25
+
+
+def _sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("")
+async def stream_events(request: Request, trip_id: Optional[str] = None, x_trip_id: Optional[str] = Header(None)):
+    """Stream change notifications for a trip.
+
+    Accepts trip_id via query parameter (EventSource can't send headers) or X-Trip-Id header.
+    Each `change` event lists the entity ids touched; clients fetch them with /api/sync.
+    """
+    effective_trip_id = trip_id or x_trip_id
+    if not effective_trip_id:
+        raise HTTPException(status_code=400, detail="trip_id query parameter or X-Trip-Id header required")
+
+    async def stream():
+        # Subscribe before reading the version so nothing committed in between is missed
+        queue = broker.subscribe(effective_trip_id)
+        try:
+            version = await run_in_threadpool(db.get_trip_version, effective_trip_id)
+            yield _sse("hello", {"version": version}, version)
+            while not await request.is_disconnected():
+                try:
+                    change = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse("change", change, change["version"])
+        finally:
+            broker.unsubscribe(effective_trip_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
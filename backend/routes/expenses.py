@@ -1,13 +1,22 @@
 """
 Expenses API routes
 """
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, HTTPException, Header, UploadFile, File
 from typing import List
-from schemas import ExpenseCreate, ExpenseUpdate, ExpenseStatusUpdate, ExpenseResponse, LogPaymentRequest
+from schemas import (
+    ExpenseCreate, ExpenseUpdate, ExpenseStatusUpdate, ExpenseResponse, LogPaymentRequest,
+    ExpenseBatch, ExpenseBatchResponse
+)
 import database as db
+import expense_import
+from fast_json import EncodedJSONResponse, dumps, project
+from async_db import adb, run_db
 
 router = APIRouter(prefix="/api/expenses", tags=["expenses"])
 
+# Upper bound on create + update + delete items in one batch request
+MAX_BATCH_SIZE = 500
+
 
 def calculate_expense_amounts(expense: dict) -> dict:
     """Add calculated fields to expense"""
@@ -32,28 +41,104 @@ def calculate_expense_amounts(expense: dict) -> dict:
 
 
 @router.get("", response_model=List[ExpenseResponse])
-def get_expenses(x_trip_id: str = Header(...)):
+async def get_expenses(x_trip_id: str = Header(...)):
     """Get all expenses with calculated amounts"""
-    expenses = db.get_all_expenses(x_trip_id)
-    return [calculate_expense_amounts(e) for e in expenses]
+    # Rows come from the DB already typed; response_model stays for the API docs.
+    # Shaping and encoding a large trip is CPU work too, so it runs on the DB pool with the fetch
+    return EncodedJSONResponse(await run_db(_encoded_expenses, x_trip_id))
+
+
+def _encoded_expenses(trip_id: str) -> bytes:
+    expenses = db.get_all_expenses(trip_id)
+    return dumps(project((calculate_expense_amounts(e) for e in expenses), ExpenseResponse))
+
+
+@router.post("/batch", response_model=ExpenseBatchResponse)
+def apply_batch(data: ExpenseBatch, x_trip_id: str = Header(...)):
+    """Create, update and delete many expenses at once.
+
+    The whole batch is validated before anything is written and then applied in a
+    single transaction, so either every item succeeds or none does.
+    """
+    if len(data.create) + len(data.update) + len(data.delete) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {MAX_BATCH_SIZE} items")
+
+    participant_ids = {p['id'] for p in db.get_all_participants(x_trip_id)}
+    target_ids = [u.id for u in data.update] + list(data.delete)
+    existing = {e['id']: e for e in db.get_all_expenses(x_trip_id, target_ids)} if target_ids else {}
+
+    errors = []
+    for op, items in (("create", data.create), ("update", data.update)):
+        for index, item in enumerate(items):
+            if not item.participant_ids:
+                errors.append({"op": op, "index": index, "error": "At least one participant required"})
+            elif not set(item.participant_ids) <= participant_ids:
+                errors.append({"op": op, "index": index, "error": "Unknown participant"})
+    for index, item in enumerate(data.update):
+        if item.id not in existing:
+            errors.append({"op": "update", "index": index, "error": "Expense not found"})
+    for index, expense_id in enumerate(data.delete):
+        if expense_id not in existing:
+            errors.append({"op": "delete", "index": index, "error": "Expense not found"})
+        elif existing[expense_id]['invoices']:
+            errors.append({"op": "delete", "index": index, "error": "Expense is included in an invoice"})
+    if len(set(target_ids)) != len(target_ids):
+        errors.append({"op": "batch", "index": None, "error": "An expense may appear only once per batch"})
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+
+    try:
+        created_ids = db.apply_expense_batch(
+            trip_id=x_trip_id,
+            creates=[item.model_dump() for item in data.create],
+            updates=[item.model_dump() for item in data.update],
+            deletes=list(data.delete)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    updated_ids = [u.id for u in data.update]
+    rows = {}
+    if created_ids or updated_ids:
+        rows = {e['id']: calculate_expense_amounts(e) for e in db.get_all_expenses(x_trip_id, created_ids + updated_ids)}
+    return {
+        "created": [rows[i] for i in created_ids if i in rows],
+        "updated": [rows[i] for i in updated_ids if i in rows],
+        "deleted": list(data.delete)
+    }
+
+
+@router.post("/import")
+def import_expenses(file: UploadFile = File(...), dry_run: bool = False, x_trip_id: str = Header(...)):
+    """Import expenses from a CSV upload (name, amount, currency, buffer_rate, participants).
+
+    Participants are listed by name, separated with ; | or ,. Valid rows are imported
+    and a per-line report is returned for the rest; dry_run only validates.
+    """
+    if not db.get_trip(x_trip_id):
+        raise HTTPException(status_code=404, detail="Trip not found")
+    try:
+        return expense_import.import_expenses_csv(x_trip_id, file.file, dry_run=dry_run)
+    except expense_import.ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/{expense_id}", response_model=ExpenseResponse)
-def get_expense(expense_id: int):
+async def get_expense(expense_id: int):
     """Get a single expense by ID"""
-    expense = db.get_expense_by_id(expense_id)
+    expense = await adb.get_expense_by_id(expense_id)
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     return calculate_expense_amounts(expense)
 
 
 @router.post("", response_model=ExpenseResponse)
-def create_expense(data: ExpenseCreate, x_trip_id: str = Header(...)):
+async def create_expense(data: ExpenseCreate, x_trip_id: str = Header(...)):
     """Create a new expense"""
     if not data.participant_ids:
         raise HTTPException(status_code=400, detail="At least one participant required")
     
-    expense_id = db.add_expense(
+    expense_id = await adb.add_expense(
         trip_id=x_trip_id,
         name=data.name,
         amount=data.amount,
@@ -62,18 +147,18 @@ def create_expense(data: ExpenseCreate, x_trip_id: str = Header(...)):
         participant_ids=data.participant_ids
     )
     
-    expense = db.get_expense_by_id(expense_id)
+    expense = await adb.get_expense_by_id(expense_id)
     return calculate_expense_amounts(expense)
 
 
 @router.put("/{expense_id}", response_model=ExpenseResponse)
-def update_expense(expense_id: int, data: ExpenseUpdate):
+async def update_expense(expense_id: int, data: ExpenseUpdate):
     """Update an expense"""
-    existing = db.get_expense_by_id(expense_id)
+    existing = await adb.get_expense_by_id(expense_id)
     if not existing:
         raise HTTPException(status_code=404, detail="Expense not found")
     
-    db.update_expense(
+    await adb.update_expense(
         expense_id=expense_id,
         name=data.name,
         amount=data.amount,
@@ -82,7 +167,7 @@ def update_expense(expense_id: int, data: ExpenseUpdate):
         participant_ids=data.participant_ids
     )
     
-    expense = db.get_expense_by_id(expense_id)
+    expense = await adb.get_expense_by_id(expense_id)
     return calculate_expense_amounts(expense)
 
 
@@ -117,10 +202,10 @@ def log_payment(expense_id: int, data: LogPaymentRequest):
 
 
 @router.delete("/{expense_id}")
-def delete_expense(expense_id: int):
+async def delete_expense(expense_id: int):
     """Delete an expense"""
     try:
-        db.delete_expense(expense_id)
+        await adb.delete_expense(expense_id)
         return {"message": "Expense deleted"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -4,6 +4,7 @@ import os
 import sqlite3
 import zipfile
 from fastapi import APIRouter, Header, HTTPException, Response
+import database
 from database import get_db_connection
 from auth import verify_admin_token
 from typing import Optional
@@ -18,13 +19,17 @@ def export_database(x_admin_token: Optional[str] = Header(None)):
     """
     if not verify_admin_token(x_admin_token):
         raise HTTPException(status_code=401, detail="Admin authentication required")
+    if database.SHARDED:
+        raise HTTPException(status_code=409, detail="Sharded storage is backed up by copying the data/trips directory")
 
     conn = get_db_connection()
     cursor = conn.cursor()
 
     # Get all table names
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = [row['name'] for row in cursor.fetchall() if not row['name'].startswith('sqlite_')]
+    # Skip SQLite internals and the FTS index (rebuilt from the source tables on import)
+    tables = [row['name'] for row in cursor.fetchall()
+              if not row['name'].startswith('sqlite_') and not row['name'].startswith('search_index')]
 
     # Create in-memory ZIP file
     zip_buffer = io.BytesIO()
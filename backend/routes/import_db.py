@@ -4,10 +4,12 @@ import json
 import zipfile
 import sqlite3
 from fastapi import APIRouter, Header, HTTPException, UploadFile, File, Response
+import database
 from database import get_db_connection
 from auth import verify_admin_token
 from typing import Optional
 from version import APP_VERSION
+from async_db import run_db
 
 router = APIRouter(prefix="/api/import", tags=["import"])
 
@@ -23,12 +25,19 @@ async def import_database(
     """
     if not verify_admin_token(x_admin_token):
         raise HTTPException(status_code=401, detail="Admin authentication required")
+    if database.SHARDED:
+        raise HTTPException(status_code=409, detail="Sharded storage is restored by replacing the data/trips directory")
 
     if not file.filename.endswith('.zip'):
         raise HTTPException(status_code=400, detail="Invalid file format. Please upload a ZIP file.")
 
     content = await file.read()
-    
+    # Unzipping and restoring are blocking; keep them off the event loop
+    return await run_db(restore_backup, content)
+
+
+def restore_backup(content: bytes) -> dict:
+    """Replace the database with the contents of a ZIP backup"""
     try:
         with zipfile.ZipFile(io.BytesIO(content)) as zip_file:
             # 1. Check Metadata & Version
@@ -63,7 +72,7 @@ async def import_database(
                 all_tables = [
                     "receipt_items", "invoice_items", "expense_participants", 
                     "receipts", "invoices", "refunds", "expenses", "participants", "settings",
-                    "trips"
+                    "trips", "journal", "category_keywords"
                 ]
                 
                 for table in all_tables:
@@ -73,7 +82,8 @@ async def import_database(
                 # Include 'trips' for multi-trip support
                 tables_to_import = [
                     "trips", "settings", "participants", "expenses", "refunds", 
-                    "invoices", "receipts", "expense_participants", "invoice_items", "receipt_items"
+                    "invoices", "receipts", "expense_participants", "invoice_items", "receipt_items",
+                    "journal", "category_keywords"
                 ]
                 
                 for table in tables_to_import:
@@ -111,8 +121,11 @@ async def import_database(
             
             # Run migration to handle orphaned data (NULL trip_id)
             # This creates Legacy Trip if needed and assigns orphaned records
-            from database import init_db
+            from database import init_db, rebuild_derived_data
             init_db()
+            
+            # Derived tables are not trusted from the backup; rebuild from restored rows
+            rebuild_derived_data()
                 
             return {"success": True, "message": "Database successfully restored from backup."}
             
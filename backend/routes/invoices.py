@@ -4,9 +4,13 @@ Invoices API routes - versioned invoices with PDF generation
 from fastapi import APIRouter, HTTPException, Header
 from fastapi.responses import Response
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from schemas import InvoiceData, InvoiceExpenseItem, InvoiceGenerationRequest
 import database as db
+from cache import response_cache
+from fast_json import EncodedJSONResponse, FastJSONResponse, dumps
+from async_db import run_db
+from idempotency import Claim, run_idempotent
 from pdf_generator import pdf_generator
 
 router = APIRouter(prefix="/api/invoices", tags=["invoices"])
@@ -17,9 +21,9 @@ router = APIRouter(prefix="/api/invoices", tags=["invoices"])
 @router.get("/")
 def get_invoices(x_trip_id: str = Header(...)):
     """Get all invoices for list view"""
-    return {
+    return FastJSONResponse({
         "invoices": db.get_all_invoices_with_status(x_trip_id)
-    }
+    })
 
 
 @router.get("/details/{invoice_id}")
@@ -56,16 +60,18 @@ def get_invoice_details(invoice_id: int):
 
 
 @router.get("/overview/all")
-def get_overview(x_trip_id: str = Header(...)):
-    """Get all invoices, receipts, and stats for overview page"""
-    return {
-        "stats": db.get_overview_stats(x_trip_id),
-        "cash_flow": db.get_cash_flow_stats(x_trip_id),
-        "financial_dashboard": db.get_financial_dashboard_data(x_trip_id),
-        "expense_breakdown": db.get_expense_breakdown(x_trip_id),
-        "invoices": db.get_all_invoices_with_status(x_trip_id),
-        "receipts": db.get_all_receipts(x_trip_id)
-    }
+async def get_overview(x_trip_id: str = Header(...)):
+    """Get all invoices, receipts, and stats for overview page (cached until the trip changes)"""
+    # Encoded on the DB pool too: the overview of a large trip is a big document
+    return EncodedJSONResponse(await run_db(lambda: dumps(response_cache.get_or_compute(
+        x_trip_id, "invoices.overview", (), lambda: {
+            "stats": db.get_overview_stats(x_trip_id),
+            "cash_flow": db.get_cash_flow_stats(x_trip_id),
+            "financial_dashboard": db.get_financial_dashboard_data(x_trip_id),
+            "expense_breakdown": db.get_expense_breakdown(x_trip_id),
+            "invoices": db.get_all_invoices_with_status(x_trip_id),
+            "receipts": db.get_all_receipts(x_trip_id)
+        }))))
 
 
 @router.get("/download/{invoice_id}")
@@ -189,8 +195,20 @@ def get_invoice_data(participant_name: str, x_trip_id: str = Header(...)) -> Inv
 
 
 @router.post("/{participant_name}/generate")
-def generate_invoice(participant_name: str, request: InvoiceGenerationRequest = None, x_trip_id: str = Header(...)):
-    """Generate and save a new invoice version, returning PDF download link"""
+def generate_invoice(participant_name: str, response: Response, request: InvoiceGenerationRequest = None,
+                     x_trip_id: str = Header(...), idempotency_key: Optional[str] = Header(None)):
+    """Generate and save a new invoice version, returning PDF download link.
+
+    With an Idempotency-Key header a retried request returns the first response
+    instead of creating another invoice.
+    """
+    payload = {"participant": participant_name, "request": request.model_dump() if request else None}
+    return run_idempotent(idempotency_key, f"{x_trip_id}:invoices.generate", payload, response,
+                          lambda claim: create_invoice_for(participant_name, request, x_trip_id, claim))
+
+
+def create_invoice_for(participant_name: str, request: Optional[InvoiceGenerationRequest], x_trip_id: str,
+                       claim: Optional[Claim] = None) -> dict:
     invoice_data = get_invoice_data(participant_name, x_trip_id)
     
     if not invoice_data.has_new_expenses:
@@ -217,40 +235,30 @@ def generate_invoice(participant_name: str, request: InvoiceGenerationRequest =
     participant = db.get_participant_by_name(x_trip_id, participant_name)
     settings = db.get_settings(x_trip_id)
     
-    # 1. create placeholder invoice to get ID
+    def respond(invoice_id: int) -> dict:
+        return {
+            "message": f"Invoice #{invoice_id} generated for {participant_name}",
+            "invoice_id": invoice_id,
+            "total": invoice_data.this_invoice_total,
+            "grand_total": invoice_data.grand_total
+        }
+
+    # Number, items, ledger and the Idempotency-Key's response are written in one transaction;
+    # version is the invoice id
     expense_ids = [item.expense_id for item in invoice_data.new_expenses]
+    try:
+        invoice_id = db.issue_invoice(
+            trip_id=x_trip_id,
+            participant_id=participant['id'],
+            total_thb=invoice_data.this_invoice_total,
+            expense_ids=expense_ids,
+            idempotency=claim,
+            respond=respond
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
-    # We pass 0 as temporary version, and empty PDF path
-    invoice_id = db.create_invoice(
-        trip_id=x_trip_id,
-        participant_id=participant['id'],
-        version=0, 
-        total_thb=invoice_data.this_invoice_total,
-        pdf_path="",
-        expense_ids=expense_ids
-    )
-    
-    # 2. Update data with actual ID
-    invoice_data = InvoiceData(
-        participant_name=invoice_data.participant_name,
-        version=invoice_id, # Use ID as version
-        generated_at=invoice_data.generated_at,
-        previous_invoices=invoice_data.previous_invoices,
-        new_expenses=invoice_data.new_expenses,
-        this_invoice_total=invoice_data.this_invoice_total,
-        grand_total=invoice_data.grand_total,
-        has_new_expenses=invoice_data.has_new_expenses
-    )
-    
-    # 3. Update version in record (no PDF storage needed - generated on-the-fly)
-    db.update_invoice_pdf(invoice_id, "", invoice_id)
-    
-    return {
-        "message": f"Invoice #{invoice_data.version} generated for {participant_name}",
-        "invoice_id": invoice_id,
-        "total": invoice_data.this_invoice_total,
-        "grand_total": invoice_data.grand_total
-    }
+    return respond(invoice_id)
 
 
 @router.get("/{participant_name}/pdf")
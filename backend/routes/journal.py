@@ -0,0 +1,29 @@
+"""
+Journal API routes - mutation history and replayable projections
+"""
+from fastapi import APIRouter, HTTPException, Header
+from typing import Optional
+import database as db
+import projections
+
+router = APIRouter(prefix="/api/journal", tags=["journal"])
+
+
+@router.get("")
+def get_journal(since: int = 0, x_trip_id: str = Header(...)):
+    """Get journal events for the trip after sequence number `since`"""
+    return {
+        "events": db.get_journal_events(x_trip_id, after_seq=since)
+    }
+
+
+@router.get("/projections/{name}")
+def get_projection(name: str, as_of: Optional[str] = None, x_trip_id: str = Header(...)):
+    """Get a projection (overview_stats, cash_flow, balances), optionally as it was at `as_of`"""
+    if name not in projections.PROJECTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown projection '{name}'")
+    return {
+        "name": name,
+        "as_of": as_of,
+        "data": projections.get_projection(x_trip_id, name, as_of)
+    }
@@ -5,14 +5,16 @@ from fastapi import APIRouter, Header, HTTPException
 from typing import List
 from schemas import ParticipantResponse, ParticipantCreate
 import database as db
+from fast_json import FastJSONResponse, project
+from async_db import adb
 
 router = APIRouter(prefix="/api/participants", tags=["participants"])
 
 
 @router.get("", response_model=List[ParticipantResponse])
-def get_participants(x_trip_id: str = Header(...)):
+async def get_participants(x_trip_id: str = Header(...)):
     """Get all participants"""
-    return db.get_all_participants(x_trip_id)
+    return FastJSONResponse(project(await adb.get_all_participants(x_trip_id), ParticipantResponse))
 
 
 @router.post("", response_model=ParticipantResponse)
@@ -9,6 +9,8 @@ from typing import Optional
 import database
 from schemas import ReceiptData, ReceiptItem, ReceiptGenerationRequest
 from pdf_generator import pdf_generator
+from fast_json import FastJSONResponse
+from idempotency import Claim, run_idempotent
 
 router = APIRouter(prefix="/api/receipts", tags=["receipts"])
 
@@ -17,9 +19,9 @@ router = APIRouter(prefix="/api/receipts", tags=["receipts"])
 @router.get("/")
 def get_receipts(x_trip_id: str = Header(...)):
     """Get all receipts for list view"""
-    return {
+    return FastJSONResponse({
         "receipts": database.get_all_receipts(x_trip_id)
-    }
+    })
 
 
 @router.get("/details/{receipt_id}")
@@ -177,14 +179,21 @@ def get_receipt_data(participant_name: str, payment_method: Optional[str] = None
 
 
 @router.post("/{participant_name}/generate")
-def generate_receipt(participant_name: str, request: ReceiptGenerationRequest, x_trip_id: str = Header(...)):
-    """Generate receipt PDF for selected unpaid invoices"""
+def generate_receipt(participant_name: str, request: ReceiptGenerationRequest, response: Response,
+                     x_trip_id: str = Header(...), idempotency_key: Optional[str] = Header(None)):
+    """Generate receipt PDF for selected unpaid invoices (retries with the same Idempotency-Key replay the first response)"""
+    payload = {"participant": participant_name, "request": request.model_dump()}
+    return run_idempotent(idempotency_key, f"{x_trip_id}:receipts.generate", payload, response,
+                          lambda claim: create_receipt_for(participant_name, request, x_trip_id, claim))
+
+
+def create_receipt_for(participant_name: str, request: ReceiptGenerationRequest, x_trip_id: str,
+                       claim: Optional[Claim] = None) -> dict:
     participant = database.get_participant_by_name(x_trip_id, participant_name)
     if not participant:
         raise HTTPException(status_code=404, detail="Participant not found")
     
     participant_id = participant['id']
-    settings = database.get_settings(x_trip_id)
     
     # Get all unpaid invoices
     all_unpaid = database.get_unpaid_invoices(participant_id)
@@ -195,8 +204,7 @@ def generate_receipt(participant_name: str, request: ReceiptGenerationRequest, x
     if not target_invoices:
         raise HTTPException(status_code=400, detail="No matching unpaid invoices found for selection")
     
-    # Build receipt data
-    items = []
+    # Total the shares being paid
     total = 0
     invoice_ids = []
     
@@ -206,49 +214,31 @@ def generate_receipt(participant_name: str, request: ReceiptGenerationRequest, x
         for expense in expenses:
             total_participants = expense['total_participants']
             share_thb = expense['amount'] * expense['buffer_rate'] / total_participants if expense['currency'] == 'JPY' else expense['amount'] / total_participants
-            
-            items.append(ReceiptItem(
-                expense_name=expense['name'],
-                original_amount=expense['amount'],
-                currency=expense['currency'],
-                buffer_rate=expense['buffer_rate'] if expense['currency'] == 'JPY' else None,
-                share=f"1/{total_participants}",
-                amount_paid=round(share_thb, 2)
-            ))
             total += share_thb
     
-    # 1. Create Receipt Record Placeholder
-    receipt_id = database.create_receipt(
-        trip_id=x_trip_id,
-        participant_id=participant_id,
-        receipt_number=0, # Placeholder
-        total_thb=round(total, 2),
-        payment_method=request.payment_method,
-        pdf_path="",
-        invoice_ids=invoice_ids
-    )
-    
-    # 2. Prepare Data with Real ID
-    receipt_number = receipt_id
-    
-    receipt_data = ReceiptData(
-        participant_name=participant_name,
-        receipt_number=receipt_number,
-        generated_at=datetime.now().strftime("%Y-%m-%d %H:%M"),
-        trip_name=settings['trip_name'],
-        items=items,
-        total_paid=round(total, 2),
-        payment_method=request.payment_method
-    )
-    
-    # 3. Update Database (no PDF storage needed - generated on-the-fly)
-    database.update_receipt_pdf(receipt_id, "", receipt_number)
+    def respond(receipt_id: int) -> dict:
+        return {
+            "message": f"Receipt #{receipt_id} generated for {participant_name}",
+            "receipt_id": receipt_id,
+            "total": round(total, 2)
+        }
+
+    # Number, items, ledger, cash flow and the Idempotency-Key's response are written in one
+    # transaction; the number is the receipt id
+    try:
+        receipt_id = database.issue_receipt(
+            trip_id=x_trip_id,
+            participant_id=participant_id,
+            total_thb=round(total, 2),
+            payment_method=request.payment_method,
+            invoice_ids=invoice_ids,
+            idempotency=claim,
+            respond=respond
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
-    return {
-        "message": f"Receipt #{receipt_number} generated for {participant_name}",
-        "receipt_id": receipt_id,
-        "total": round(total, 2)
-    }
+    return respond(receipt_id)
 
 
 @router.get("/{participant_name}/pdf")
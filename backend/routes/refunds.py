@@ -7,6 +7,7 @@ from datetime import datetime
 from typing import List
 from schemas import RefundData, RefundCollectedItem, RefundActualItem, ReconciliationItem
 import database as db
+from cache import response_cache
 from pdf_generator import pdf_generator
 
 router = APIRouter(prefix="/api/refunds", tags=["refunds"])
@@ -83,20 +84,17 @@ def calculate_participant_refund(trip_id: str, participant_id: int, participant_
 
 @router.get("/reconciliation")
 def get_reconciliation(x_trip_id: str = Header(...)) -> List[ReconciliationItem]:
-    """Get reconciliation summary for all participants"""
-    participants = db.get_all_participants(x_trip_id)
-    results = []
-    
-    for p in participants:
-        refund_data = calculate_participant_refund(x_trip_id, p['id'], p['name'])
-        results.append(ReconciliationItem(
-            participant_name=p['name'],
-            total_collected=refund_data.total_collected,
-            total_actual=refund_data.total_actual,
-            surplus_deficit=refund_data.refund_amount
-        ))
-    
-    return results
+    """Get reconciliation summary for all participants (read from the balance ledger, cached until the trip changes)"""
+    rows = response_cache.get_or_compute(x_trip_id, "refunds.reconciliation", (), lambda: [
+        ReconciliationItem(
+            participant_name=b['participant_name'],
+            total_collected=round(b['collected_thb'], 2),
+            total_actual=round(b['actual_thb'], 2),
+            surplus_deficit=round(b['collected_thb'] - b['actual_thb'], 2)
+        ).model_dump()
+        for b in db.get_participant_balances(x_trip_id)
+    ])
+    return [ReconciliationItem(**row) for row in rows]
 
 
 @router.get("/{participant_name}")
@@ -0,0 +1,22 @@
+"""
+Search API routes - server-side full-text search scoped to a trip
+"""
+from fastapi import APIRouter, Header, Query
+from typing import List, Optional
+import database as db
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+
+@router.get("")
+def search(
+    q: str,
+    types: Optional[List[str]] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    x_trip_id: str = Header(...)
+):
+    """Prefix search across expenses, participants and invoices (ranked by relevance)"""
+    return {
+        "query": q,
+        "results": db.search(x_trip_id, q, entities=types, limit=limit)
+    }
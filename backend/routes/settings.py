@@ -2,7 +2,7 @@
 Settings API routes
 """
 from fastapi import APIRouter, Header
-from schemas import SettingsResponse, SettingsUpdate
+from schemas import SettingsResponse, SettingsUpdate, CategoryKeywordsUpdate
 import database as db
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
@@ -23,3 +23,20 @@ def update_settings(data: SettingsUpdate, x_trip_id: str = Header(...)):
         trip_name=data.trip_name
     )
     return {"message": "Settings updated", "data": db.get_settings(x_trip_id)}
+
+
+@router.get("/categories")
+def get_category_keywords(x_trip_id: str = Header(...)):
+    """Get the expense category keyword table for this trip"""
+    return db.get_category_keywords(x_trip_id)
+
+
+@router.put("/categories")
+def update_category_keywords(data: CategoryKeywordsUpdate, x_trip_id: str = Header(...)):
+    """Replace the category keyword table and reclassify existing expenses"""
+    reclassified = db.set_category_keywords(x_trip_id, data.categories)
+    return {
+        "message": "Categories updated",
+        "reclassified": reclassified,
+        "data": db.get_category_keywords(x_trip_id)
+    }
@@ -0,0 +1,51 @@
+"""
+Sync API routes - delta sync so the SPA only downloads rows that changed
+"""
+from fastapi import APIRouter, Header, Query
+from schemas import SyncResponse, ParticipantResponse, ExpenseResponse, SettingsResponse
+from fast_json import FastJSONResponse, project
+from async_db import run_db
+from routes.expenses import calculate_expense_amounts
+import database as db
+
+router = APIRouter(prefix="/api/sync", tags=["sync"])
+
+
+@router.get("", response_model=SyncResponse)
+async def sync(since: int = Query(0, ge=0), x_trip_id: str = Header(...)):
+    """Rows inserted, updated or deleted since trip version `since` (0 = everything).
+
+    When `full` is true the collections hold every row and replace the client's copy.
+    Rows are read after the version, so a concurrent write may show up early; it is
+    reported again on the next sync.
+    """
+    return FastJSONResponse(await run_db(sync_payload, x_trip_id, since))
+
+
+def sync_payload(x_trip_id: str, since: int) -> dict:
+    """Blocking part of the sync response (runs on the DB pool)"""
+    changes = db.get_changes_since(x_trip_id, since)
+    full = changes["full"]
+
+    def collection(entity, fetch):
+        ids = None if full else changes["upserted"][entity]
+        return {
+            "upserted": fetch(x_trip_id, ids) if full or ids else [],
+            "deleted": changes["deleted"][entity],
+        }
+
+    response = {
+        "version": changes["version"],
+        "full": full,
+        "participants": collection("participant", db.get_all_participants),
+        "expenses": collection("expense", db.get_all_expenses),
+        "invoices": collection("invoice", db.get_all_invoices_with_status),
+        "receipts": collection("receipt", db.get_all_receipts),
+    }
+    response["participants"]["upserted"] = project(response["participants"]["upserted"], ParticipantResponse)
+    response["expenses"]["upserted"] = project(
+        (calculate_expense_amounts(e) for e in response["expenses"]["upserted"]), ExpenseResponse)
+    response["settings"] = None
+    if full or changes["upserted"]["settings"]:
+        response["settings"] = project([db.get_settings(x_trip_id)], SettingsResponse)[0]
+    return response
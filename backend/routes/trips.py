@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, Body, Header
 from typing import List, Dict
 import database as db
+from auth import verify_admin_token
+from cache import response_cache, GLOBAL
 
 router = APIRouter(prefix="/api/trips", tags=["trips"])
 
@@ -39,4 +41,42 @@ def get_admin_dashboard(x_admin_token: str = Header(None, alias="X-Admin-Token")
     if x_admin_token != expected_token:
          raise HTTPException(status_code=401, detail="Invalid Admin Token")
     
-    return db.get_admin_dashboard_stats()
+    return response_cache.get_or_compute(GLOBAL, "trips.admin_dashboard", (), db.get_admin_dashboard_stats)
+
+
+@router.post("/{trip_id}/archive")
+def archive_trip(trip_id: str, x_admin_token: str = Header(None, alias="X-Admin-Token")):
+    """Move a finished trip into compressed cold storage; it stays readable. Requires Admin Token."""
+    if not verify_admin_token(x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid Admin Token")
+    if not db.get_trip(trip_id):
+        raise HTTPException(status_code=404, detail="Trip not found")
+    try:
+        return db.archive_trip(trip_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/{trip_id}/unarchive")
+def unarchive_trip(trip_id: str, x_admin_token: str = Header(None, alias="X-Admin-Token")):
+    """Move an archived trip back into hot storage. Requires Admin Token."""
+    if not verify_admin_token(x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid Admin Token")
+    if not db.get_trip(trip_id):
+        raise HTTPException(status_code=404, detail="Trip not found")
+    try:
+        return db.unarchive_trip(trip_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/admin/cache")
+def get_cache_stats(x_admin_token: str = Header(None, alias="X-Admin-Token")):
+    """Response cache hit/miss counters (and open trip databases when sharded). Requires Admin Token."""
+    if not verify_admin_token(x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid Admin Token")
+    stats = response_cache.stats()
+    stats["archives"] = db.archive_stats()
+    if db.SHARDED:
+        stats["shards"] = db.shard_stats()
+    return stats
@@ -2,7 +2,7 @@
 Pydantic schemas for request/response validation
 """
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import date, datetime
 
 
@@ -19,6 +19,10 @@ class SettingsUpdate(BaseModel):
     trip_name: Optional[str] = None
 
 
+class CategoryKeywordsUpdate(BaseModel):
+    categories: Dict[str, List[str]] = {}  # Ordered: first matching category wins; empty resets to defaults
+
+
 # === Participants ===
 
 class ParticipantResponse(BaseModel):
@@ -49,6 +53,16 @@ class ExpenseUpdate(BaseModel):
     participant_ids: List[int]
 
 
+class ExpenseBatchUpdate(ExpenseUpdate):
+    id: int
+
+
+class ExpenseBatch(BaseModel):
+    create: List[ExpenseCreate] = []
+    update: List[ExpenseBatchUpdate] = []
+    delete: List[int] = []
+
+
 class ExpenseStatusUpdate(BaseModel):
     status: str  # 'pending' or 'collected'
 
@@ -66,6 +80,7 @@ class ExpenseResponse(BaseModel):
     participant_ids: List[int] = []
     invoices: List[int] = []
     is_invoiced: bool = False
+    category: Optional[str] = None
     
     # Actuals Info
     is_paid: bool = False
@@ -78,6 +93,12 @@ class ExpenseResponse(BaseModel):
     created_at: Optional[str] = None
 
 
+class ExpenseBatchResponse(BaseModel):
+    created: List[ExpenseResponse] = []
+    updated: List[ExpenseResponse] = []
+    deleted: List[int] = []
+
+
 class LogPaymentRequest(BaseModel):
     date: str
     method: Optional[str] = None
@@ -203,3 +224,28 @@ class ReceiptGenerationRequest(BaseModel):
     payment_method: str = "Cash"
     invoice_ids: List[int]
 
+
+
+# === Sync ===
+
+class SyncChanges(BaseModel):
+    upserted: List[Dict[str, Any]] = []
+    deleted: List[int] = []
+
+
+class ParticipantSyncChanges(SyncChanges):
+    upserted: List[ParticipantResponse] = []
+
+
+class ExpenseSyncChanges(SyncChanges):
+    upserted: List[ExpenseResponse] = []
+
+
+class SyncResponse(BaseModel):
+    version: int
+    full: bool = False
+    settings: Optional[SettingsResponse] = None
+    participants: ParticipantSyncChanges = ParticipantSyncChanges()
+    expenses: ExpenseSyncChanges = ExpenseSyncChanges()
+    invoices: SyncChanges = SyncChanges()
+    receipts: SyncChanges = SyncChanges()
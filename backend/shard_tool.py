@@ -0,0 +1,84 @@
+"""
+Split a single-file database into per-trip files, or rebuild the sharded catalog
+
+The source database is left untouched; trips that already have a file are skipped.
+Start the server with DB_SHARDING=1 afterwards.
+
+Usage:
+    python shard_tool.py split [--source PATH]
+    python shard_tool.py reindex
+    python shard_tool.py verify
+    python shard_tool.py rebuild
+"""
+import argparse
+import sqlite3
+import sys
+
+import database as db
+import shards
+
+def split(source=None) -> int:
+    source = source or db.DATABASE_PATH
+    conn = sqlite3.connect(source)
+    trip_ids = [row[0] for row in conn.execute("SELECT id FROM trips ORDER BY created_at")]
+    conn.close()
+
+    db.SHARDED = True
+    created = 0
+    for trip_id in trip_ids:
+        path = shards.shard_path(db.DATABASE_PATH, trip_id)
+        if path is None:
+            print(f"Skipping trip {trip_id!r}: id can't be used as a file name")
+            continue
+        if db._shards.exists(path):
+            continue
+        db.create_shard(trip_id)
+        shards.copy_trip(source, path, trip_id)
+        with db.trip_scope(trip_id):
+            db.rebuild_search_index()
+        db.sync_catalog(trip_id)
+        created += 1
+    print(f"Split {created} trip(s) into {shards.shard_dir(db.DATABASE_PATH)} ({len(trip_ids) - created} skipped)")
+    return 0
+
+
+def reindex() -> int:
+    db.SHARDED = True
+    trip_ids = shards.trip_ids(db.DATABASE_PATH)
+    for trip_id in trip_ids:
+        db.sync_catalog(trip_id)
+    print(f"Catalog refreshed for {len(trip_ids)} trip(s)")
+    return 0
+
+
+def verify() -> int:
+    """Check every trip file's balance ledger; exits 1 if any row is off"""
+    db.SHARDED = True
+    mismatches = db.verify_balance_ledger()  # runs in each trip's file
+    for mismatch in mismatches:
+        print(f"Trip {mismatch['trip_id']}: {mismatch['participant_name']} {mismatch['differences']}")
+    print(f"{len(mismatches)} ledger mismatch(es) in {len(shards.trip_ids(db.DATABASE_PATH))} trip(s)")
+    return 1 if mismatches else 0
+
+
+def rebuild() -> int:
+    """Rebuild the ledger, cash flow, search index and projections of every trip file"""
+    db.SHARDED = True
+    db.rebuild_derived_data()
+    print(f"Derived data rebuilt for {len(shards.trip_ids(db.DATABASE_PATH))} trip(s)")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Database-per-trip storage maintenance")
+    parser.add_argument("command", choices=["split", "reindex", "verify", "rebuild"])
+    parser.add_argument("--source", default=None, help="Single-file database to split (default: DATABASE_PATH)")
+    args = parser.parse_args(argv)
+
+    if args.command == "split":
+        return split(args.source)
+    return {"reindex": reindex, "verify": verify, "rebuild": rebuild}[args.command]()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
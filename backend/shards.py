@@ -0,0 +1,208 @@
+"""
+Database-per-trip storage for Trip Expense Manager
+In sharded mode every trip lives in its own SQLite file under data/trips/, so one busy
+trip's writes never lock another's, and a small catalog database next to them lists
+the trips with their dashboard figures. Open connections are kept in a bounded LRU.
+"""
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Upper bound on open connections across all trip files (idle ones are closed LRU-first)
+MAX_OPEN = int(os.environ.get("DB_SHARD_CONNECTIONS", "64"))
+
+# Trip ids come from request headers; only plain ids may become file names
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Child tables without a trip_id column, reached through their parent's rows
+CHILD_TABLES = {
+    "expense_participants": ("expense_id", "expenses"),
+    "invoice_items": ("invoice_id", "invoices"),
+    "receipt_items": ("receipt_id", "receipts"),
+}
+
+
+def shard_dir(database_path: str) -> str:
+    return os.path.join(os.path.dirname(database_path), "trips")
+
+
+def catalog_path(database_path: str) -> str:
+    return os.path.join(shard_dir(database_path), "catalog.db")
+
+
+def shard_path(database_path: str, trip_id: str) -> Optional[str]:
+    """File of a trip's database, or None if the id can't name a file"""
+    if not is_safe_id(trip_id):
+        return None
+    return os.path.join(shard_dir(database_path), f"{trip_id}.db")
+
+
+def is_safe_id(trip_id: Optional[str]) -> bool:
+    return bool(trip_id) and _SAFE_ID.match(trip_id) is not None
+
+
+def trip_ids(database_path: str) -> List[str]:
+    """Trips that have a file in the shard directory (archived trips don't)"""
+    directory = shard_dir(database_path)
+    if not os.path.isdir(directory):
+        return []
+    catalog = os.path.basename(catalog_path(database_path))
+    return [name[:-len(".db")] for name in sorted(os.listdir(directory)) if name.endswith(".db") and name != catalog]
+
+
+# === Moving a trip's rows between files ===
+
+def trip_rows(conn, trip_id: str, schema: str = "main") -> Iterator[Tuple[str, List[str], str, tuple]]:
+    """(table, columns, WHERE clause, params) selecting one trip's rows in every table of `schema`.
+
+    Child tables come first so deletes never leave dangling items behind.
+    """
+    tables = [row[0] for row in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")
+              if not row[0].startswith(("sqlite_", "search_index"))]
+    tables.sort(key=lambda table: table not in CHILD_TABLES)
+    for table in tables:
+        columns = [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+        if table == "trips":
+            yield table, columns, "id = ?", (trip_id,)
+        elif table == "idempotency_keys":
+            yield table, columns, "scope LIKE ? || ':%'", (trip_id,)
+        elif "trip_id" in columns:
+            yield table, columns, "trip_id = ?", (trip_id,)
+        elif table in CHILD_TABLES:
+            key, parent = CHILD_TABLES[table]
+            yield table, columns, f"{key} IN (SELECT id FROM {schema}.{parent} WHERE trip_id = ?)", (trip_id,)
+
+
+def copy_trip(source: str, target: str, trip_id: str):
+    """Copy one trip's rows from the source file into target (whose schema must already exist)"""
+    conn = sqlite3.connect(target)
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (source,))
+        with conn:
+            for table, columns, where, params in list(trip_rows(conn, trip_id, "src")):
+                cols = ", ".join(columns)
+                conn.execute(f"INSERT OR REPLACE INTO main.{table} ({cols}) SELECT {cols} FROM src.{table} WHERE {where}", params)
+        conn.execute("DETACH DATABASE src")
+    finally:
+        conn.close()
+
+
+def clone_schema(source: str, target: str):
+    """Create source's tables, indexes and triggers in a new, empty target file"""
+    src = sqlite3.connect(source)
+    try:
+        # SQLite creates sqlite_sequence and the FTS shadow tables itself
+        statements = [row[1] for row in src.execute(
+            "SELECT name, sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY type = 'trigger', type = 'index', rowid"
+        ) if not row[0].startswith(("sqlite_", "search_index_"))]
+    finally:
+        src.close()
+    conn = sqlite3.connect(target)
+    try:
+        for sql in statements:
+            conn.execute(sql)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class ShardPool:
+    """Bounded LRU of open connections, keyed by database file"""
+
+    def __init__(self, connect: Callable[[str], Any], initialise: Callable[[str], None], max_open: int = MAX_OPEN):
+        self._connect = connect        # opens a connection usable from any thread
+        self._initialise = initialise  # creates the schema in a file the first time this process opens it
+        self.max_open = max_open
+        self._idle: "OrderedDict[str, List[Any]]" = OrderedDict()  # least recently used file first
+        self._ready: Dict[str, threading.Event] = {}  # set once a file's schema is in place
+        self._initialiser: Dict[str, int] = {}
+        self._open = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "opens": 0, "evictions": 0}
+
+    def exists(self, path: str) -> bool:
+        return path in self._ready or os.path.exists(path)
+
+    def acquire(self, path: str):
+        """An idle connection to path, or a new one (the file is created and initialised if needed)"""
+        with self._lock:
+            idle = self._idle.get(path)
+            if idle:
+                self._idle.move_to_end(path)
+                self.stats["hits"] += 1
+                return idle.pop()
+            ready = self._ready.get(path)
+            fresh = ready is None
+            if fresh:
+                ready = self._ready[path] = threading.Event()
+                self._initialiser[path] = threading.get_ident()
+            else:
+                self._open += 1
+                self.stats["opens"] += 1
+                self._evict()
+        if fresh:
+            try:
+                # Creates the schema through get_db, which re-enters acquire for the (now known) path
+                self._initialise(path)
+            except Exception:
+                with self._lock:
+                    del self._ready[path]
+                raise
+            finally:
+                self._initialiser.pop(path, None)
+                ready.set()
+            return self.acquire(path)
+        if not ready.is_set() and self._initialiser.get(path) != threading.get_ident():
+            ready.wait()
+        try:
+            conn = self._connect(path)
+        except Exception:
+            with self._lock:
+                self._open -= 1
+            raise
+        conn.pool_path = path
+        return conn
+
+    def release(self, conn):
+        """Return a connection whose transaction has been committed or rolled back"""
+        with self._lock:
+            self._idle.setdefault(conn.pool_path, []).append(conn)
+            self._idle.move_to_end(conn.pool_path)
+            self._evict()
+
+    def discard(self, path: str):
+        """Close idle connections to a file and forget it (before the file is moved away)"""
+        with self._lock:
+            for conn in self._idle.pop(path, []):
+                conn.close()
+                self._open -= 1
+            self._ready.pop(path, None)
+
+    def close_all(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+                self._open -= len(conns)
+            self._idle.clear()
+            self._ready.clear()
+            self._initialiser.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "open": self._open, "max_open": self.max_open, "files": len(self._idle)}
+
+    def _evict(self):
+        # Connections in use are never closed, so the bound can be exceeded while they're all busy
+        while self._open > self.max_open:
+            victim = next((path for path, conns in self._idle.items() if conns), None)
+            if victim is None:
+                return
+            self._idle[victim].pop(0).close()
+            if not self._idle[victim]:
+                del self._idle[victim]
+            self._open -= 1
+            self.stats["evictions"] += 1
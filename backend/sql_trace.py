@@ -0,0 +1,141 @@
+"""
+SQL timing for Trip Expense Manager
+database.py's cursors time each statement (including fetching its rows) and hand
+the records over here when their get_db block ends. Statements slower than
+SLOW_QUERY_MS go to a JSON-lines slow-query log, and a request sent with
+`X-SQL-Trace: 1` plus the admin token gets a summary of its own statements back
+in the X-SQL-Trace and Server-Timing response headers.
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import metrics
+from auth import verify_admin_token
+
+# Statements at least this slow are logged; 0 turns the slow-query log (and statement timing) off
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "250"))
+# JSON lines are appended here; unset writes them to stderr
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG") or None
+
+# Statements listed individually in the X-SQL-Trace header (the rest only count in the totals)
+TRACE_SLOWEST = 5
+SQL_PREVIEW = 160
+
+# Statements recorded for the current request when it asked for a trace, else None
+_request_trace: "contextvars.ContextVar[Optional[List[Dict[str, Any]]]]" = contextvars.ContextVar(
+    "request_trace", default=None)
+# "METHOD /path" of the request being served, for the slow-query log
+_request: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("request", default=None)
+
+_log_lock = threading.Lock()
+
+slow_queries = metrics.REGISTRY.register(metrics.Counter(
+    "db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS, by database.py function",
+    labels=("function",)))
+
+
+def recording() -> bool:
+    """Whether statements need timing at all (checked before every statement)"""
+    return SLOW_QUERY_MS > 0 or _request_trace.get() is not None
+
+
+def record(sql: str, function: str, seconds: float, rows: int) -> Dict[str, Any]:
+    return {"sql": sql, "function": function, "seconds": seconds, "rows": rows}
+
+
+def flush(records: List[Dict[str, Any]], trip_id: Optional[str] = None):
+    """Finished statements of one get_db block: add them to the request's trace and log the slow ones"""
+    trace = _request_trace.get()
+    if trace is not None:
+        trace.extend(records)
+    if SLOW_QUERY_MS <= 0:
+        return
+    for entry in records:
+        if entry["seconds"] * 1000 >= SLOW_QUERY_MS:
+            slow_queries.inc(entry["function"])
+            log_slow(entry, trip_id)
+
+
+def log_slow(entry: Dict[str, Any], trip_id: Optional[str]):
+    line = json.dumps({
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "event": "slow_query",
+        "ms": round(entry["seconds"] * 1000, 2),
+        "rows": entry["rows"],
+        "function": entry["function"],
+        "request": _request.get(),
+        "trip_id": trip_id,
+        "sql": " ".join(entry["sql"].split()),
+    })
+    with _log_lock:
+        if SLOW_QUERY_LOG:
+            with open(SLOW_QUERY_LOG, "a") as f:
+                f.write(line + "\n")
+        else:
+            print(line, file=sys.stderr)
+
+
+def summarise(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    functions: Dict[str, Dict[str, Any]] = {}
+    for entry in records:
+        stats = functions.setdefault(entry["function"], {"statements": 0, "ms": 0.0, "rows": 0})
+        stats["statements"] += 1
+        stats["ms"] += entry["seconds"] * 1000
+        stats["rows"] += entry["rows"]
+    for stats in functions.values():
+        stats["ms"] = round(stats["ms"], 2)
+    slowest = sorted(records, key=lambda entry: entry["seconds"], reverse=True)[:TRACE_SLOWEST]
+    return {
+        "statements": len(records),
+        "ms": round(sum(entry["seconds"] for entry in records) * 1000, 2),
+        "functions": functions,
+        "slowest": [{"function": entry["function"], "ms": round(entry["seconds"] * 1000, 2), "rows": entry["rows"],
+                     "sql": " ".join(entry["sql"].split())[:SQL_PREVIEW]} for entry in slowest],
+    }
+
+
+class SQLTraceMiddleware:
+    """Name the request for the slow-query log and answer X-SQL-Trace requests with their statement timings"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_token = _request.set(f"{scope['method']} {scope['path']}")
+        headers = Headers(scope=scope)
+        # Statement text carries no parameter values, but table layout is still only for admins
+        if headers.get("x-sql-trace") != "1" or not verify_admin_token(headers.get("x-admin-token")):
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _request.reset(request_token)
+            return
+
+        trace: List[Dict[str, Any]] = []
+        trace_token = _request_trace.set(trace)
+
+        async def send_with_trace(message: Message):
+            if message["type"] == "http.response.start":
+                summary = summarise(trace)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-sql-trace", json.dumps(summary, separators=(",", ":")).encode("latin-1")),
+                    (b"server-timing", f'db;dur={summary["ms"]};desc="{summary["statements"]} statements"'.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            _request_trace.reset(trace_token)
+            _request.reset(request_token)
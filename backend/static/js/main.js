@@ -1,30 +1,30 @@
-import { apiCall, setTripId } from './client_api.js';
+import { apiCall, setTripId, API_BASE } from './client_api.js';
 import * as Store from './store.js';
+import { syncTrip } from './sync.js';
 import * as Renderers from './renderers.js';
 import * as UI from './ui.js';
 import { isAdmin, logout, setToken, validateToken, applyAuthRestrictions, verifyStoredToken } from './auth.js';
 
 async function loadData(type = 'all') {
     try {
-        if (type === 'all' || type === 'settings') {
-            const settings = await apiCall('/settings');
-            Store.setSettings(settings);
+        // Pull only the rows that changed since the last load
+        const changed = await syncTrip();
+        const wants = (key) => type === 'all' || type === key || changed.has(key);
+
+        if (wants('settings')) {
+            const settings = Store.store.settings;
             document.getElementById('tripName').textContent = settings.trip_name;
             // Update page title
             document.title = `${settings.trip_name} - Nine Travel`;
             const bufferInput = document.getElementById('bufferRate');
             if (bufferInput) bufferInput.value = settings.default_buffer_rate || 0.25;
         }
-        if (type === 'all' || type === 'participants') {
-            const parts = await apiCall('/participants');
-            Store.setParticipants(parts);
+        if (wants('participants')) {
             Renderers.renderParticipantCheckboxes();
             Renderers.renderParticipantsList();
             Renderers.renderParticipantSelects();
         }
-        if (type === 'all' || type === 'expenses') {
-            const exps = await apiCall('/expenses');
-            Store.setExpenses(exps);
+        if (wants('expenses')) {
             Renderers.renderExpensesTable();
         }
 
@@ -34,22 +34,17 @@ async function loadData(type = 'all') {
             Renderers.renderOverview(data);
         }
         if (type === 'invoices') {
-            const data = await apiCall('/invoices');
-            Renderers.renderInvoicesTab(data);
+            Renderers.renderInvoicesTab({ invoices: Store.store.invoices });
         }
         if (type === 'receipts') {
-            const data = await apiCall('/receipts/');
-            Renderers.renderReceiptsTab(data);
+            Renderers.renderReceiptsTab({ receipts: Store.store.receipts });
         }
         if (type === 'refunds') {
             const data = await apiCall('/refunds/reconciliation');
             Renderers.renderReconciliationTable(data);
         }
         if (type === 'payments') {
-            // Re-fetch expenses to get latest payment status
-            const exps = await apiCall('/expenses');
-            Store.setExpenses(exps);
-            Renderers.renderPaymentsTab(exps);
+            Renderers.renderPaymentsTab(Store.store.expenses);
         }
     } catch (error) {
         console.error('Load Error', error);
@@ -57,6 +52,26 @@ async function loadData(type = 'all') {
     }
 }
 
+/**
+ * Listen for changes made by other organisers and refresh the visible tab.
+ * Bursts of events are coalesced; /sync then downloads only the changed rows.
+ */
+function subscribeToChanges(tripId) {
+    if (!window.EventSource) return;
+
+    let pending = null;
+    const source = new EventSource(`${API_BASE}/events?trip_id=${encodeURIComponent(tripId)}`);
+    source.addEventListener('change', (e) => {
+        const { version } = JSON.parse(e.data);
+        if (version <= Store.store.syncVersion || pending) return;
+        pending = setTimeout(() => {
+            pending = null;
+            const activeTab = document.querySelector('.tab.active')?.dataset.tab || 'expenses';
+            loadData(activeTab);
+        }, 300);
+    });
+}
+
 /**
  * Setup authentication handlers for login modal and logout
  */
@@ -179,6 +194,9 @@ async function initApp(tripId) {
     // Setup auth handlers
     setupAuthHandlers();
 
+    // Live updates from other sessions
+    subscribeToChanges(tripId);
+
     // Share Button Logic
     document.getElementById('shareTripBtn')?.addEventListener('click', () => {
         navigator.clipboard.writeText(window.location.href);
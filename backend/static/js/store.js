@@ -1,8 +1,12 @@
 export const store = {
     participants: [],
     expenses: [],
+    invoices: [],
+    receipts: [],
     actuals: [],
-    settings: {}
+    settings: {},
+    // Trip version of the last /sync response
+    syncVersion: 0
 };
 
 export function setParticipants(data) { store.participants = data; }
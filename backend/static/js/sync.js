@@ -0,0 +1,39 @@
+import { apiCall } from './client_api.js';
+import { store } from './store.js';
+
+// Same orderings as the list endpoints
+const byCreatedDesc = (a, b) => (b.created_at || '').localeCompare(a.created_at || '') || b.id - a.id;
+const COLLECTIONS = {
+    participants: (a, b) => a.name.localeCompare(b.name),
+    expenses: byCreatedDesc,
+    invoices: byCreatedDesc,
+    receipts: byCreatedDesc
+};
+
+/**
+ * Pull rows changed since the last sync into the store.
+ * Returns the set of store keys that changed ('settings', 'participants', ...).
+ */
+export async function syncTrip() {
+    const delta = await apiCall(`/sync?since=${store.syncVersion}`);
+    const changed = new Set();
+
+    if (delta.settings) {
+        store.settings = delta.settings;
+        changed.add('settings');
+    }
+
+    for (const [key, compare] of Object.entries(COLLECTIONS)) {
+        const { upserted, deleted } = delta[key];
+        if (!delta.full && upserted.length === 0 && deleted.length === 0) continue;
+
+        const rows = new Map(delta.full ? [] : store[key].map(row => [row.id, row]));
+        deleted.forEach(id => rows.delete(id));
+        upserted.forEach(row => rows.set(row.id, row));
+        store[key] = [...rows.values()].sort(compare);
+        changed.add(key);
+    }
+
+    store.syncVersion = delta.version;
+    return changed;
+}
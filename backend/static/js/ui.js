@@ -1,6 +1,16 @@
 import { apiCall, API_BASE } from './client_api.js';
 import * as Renderers from './renderers.js';
 import { store } from './store.js';
+import { newRequestKey } from './utils.js';
+
+// One Idempotency-Key per distinct request body, kept until it succeeds
+const pendingKeys = {};
+function requestKey(action, body) {
+    const pending = pendingKeys[action];
+    if (pending && pending.body === body) return pending.key;
+    pendingKeys[action] = { body, key: newRequestKey() };
+    return pendingKeys[action].key;
+}
 
 export function showToast(message, type = 'info') {
     document.querySelectorAll('.toast').forEach(t => t.remove());
@@ -472,10 +482,13 @@ export function setupModals(refreshCallback) {
 
                 if (!name) return;
                 try {
+                    const body = JSON.stringify({ expense_ids: expenseIds });
                     await apiCall(`/invoices/${name}/generate`, {
                         method: 'POST',
-                        body: JSON.stringify({ expense_ids: expenseIds })
+                        headers: { 'Idempotency-Key': requestKey(`invoice:${name}`, body) },
+                        body
                     });
+                    delete pendingKeys[`invoice:${name}`];
                     showToast('Invoice generated!', 'success');
                     createInvoiceModal.classList.remove('show');
                     refreshCallback('invoices');
@@ -527,10 +540,13 @@ export function setupModals(refreshCallback) {
                 if (!name) return;
 
                 try {
+                    const body = JSON.stringify({ payment_method: method, invoice_ids: invoiceIds });
                     await apiCall(`/receipts/${name}/generate`, {
                         method: 'POST',
-                        body: JSON.stringify({ payment_method: method, invoice_ids: invoiceIds })
+                        headers: { 'Idempotency-Key': requestKey(`receipt:${name}`, body) },
+                        body
                     });
+                    delete pendingKeys[`receipt:${name}`];
                     showToast('Receipt generated!', 'success');
                     createReceiptModal.classList.remove('show');
                     refreshCallback('receipts');
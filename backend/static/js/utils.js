@@ -4,6 +4,12 @@ export function formatCurrency(amount, currency) {
     return `${symbol}${amount.toLocaleString()}`;
 }
 
+// Sent as Idempotency-Key so a repeated click or retry can't create a second document
+export function newRequestKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
 export function formatDate(dateStr) {
     if (!dateStr) return '-';
     return dateStr.split('T')[0];
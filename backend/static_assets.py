@@ -0,0 +1,124 @@
+"""
+Static frontend assets for Trip Expense Manager
+At startup every file under static/ is read once, given a content-hashed URL and
+precompressed. Hashed URLs are served with long-lived immutable cache headers;
+index.html is rewritten to point at them (with an import map for the JS modules'
+relative imports) and kept in memory.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from compression import available_encodings, choose_encoding, compress, is_compressible
+from http_cache import etag_matches
+
+URL_PREFIX = "/static/"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# href/src attributes pointing into /static/, with an optional ?v= style query
+_STATIC_REF = re.compile(r'(href|src)="/static/([^"?#]+)(\?[^"#]*)?"')
+_FIRST_MODULE = re.compile(r'<script type="module"')
+
+mimetypes.add_type("text/javascript", ".js")
+
+
+class Asset:
+    """One file's bytes, precompressed variants and validators"""
+
+    __slots__ = ("body", "media_type", "etag", "encoded")
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.etag = f'W/"{hashlib.sha256(body).hexdigest()[:16]}"'
+        self.encoded: Dict[str, bytes] = {}
+        if is_compressible(media_type):
+            for encoding in available_encodings():
+                # Done once, so use the strongest setting
+                compressed = compress(body, encoding, level=11 if encoding == "br" else 9)
+                if len(compressed) < len(body):
+                    self.encoded[encoding] = compressed
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": cache_control}
+        if self.encoded:
+            headers["Vary"] = "Accept-Encoding"
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and etag_matches(if_none_match, self.etag):
+            return Response(status_code=304, headers=headers)
+
+        body = self.body
+        encoding = choose_encoding(request.headers.get("Accept-Encoding", "")) if self.encoded else None
+        if encoding in self.encoded:
+            body = self.encoded[encoding]
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+def hashed_name(path: str, body: bytes) -> str:
+    """js/main.js -> js/main.<hash>.js"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(body).hexdigest()[:10]}{ext}"
+
+
+class StaticAssets:
+    """In-memory copy of the static directory, keyed by plain and hashed path"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.files: Dict[str, Asset] = {}
+        self.hashed: Dict[str, Asset] = {}
+        self.urls: Dict[str, str] = {}  # plain path -> hashed URL
+        self.index: Optional[Asset] = None
+
+        for root, _, names in os.walk(directory):
+            for name in sorted(names):
+                full = os.path.join(root, name)
+                path = os.path.relpath(full, directory).replace(os.sep, "/")
+                with open(full, "rb") as f:
+                    body = f.read()
+                media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                asset = Asset(body, media_type)
+                self.files[path] = asset
+                if path != "index.html":
+                    hashed = hashed_name(path, body)
+                    self.hashed[hashed] = asset
+                    self.urls[path] = URL_PREFIX + hashed
+
+        if "index.html" in self.files:
+            self.index = Asset(self.render_index(self.files["index.html"].body.decode("utf-8")).encode("utf-8"),
+                               "text/html; charset=utf-8")
+
+    def render_index(self, html: str) -> str:
+        """Point asset references at hashed URLs and map module imports onto them"""
+        def replace(match):
+            url = self.urls.get(match.group(2))
+            return f'{match.group(1)}="{url}"' if url else match.group(0)
+
+        html = _STATIC_REF.sub(replace, html)
+        imports = {URL_PREFIX + path: url for path, url in self.urls.items() if path.endswith(".js")}
+        if imports:
+            # Relative imports inside the modules resolve to plain URLs; the map redirects them
+            import_map = f'<script type="importmap">{json.dumps({"imports": imports})}</script>\n    '
+            html = _FIRST_MODULE.sub(lambda m: import_map + m.group(0), html, count=1)
+        return html
+
+    def serve(self, path: str, request: Request) -> Response:
+        asset = self.hashed.get(path)
+        if asset is not None:
+            return asset.response(request, IMMUTABLE)
+        asset = self.files.get(path)
+        if asset is not None:
+            # Plain URLs still work (old pages, browsers without import maps) but must revalidate
+            return asset.response(request, REVALIDATE)
+        return Response("Not Found", status_code=404, media_type="text/plain")
+
+    def serve_index(self, request: Request) -> Response:
+        return self.index.response(request, REVALIDATE)
@@ -0,0 +1,102 @@
+"""
+Unit Tests for cold archival of finished trips
+"""
+import os
+import sqlite3
+import pytest
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+import shards
+
+ADMIN = {"X-Admin-Token": "admin123"}
+
+
+@pytest.fixture
+def trip(make_trip):
+    trip_id, (alice,) = make_trip("Finished Trip")
+    for i in range(3):
+        db.add_expense(trip_id, f"Dinner {i}", 1000, "THB", 1.0, [alice])
+    yield trip_id, alice
+    db._archived.clear()
+    db._shards.close_all()
+
+
+def hot_expense_count(trip_id: str) -> int:
+    conn = sqlite3.connect(db.DATABASE_PATH)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM expenses WHERE trip_id = ?", (trip_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+class TestArchive:
+
+    def test_archived_trip_stays_readable_but_refuses_writes(self, trip, client):
+        trip_id, alice = trip
+        headers = {"X-Trip-ID": trip_id}
+        before = client.get("/api/expenses", headers=headers).json()
+
+        result = client.post(f"/api/trips/{trip_id}/archive", headers=ADMIN).json()
+        assert result["archive_bytes"] < result["raw_bytes"]
+        assert hot_expense_count(trip_id) == 0
+        assert client.get("/api/expenses", headers=headers).json() == before
+        assert client.get(f"/api/expenses/{before[0]['id']}", headers=headers).json()['name'] == before[0]['name']
+        assert client.get(f"/api/trips/{trip_id}").json()['archived_at']
+
+        created = client.post("/api/expenses", headers=headers, json={
+            "name": "Late", "amount": 1, "currency": "THB", "buffer_rate": 1.0, "participant_ids": [alice]})
+        assert created.status_code == 409
+
+        dashboard = client.get("/api/trips/admin/dashboard", headers=ADMIN).json()
+        assert dashboard[0]['expense_count'] == 3
+
+    def test_unarchive_restores_rows(self, trip, client):
+        trip_id, alice = trip
+        db.archive_trip(trip_id)
+        assert client.post(f"/api/trips/{trip_id}/archive", headers=ADMIN).status_code == 409
+
+        client.post(f"/api/trips/{trip_id}/unarchive", headers=ADMIN).raise_for_status()
+        assert hot_expense_count(trip_id) == 3
+        assert not db.get_trip(trip_id)['archived_at']
+        assert db.search(trip_id, "Dinner")
+        db.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+        assert len(db.get_all_expenses(trip_id)) == 4
+        assert not os.listdir(os.path.join(os.path.dirname(db.DATABASE_PATH), "archive"))
+
+    def test_sharded_trip_archive_round_trip(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "test.db"))
+        monkeypatch.setattr(db, "SHARDED", True)
+        db.init_db()
+        try:
+            trip_id = db.create_trip("Sharded")
+            db.add_participant(trip_id, "Alice")
+            shard = shards.shard_path(db.DATABASE_PATH, trip_id)
+            db.archive_trip(trip_id)
+            assert not os.path.exists(shard)
+            assert [p['name'] for p in db.get_all_participants(trip_id)] == ["Alice"]
+            db.unarchive_trip(trip_id)
+            assert os.path.exists(shard)
+            db.add_participant(trip_id, "Bob")
+            assert db.get_admin_dashboard_stats()[0]['participant_count'] == 2
+        finally:
+            db._archived.clear()
+            db._shards.close_all()
+
+    def test_decompressed_archives_are_bounded(self, trip, monkeypatch):
+        monkeypatch.setattr(db._archives, "max_open", 1)
+        other = db.create_trip("Other")
+        db.add_participant(other, "Bob")
+        db.archive_trip(trip[0])
+        db.archive_trip(other)
+        for trip_id in (trip[0], other, trip[0]):
+            assert db.get_all_participants(trip_id)
+        assert db.archive_stats()["open"] == 1
+        assert db.archive_stats()["evictions"] >= 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,78 @@
+"""
+Unit Tests for the async database layer
+"""
+import asyncio
+import contextvars
+import threading
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+from async_db import adb, run_db
+
+
+class TestAsyncDb:
+
+    def test_mirrors_database_functions_off_the_loop(self, trip):
+        trip_id, alice = trip
+
+        async def scenario():
+            expense_id = await adb.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+            expenses, participants = await asyncio.gather(
+                adb.get_all_expenses(trip_id), adb.get_all_participants(trip_id))
+            return expense_id, expenses, participants
+
+        expense_id, expenses, participants = asyncio.run(scenario())
+        assert [e['id'] for e in expenses] == [expense_id]
+        assert [p['name'] for p in participants] == ["Alice"]
+        with pytest.raises(AttributeError):
+            adb._bump_version
+
+    def test_run_db_uses_worker_thread_and_keeps_context(self):
+        request_id = contextvars.ContextVar("request_id")
+
+        def work():
+            return threading.current_thread().name, request_id.get()
+
+        async def scenario():
+            request_id.set("req-1")
+            return await run_db(work)
+
+        thread_name, value = asyncio.run(scenario())
+        assert thread_name.startswith("db") and value == "req-1"
+
+    def test_async_routes(self, trip):
+        from fastapi.testclient import TestClient
+        from main import app
+        trip_id, alice = trip
+        client = TestClient(app, headers={"X-Trip-ID": trip_id})
+        created = client.post("/api/expenses", json={
+            "name": "Sushi", "amount": 4000, "currency": "JPY", "buffer_rate": 0.25, "participant_ids": [alice]
+        })
+        assert created.status_code == 200
+        assert [e['name'] for e in client.get("/api/expenses").json()] == ["Sushi"]
+        assert client.get("/api/sync").json()["expenses"]["upserted"][0]["collected_thb"] == 1000
+
+    def test_expense_list_is_encoded_off_the_loop(self, trip, monkeypatch):
+        from fastapi.testclient import TestClient
+        from main import app
+        import routes.expenses
+        trip_id, alice = trip
+        db.add_expense(trip_id, "Ramen", 1200, "JPY", 0.25, [alice])
+        threads = []
+        dumps = routes.expenses.dumps
+        monkeypatch.setattr(routes.expenses, "dumps", lambda content: threads.append(
+            threading.current_thread().name) or dumps(content))
+
+        response = TestClient(app, headers={"X-Trip-ID": trip_id}).get("/api/expenses")
+        assert response.headers["content-type"] == "application/json"
+        assert response.json()[0]["collected_thb"] == 300
+        assert threads and threads[0].startswith("db")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
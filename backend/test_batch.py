@@ -0,0 +1,86 @@
+"""
+Unit Tests for batch expense mutations
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+
+
+@pytest.fixture
+def trip(make_trip):
+    trip_id, (alice, bob) = make_trip("Batch Trip", ("Alice", "Bob"))
+    return trip_id, alice, bob
+
+
+def expense(name, amount, participant_ids, currency="THB", buffer_rate=1.0):
+    return {"name": name, "amount": amount, "currency": currency,
+            "buffer_rate": buffer_rate, "participant_ids": participant_ids}
+
+
+class TestApplyExpenseBatch:
+
+    def test_batch_matches_single_writes(self, trip):
+        trip_id, alice, bob = trip
+        keep = db.add_expense(trip_id, "Hotel", 3000, "THB", 1.0, [alice, bob])
+        drop = db.add_expense(trip_id, "Old taxi", 200, "THB", 1.0, [bob])
+        db.log_expense_payment(drop, "2025-01-01", "Cash", 200, "THB", 200)
+
+        created = db.apply_expense_batch(
+            trip_id,
+            creates=[expense("Sushi", 4000, [alice, bob], "JPY", 0.25), expense("Bus", 60, [bob])],
+            updates=[dict(expense("Hotel room", 3300, [alice]), id=keep)],
+            deletes=[drop]
+        )
+        assert len(created) == 2 and created == sorted(created)
+
+        names = {e['id']: (e['name'], e['category'], e['participant_ids']) for e in db.get_all_expenses(trip_id)}
+        assert names == {
+            created[0]: ("Sushi", "Food", [alice, bob]),
+            created[1]: ("Bus", "Transport", [bob]),
+            keep: ("Hotel room", "Accommodation", [alice]),
+        }
+        assert db.verify_balance_ledger(trip_id) == []
+        assert db.get_cash_flow_stats(trip_id)['labels'] == []
+        actions = [(e['action'], e['entity_id']) for e in db.get_journal_events(trip_id)[-4:]]
+        assert actions == [("deleted", drop), ("updated", keep), ("created", created[0]), ("created", created[1])]
+
+    def test_invoiced_delete_rolls_back_everything(self, trip):
+        trip_id, alice, _ = trip
+        invoiced = db.add_expense(trip_id, "Hotel", 3000, "THB", 1.0, [alice])
+        db.create_invoice(trip_id, alice, 0, 3000, "", [invoiced])
+
+        with pytest.raises(ValueError):
+            db.apply_expense_batch(trip_id, creates=[expense("Taxi", 100, [alice])], updates=[], deletes=[invoiced])
+        assert [e['name'] for e in db.get_all_expenses(trip_id)] == ["Hotel"]
+
+
+class TestBatchEndpoint:
+
+    def test_returns_created_rows(self, trip, trip_client):
+        _, alice, bob = trip
+        response = trip_client.post("/api/expenses/batch", json={
+            "create": [expense("Dinner", 1200, [alice, bob]), expense("Museum", 500, [alice])]
+        })
+        assert response.status_code == 200
+        body = response.json()
+        assert [e['name'] for e in body['created']] == ["Dinner", "Museum"]
+        assert body['created'][0]['per_person_thb'] == 600
+
+    def test_validates_whole_batch_first(self, trip, trip_client):
+        trip_id, alice, _ = trip
+        response = trip_client.post("/api/expenses/batch", json={
+            "create": [expense("Fine", 100, [alice]), expense("Nobody", 100, []), expense("Ghost", 100, [9999])],
+            "delete": [12345]
+        })
+        assert response.status_code == 400
+        assert [(e['op'], e['index']) for e in response.json()['detail']] == [("create", 1), ("create", 2), ("delete", 0)]
+        assert db.get_all_expenses(trip_id) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
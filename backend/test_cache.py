@@ -0,0 +1,107 @@
+"""
+Unit Tests for the response cache
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+from cache import ResponseCache, response_cache, GLOBAL
+
+
+class Counter:
+    def __init__(self, value=None):
+        self.calls = 0
+        self.value = value
+
+    def __call__(self):
+        self.calls += 1
+        return self.value if self.value is not None else self.calls
+
+
+class TestResponseCache:
+
+    def test_hit_miss_and_invalidation(self):
+        cache = ResponseCache(max_entries=10, ttl=60)
+        compute = Counter()
+        assert cache.get_or_compute("t1", "overview", (), compute) == 1
+        assert cache.get_or_compute("t1", "overview", (), compute) == 1
+        assert cache.get_or_compute(GLOBAL, "dashboard", (), compute) == 2
+
+        cache.invalidate("t2")  # other trip: only the cross-trip entry goes
+        assert cache.get_or_compute("t1", "overview", (), compute) == 1
+        assert cache.get_or_compute(GLOBAL, "dashboard", (), compute) == 3
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["invalidations"]) == (2, 3, 1)
+
+    def test_value_computed_across_a_write_is_not_stored(self):
+        cache = ResponseCache(max_entries=10, ttl=60)
+
+        def racing():
+            cache.invalidate("t1")
+            return "stale"
+
+        assert cache.get_or_compute("t1", "overview", (), racing) == "stale"
+        assert cache.get_or_compute("t1", "overview", (), lambda: "fresh") == "fresh"
+
+    def test_lru_eviction_and_ttl(self):
+        cache = ResponseCache(max_entries=2, ttl=60)
+        for trip_id in ("a", "b", "a", "c"):
+            cache.get_or_compute(trip_id, "overview", (), lambda: trip_id)
+        assert cache.stats()["evictions"] == 1
+        assert cache.get_or_compute("a", "overview", (), lambda: "again") == "a"
+        assert cache.get_or_compute("b", "overview", (), lambda: "again") == "again"
+
+        expired = ResponseCache(max_entries=2, ttl=0)
+        compute = Counter()
+        expired.get_or_compute("a", "overview", (), compute)
+        assert expired.get_or_compute("a", "overview", (), compute) == 2
+
+    def test_disk_layer_checks_trip_version(self, trip, tmp_path):
+        trip_id, alice = trip
+        path = str(tmp_path / "cache.db")
+        compute = Counter({"total": 1})
+        ResponseCache(ttl=60, path=path).get_or_compute(trip_id, "overview", (), compute)
+
+        # A fresh process reads the stored value while the trip is unchanged
+        restarted = ResponseCache(ttl=60, path=path)
+        assert restarted.get_or_compute(trip_id, "overview", (), compute) == {"total": 1}
+        assert compute.calls == 1 and restarted.stats()["disk_hits"] == 1
+
+        db.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+        ResponseCache(ttl=60, path=path).get_or_compute(trip_id, "overview", (), compute)
+        assert compute.calls == 2
+
+
+class TestCachedRoutes:
+
+    def test_overview_reflects_committed_writes(self, trip):
+        from fastapi.testclient import TestClient
+        from main import app
+        trip_id, alice = trip
+        client = TestClient(app, headers={"X-Trip-ID": trip_id})
+
+        before = response_cache.stats()["hits"]
+        assert client.get("/api/refunds/reconciliation").json()[0]["total_collected"] == 0
+        client.get("/api/refunds/reconciliation")
+        assert response_cache.stats()["hits"] == before + 1
+
+        db.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+        assert client.get("/api/refunds/reconciliation").json()[0]["total_collected"] == 300
+        assert len(client.get("/api/invoices/overview/all").json()["invoices"]) == 0
+
+    def test_stats_require_admin_token(self, trip):
+        from fastapi.testclient import TestClient
+        from main import app
+        client = TestClient(app)
+        assert client.get("/api/trips/admin/cache").status_code == 401
+        stats = client.get("/api/trips/admin/cache", headers={"X-Admin-Token": "admin123"}).json()
+        assert "hit_ratio" in stats
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,85 @@
+"""
+Unit Tests for the daily cash flow rollup
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+
+
+@pytest.fixture
+def trip(make_trip):
+    trip_id, (alice, bob) = make_trip("Cash Flow Trip", ("Alice", "Bob"))
+    return trip_id, alice, bob
+
+
+def rollup_rows(trip_id):
+    with db.get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM daily_cash_flow WHERE trip_id = ? ORDER BY day", (trip_id,))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def assert_rollup_matches_rebuild(trip_id):
+    incremental = rollup_rows(trip_id)
+    db.rebuild_daily_cash_flow(trip_id)
+    rebuilt = rollup_rows(trip_id)
+    assert len(incremental) == len(rebuilt)
+    for a, b in zip(incremental, rebuilt):
+        assert a['day'] == b['day']
+        assert a['inflow_count'] == b['inflow_count'] and a['outflow_count'] == b['outflow_count']
+        assert abs(a['inflow'] - b['inflow']) < 0.001 and abs(a['outflow'] - b['outflow']) < 0.001
+
+
+class TestDailyCashFlow:
+
+    def test_cumulative_series(self, trip):
+        trip_id, alice, bob = trip
+        e1 = db.add_expense(trip_id, "Hotel", 1000, "THB", 1.0, [alice, bob])
+        e2 = db.add_expense(trip_id, "Train", 400, "THB", 1.0, [alice, bob])
+        db.log_expense_payment(e1, "2025-01-01", "Card", 1000, "THB", 1000)
+        db.log_expense_payment(e2, "2025-01-03", "Card", 400, "THB", 400)
+        with db.get_db() as conn:
+            conn.execute(
+                "INSERT INTO daily_cash_flow (trip_id, day, inflow, inflow_count) VALUES (?, '2025-01-02', 1500, 1)",
+                (trip_id,)
+            )
+
+        stats = db.get_cash_flow_stats(trip_id)
+        assert stats['labels'] == ["2025-01-01", "2025-01-02", "2025-01-03"]
+        assert stats['inflow'] == [0, 1500, 0]
+        assert stats['outflow'] == [1000, 0, 400]
+        assert stats['cumulative'] == [-1000, 500, 100]
+        assert stats['net_position'] == 100
+
+    def test_rollup_tracks_writes(self, trip):
+        trip_id, alice, bob = trip
+        e1 = db.add_expense(trip_id, "Hotel", 1000, "THB", 1.0, [alice, bob])
+        db.log_expense_payment(e1, "2025-01-01", "Card", 1000, "THB", 990)
+        # Re-logging moves the outflow to the new day
+        db.log_expense_payment(e1, "2025-01-02", "Card", 1000, "THB", 980)
+        assert_rollup_matches_rebuild(trip_id)
+
+        invoice_id = db.create_invoice(trip_id, alice, 0, 500, "", [e1])
+        receipt_id = db.create_receipt(trip_id, alice, 0, 500, "Cash", "", [invoice_id])
+        assert_rollup_matches_rebuild(trip_id)
+
+        db.delete_receipt(receipt_id)
+        db.update_expense_status(e1, "pending")
+        assert rollup_rows(trip_id) == []
+
+    def test_participant_delete_removes_receipt_inflow(self, trip):
+        trip_id, alice, _ = trip
+        e1 = db.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+        invoice_id = db.create_invoice(trip_id, alice, 0, 300, "", [e1])
+        db.create_receipt(trip_id, alice, 0, 300, "Cash", "", [invoice_id])
+        db.delete_participant(alice)
+        assert db.get_cash_flow_stats(trip_id)['labels'] == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,101 @@
+"""
+Unit Tests for expense categorisation
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+from categories import CategoryMatcher, DEFAULT_KEYWORDS, DEFAULT_CATEGORY
+
+
+def classify_by_loop(name, keywords):
+    """Reference: the original nested-loop heuristic"""
+    lower_name = name.lower()
+    for cat, words in keywords.items():
+        if any(w in lower_name for w in words):
+            return cat
+    return DEFAULT_CATEGORY
+
+
+class TestCategoryMatcher:
+
+    @pytest.mark.parametrize("name", [
+        "Ramen Ichiran", "Shinkansen Tokyo-Osaka", "Hotel Gracery", "Uniqlo Ginza",
+        "Disney Sea Ticket", "Train to park", "Hotel breakfast", "Parking fee",
+        "Teamlab entry", "Random thing", "", "FAMILY MART snacks", "Booking.com Room",
+    ])
+    def test_matches_original_heuristic(self, name):
+        matcher = CategoryMatcher(DEFAULT_KEYWORDS)
+        assert matcher.classify(name) == classify_by_loop(name, DEFAULT_KEYWORDS)
+
+    def test_category_order_beats_position(self):
+        # "ticket" (Entertainment) appears first but Transport is listed earlier
+        matcher = CategoryMatcher({"Transport": ["train"], "Entertainment": ["ticket"]})
+        assert matcher.classify("Ticket for train") == "Transport"
+
+    def test_overlapping_keywords(self):
+        matcher = CategoryMatcher({"A": ["family mart"], "B": ["mart"], "C": ["amil"]})
+        assert matcher.classify("family mart") == "A"
+        matcher = CategoryMatcher({"A": ["amil"], "B": ["family"]})
+        assert matcher.classify("family") == "A"
+
+
+class TestStoredCategories:
+
+    def test_classified_at_write_time(self, trip):
+        trip_id, alice = trip
+        expense_id = db.add_expense(trip_id, "Sushi dinner", 5000, "JPY", 0.25, [alice])
+        assert db.get_expense_by_id(expense_id)['category'] == "Food"
+
+        db.update_expense(expense_id, "Airport taxi", 5000, "JPY", 0.25, [alice])
+        assert db.get_expense_by_id(expense_id)['category'] == "Transport"
+
+    def test_breakdown_groups_by_category(self, trip):
+        trip_id, alice = trip
+        db.add_expense(trip_id, "Sushi", 4000, "JPY", 0.25, [alice])
+        db.add_expense(trip_id, "Ramen", 2000, "JPY", 0.25, [alice])
+        db.add_expense(trip_id, "Hotel", 10000, "JPY", 0.25, [alice])
+        db.add_expense(trip_id, "Misc", 100, "THB", 1.0, [alice])
+
+        breakdown = db.get_expense_breakdown(trip_id)
+        assert breakdown['labels'] == ["Food", "Accommodation", "General"]
+        assert breakdown['data'] == [1500.0, 2500.0, 100.0]
+
+    def test_custom_keywords_reclassify(self, trip):
+        trip_id, alice = trip
+        expense_id = db.add_expense(trip_id, "Onsen day pass", 1500, "JPY", 0.25, [alice])
+        assert db.get_expense_by_id(expense_id)['category'] == DEFAULT_CATEGORY
+
+        changed = db.set_category_keywords(trip_id, {"Wellness": ["onsen", "spa"], "Food": ["sushi"]})
+        assert changed == 1
+        assert db.get_expense_by_id(expense_id)['category'] == "Wellness"
+        assert db.get_category_keywords(trip_id)['is_default'] is False
+
+        # Resetting falls back to the default table
+        db.set_category_keywords(trip_id, {})
+        assert db.get_expense_by_id(expense_id)['category'] == DEFAULT_CATEGORY
+        assert db.get_category_keywords(trip_id)['is_default'] is True
+
+    def test_backup_restore_keeps_custom_keywords(self, trip):
+        from routes.export import export_database
+        from routes.import_db import restore_backup
+        trip_id, alice = trip
+        keywords = {"Wellness": ["onsen", "spa"], "Food": ["sushi"]}
+        db.set_category_keywords(trip_id, keywords)
+        backup = export_database(x_admin_token="admin123").body
+        db.set_category_keywords(trip_id, {"Other": ["misc"]})
+
+        restore_backup(backup)
+        restored = db.get_category_keywords(trip_id)
+        assert restored['is_default'] is False
+        assert restored['categories'] == keywords
+        expense_id = db.add_expense(trip_id, "Spa visit", 3000, "JPY", 0.25, [alice])
+        assert db.get_expense_by_id(expense_id)['category'] == "Wellness"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,82 @@
+"""
+Unit Tests for response compression and static asset serving
+"""
+import gzip
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+from compression import choose_encoding
+from static_assets import StaticAssets
+
+
+@pytest.fixture
+def trip(make_trip):
+    trip_id, (alice,) = make_trip("Compression Trip")
+    for i in range(40):
+        db.add_expense(trip_id, f"Expense {i}", 100 + i, "THB", 1.0, [alice])
+    return trip_id
+
+
+class TestCompression:
+
+    def test_choose_encoding(self):
+        assert choose_encoding("gzip, deflate") == "gzip"
+        assert choose_encoding("gzip;q=0, deflate") is None
+        assert choose_encoding("") is None
+        assert choose_encoding("*") in ("br", "gzip")
+
+    def test_large_json_is_gzipped(self, client, trip):
+        headers = {"X-Trip-ID": trip, "Accept-Encoding": "gzip"}
+        response = client.get("/api/expenses", headers=headers)
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert len(response.json()) == 40  # httpx decodes transparently
+
+        small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in small.headers
+
+
+class TestStaticAssets:
+
+    def test_hashed_urls_and_import_map(self, tmp_path):
+        (tmp_path / "js").mkdir()
+        (tmp_path / "js" / "main.js").write_text("import { x } from './util.js';\n" * 50)
+        (tmp_path / "js" / "util.js").write_text("export const x = 1;\n")
+        (tmp_path / "index.html").write_text(
+            '<link href="/static/missing.css?v=2">\n<script type="module" src="/static/js/main.js"></script>')
+        assets = StaticAssets(str(tmp_path))
+
+        main_url = assets.urls["js/main.js"]
+        assert main_url.startswith("/static/js/main.") and main_url != "/static/js/main.js"
+        index = assets.index.body.decode()
+        assert f'src="{main_url}"' in index
+        assert '"/static/js/util.js": "' + assets.urls["js/util.js"] in index
+        assert index.index("importmap") < index.index('type="module"')
+        assert 'href="/static/missing.css?v=2"' in index
+        assert gzip.decompress(assets.files["js/main.js"].encoded["gzip"]) == assets.files["js/main.js"].body
+
+    def test_served_with_cache_headers(self, client):
+        from main import static_assets
+        url = static_assets.urls["styles.css"]
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert "immutable" in response.headers["Cache-Control"]
+        assert response.headers["Content-Encoding"] == "gzip"
+
+        plain = client.get("/static/styles.css")
+        assert plain.headers["Cache-Control"] == "no-cache"
+        assert plain.content == response.content
+
+        index = client.get("/t/some-trip")
+        assert url in index.text
+        assert client.get("/", headers={"If-None-Match": index.headers["ETag"]}).status_code == 304
+        assert client.get("/static/nope.js").status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,73 @@
+"""
+Unit Tests for the single-writer queue
+"""
+import threading
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+
+
+class TestSingleWriter:
+
+    def test_writes_run_on_the_writer_thread(self, trip):
+        trip_id, alice = trip
+        seen = []
+        original = db.add_expense.__wrapped__
+
+        def spy(*args, **kwargs):
+            seen.append(threading.current_thread().name)
+            return original(*args, **kwargs)
+
+        assert db._writer.call(spy, trip_id, "Taxi", 300, "THB", 1.0, [alice])
+        assert seen == ["db-writer"]
+        assert [e['name'] for e in db.get_all_expenses(trip_id)] == ["Taxi"]
+
+    def test_failing_operation_does_not_spoil_its_group(self, trip):
+        trip_id, alice = trip
+
+        def add_then_fail():
+            db.add_expense(trip_id, "Ghost", 100, "THB", 1.0, [alice])  # inline on the writer thread
+            raise ValueError("boom")
+
+        # Hold the queue so all three operations land in the same transaction
+        gate = threading.Event()
+        blocker = db._writer.submit(gate.wait)
+        ok = db._writer.submit(db.add_expense.__wrapped__, trip_id, "Taxi", 300, "THB", 1.0, [alice])
+        bad = db._writer.submit(add_then_fail)
+        also_ok = db._writer.submit(db.add_participant.__wrapped__, trip_id, "Bob")
+        before = db._writer.stats["transactions"]
+        gate.set()
+
+        expense_id = ok.result(timeout=5)
+        assert also_ok.result(timeout=5)
+        assert isinstance(bad.exception(timeout=5), ValueError)
+        blocker.result(timeout=5)
+        assert db._writer.stats["transactions"] - before <= 2
+        assert [e['id'] for e in db.get_all_expenses(trip_id)] == [expense_id]
+        assert db.verify_balance_ledger(trip_id) == []
+
+    def test_concurrent_writes_are_published_after_commit(self, trip):
+        trip_id, alice = trip
+        published = []
+        listener = lambda t, change: published.append(change["version"])
+        db.add_change_listener(listener)
+        try:
+            threads = [threading.Thread(target=db.add_expense, args=(trip_id, f"E{i}", 100, "THB", 1.0, [alice]))
+                       for i in range(20)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            db.remove_change_listener(listener)
+        assert len(db.get_all_expenses(trip_id)) == 20
+        assert published and max(published) == db.get_trip_version(trip_id)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
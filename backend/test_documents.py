@@ -0,0 +1,101 @@
+"""
+Unit Tests for single-transaction invoice and receipt issuance
+"""
+import pytest
+import sys
+import os
+import threading
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+
+
+@pytest.fixture
+def trip(make_trip):
+    trip_id, (alice,) = make_trip("Documents Trip")
+    expense_id = db.add_expense(trip_id, "Sushi", 4000, "JPY", 0.25, [alice])
+    return trip_id, alice, expense_id
+
+
+class TestDocumentIssuance:
+
+    def test_invoice_is_numbered_as_it_is_created(self, trip):
+        trip_id, alice, expense_id = trip
+        preview = db.get_next_global_invoice_id()
+        changes = []
+        listener = lambda t, change: changes.append(change)
+        db.add_change_listener(listener)
+        try:
+            invoice_id = db.issue_invoice(trip_id, alice, 1000, [expense_id])
+        finally:
+            db.remove_change_listener(listener)
+        assert invoice_id == preview
+        assert [inv['version'] for inv in db.get_previous_invoices(alice)] == [invoice_id]
+        assert db.get_next_global_invoice_id() == invoice_id + 1
+        assert len({c["version"] for c in changes}) == 1  # one commit
+        assert db.verify_balance_ledger(trip_id) == []
+
+    def test_expenses_cannot_be_invoiced_twice(self, trip):
+        trip_id, alice, expense_id = trip
+        db.issue_invoice(trip_id, alice, 1000, [expense_id])
+        with pytest.raises(ValueError):
+            db.issue_invoice(trip_id, alice, 1000, [expense_id])
+        assert len(db.get_previous_invoices(alice)) == 1
+        # Another participant's share of the same expense is billed separately
+        bob = db.add_participant(trip_id, "Bob")
+        db.issue_invoice(trip_id, bob, 500, [expense_id])
+
+    def test_receipt_number_matches_preview(self, trip):
+        trip_id, alice, expense_id = trip
+        invoice_id = db.issue_invoice(trip_id, alice, 1000, [expense_id])
+        preview = db.get_next_global_receipt_id()
+        receipt_id = db.issue_receipt(trip_id, alice, 1000, "Cash", [invoice_id])
+        assert receipt_id == preview
+        assert [r['receipt_number'] for r in db.get_previous_receipts(alice)] == [receipt_id]
+        with pytest.raises(ValueError):
+            db.issue_receipt(trip_id, alice, 1000, "Cash", [invoice_id])
+
+
+@pytest.mark.parametrize("mode", [{"SHARDED": True}, {"SINGLE_WRITER": False}])
+def test_concurrent_issuers_get_distinct_numbers(tmp_path, monkeypatch, mode):
+    """Without the single writer, each issue has to take the write lock before numbering"""
+    monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "test.db"))
+    for name, value in mode.items():
+        monkeypatch.setattr(db, name, value)
+    db.init_db()
+    try:
+        trip_id = db.create_trip("Busy Trip")
+        people = [db.add_participant(trip_id, f"P{i}") for i in range(8)]
+        expense_id = db.add_expense(trip_id, "Boat", 800, "THB", 1.0, people)
+        start = threading.Barrier(len(people))
+        invoices, receipts, errors = [], [], []
+
+        def issue(participant_id):
+            try:
+                start.wait()
+                invoice_id = db.issue_invoice(trip_id, participant_id, 100, [expense_id])
+                invoices.append(invoice_id)
+                receipts.append(db.issue_receipt(trip_id, participant_id, 100, "Cash", [invoice_id]))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=issue, args=(p,)) for p in people]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+        assert sorted(invoices) == list(range(1, 9))
+        assert sorted(receipts) == list(range(1, 9))
+        with db.trip_scope(trip_id):
+            numbers = [inv["version"] for p in people for inv in db.get_previous_invoices(p)]
+        assert sorted(numbers) == sorted(invoices)
+        assert db.verify_balance_ledger(trip_id) == []
+    finally:
+        db._shards.close_all()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,91 @@
+"""
+Unit Tests for change notifications (pub/sub behind the SSE stream)
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+from pubsub import ChangeBroker
+
+
+@pytest.fixture
+def broker():
+    broker = ChangeBroker(queue_size=2)
+    db.add_change_listener(broker.publish)
+    yield broker
+    db.remove_change_listener(broker.publish)
+
+
+class TestChangeNotifications:
+
+    def test_commit_publishes_one_summary(self, trip):
+        trip_id, alice = trip
+        seen = []
+        listener = lambda trip, change: seen.append((trip, change))
+        db.add_change_listener(listener)
+        try:
+            expense_id = db.add_expense(trip_id, "Hotel", 1000, "THB", 1.0, [alice])
+            db.create_invoice(trip_id, alice, 0, 1000, "", [expense_id])
+        finally:
+            db.remove_change_listener(listener)
+
+        assert [t for t, _ in seen] == [trip_id, trip_id]
+        change = seen[1][1]
+        assert change["version"] == db.get_trip_version(trip_id)
+        assert change["upserted"] == {"expense": [expense_id], "invoice": [change["upserted"]["invoice"][0]]}
+
+    def test_rolled_back_writes_are_not_published(self, trip):
+        trip_id, alice = trip
+        expense_id = db.add_expense(trip_id, "Hotel", 1000, "THB", 1.0, [alice])
+        db.create_invoice(trip_id, alice, 0, 1000, "", [expense_id])
+        seen = []
+        listener = lambda trip, change: seen.append(change)
+        db.add_change_listener(listener)
+        try:
+            with pytest.raises(ValueError):
+                db.delete_expense(expense_id)
+        finally:
+            db.remove_change_listener(listener)
+        assert seen == []
+
+    def test_subscribers_receive_writes_from_threads(self, trip, broker):
+        trip_id, alice = trip
+
+        async def scenario():
+            queue = broker.subscribe(trip_id)
+            other = broker.subscribe("another-trip")
+            await asyncio.to_thread(db.add_expense, trip_id, "Taxi", 300, "THB", 1.0, [alice])
+            change = await asyncio.wait_for(queue.get(), timeout=2)
+            assert other.empty()
+            broker.unsubscribe(trip_id, queue)
+            broker.unsubscribe("another-trip", other)
+            return change
+
+        change = asyncio.run(scenario())
+        assert list(change["upserted"]) == ["expense"]
+        assert broker.subscriber_count() == 0
+
+    def test_slow_subscriber_is_told_to_resync(self, trip, broker):
+        trip_id, alice = trip
+
+        async def scenario():
+            queue = broker.subscribe(trip_id)
+            for name in ("A", "B", "C"):
+                await asyncio.to_thread(db.add_expense, trip_id, name, 100, "THB", 1.0, [alice])
+            await asyncio.sleep(0.05)
+            items = []
+            while not queue.empty():
+                items.append(queue.get_nowait())
+            return items
+
+        items = asyncio.run(scenario())
+        assert items[0]["resync"] is True
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,71 @@
+"""
+Unit Tests for the CSV expense importer
+"""
+import io
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+import expense_import
+
+
+@pytest.fixture
+def trip(make_trip):
+    trip_id, (alice, bob) = make_trip("Import Trip", ("Alice", "Bob"))
+    return trip_id, alice, bob
+
+
+def run_import(trip_id, text, **kwargs):
+    return expense_import.import_expenses_csv(trip_id, io.BytesIO(text.encode("utf-8")), **kwargs)
+
+
+class TestExpenseImport:
+
+    def test_imports_valid_rows_and_reports_the_rest(self, trip):
+        trip_id, alice, bob = trip
+        report = run_import(trip_id, (
+            "\ufeffName,Amount,Currency,Buffer_Rate,Participants\n"
+            "Sushi,4000,jpy,,Alice;bob\n"
+            "Hotel,\"3,000\",THB,,\"Alice, Bob\"\n"
+            "\n"
+            ",100,THB,,Alice\n"
+            "Taxi,abc,THB,,Alice\n"
+            "Ferry,500,USD,,Alice\n"
+            "Museum,500,THB,,Carol\n"
+            "Snack,nan,THB,,Alice\n"
+            "Train,800,JPY,inf,Alice\n"
+        ), batch_size=1)
+
+        assert report['total_rows'] == 8
+        assert report['imported'] == 2
+        assert [e['line'] for e in report['errors']] == [5, 6, 7, 8, 9, 10]
+        assert "Carol" in report['errors'][3]['error']
+        assert "buffer_rate" in report['errors'][-1]['error']
+
+        expenses = {e['name']: e for e in db.get_all_expenses(trip_id)}
+        assert expenses['Sushi']['currency'] == "JPY"
+        assert expenses['Sushi']['buffer_rate'] == 0.25  # trip default for JPY
+        assert expenses['Hotel']['amount'] == 3000
+        assert sorted(expenses['Hotel']['participant_ids']) == [alice, bob]
+        assert db.verify_balance_ledger(trip_id) == []
+
+    def test_dry_run_writes_nothing(self, trip):
+        trip_id, _, _ = trip
+        report = run_import(trip_id, "name,amount,currency,participants\nSushi,4000,JPY,Alice\n", dry_run=True)
+        assert report['imported'] == 1 and report['dry_run'] is True
+        assert db.get_all_expenses(trip_id) == []
+
+    def test_missing_columns_rejected(self, trip):
+        trip_id, _, _ = trip
+        with pytest.raises(expense_import.ImportFormatError):
+            run_import(trip_id, "name,amount\nSushi,4000\n")
+        with pytest.raises(expense_import.ImportFormatError):
+            run_import(trip_id, "")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
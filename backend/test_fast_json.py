@@ -0,0 +1,49 @@
+"""
+Unit Tests for the fast JSON response path
+"""
+import json
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+import fast_json
+from routes.expenses import calculate_expense_amounts
+from schemas import ExpenseResponse
+
+
+@pytest.fixture
+def trip(make_trip):
+    trip_id, (alice, bob) = make_trip("JSON Trip", ("Alice", "Bob"))
+    expense_id = db.add_expense(trip_id, "Sushi", 4000, "JPY", 0.25, [alice, bob])
+    db.log_expense_payment(expense_id, "2025-01-10", "Cash", 4000, "JPY", 1000)
+    db.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+    return trip_id
+
+
+class TestFastJson:
+
+    def test_projection_matches_response_model(self, trip):
+        rows = [calculate_expense_amounts(e) for e in db.get_all_expenses(trip)]
+        expected = [ExpenseResponse(**r).model_dump(mode="json") for r in rows]
+        assert json.loads(fast_json.dumps(fast_json.project(rows, ExpenseResponse))) == expected
+
+    def test_stdlib_fallback(self, monkeypatch):
+        content = {"name": "寿司", "amount": 1.5, "ids": {1, 2}}
+        fast = json.loads(fast_json.dumps(content))
+        monkeypatch.setattr(fast_json, "orjson", None)
+        assert json.loads(fast_json.dumps(content)) == fast
+
+    def test_list_endpoint_drops_internal_columns(self, trip):
+        from fastapi.testclient import TestClient
+        from main import app
+        expenses = TestClient(app).get("/api/expenses", headers={"X-Trip-ID": trip}).json()
+        assert {e["name"] for e in expenses} == {"Sushi", "Taxi"}
+        assert all(set(e) == set(ExpenseResponse.model_fields) for e in expenses)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
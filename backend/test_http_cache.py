@@ -0,0 +1,78 @@
+"""
+Unit Tests for ETag / conditional GET handling
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+from http_cache import etag_matches, is_etag_path
+
+
+class TestETagHelpers:
+
+    def test_weak_comparison(self):
+        assert etag_matches('W/"a.1.x"', 'W/"a.1.x"')
+        assert etag_matches('"a.1.x"', 'W/"a.1.x"')
+        assert etag_matches('W/"old", W/"a.1.x"', 'W/"a.1.x"')
+        assert etag_matches('*', 'W/"a.1.x"')
+        assert not etag_matches('W/"a.2.x"', 'W/"a.1.x"')
+
+    def test_paths(self):
+        assert is_etag_path("/api/expenses")
+        assert is_etag_path("/api/invoices/overview/all")
+        assert not is_etag_path("/api/invoices/download/3")
+        assert not is_etag_path("/api/refunds/Alice/pdf/download")
+        assert not is_etag_path("/api/events")
+        assert not is_etag_path("/api/invoices/Alice")  # preview embeds the time
+        assert is_etag_path("/api/invoices/Alice/history")
+        assert is_etag_path("/api/receipts/")
+
+
+class TestConditionalGet:
+
+    def test_not_modified_until_a_write(self, trip, trip_client):
+        trip_id, alice = trip
+        first = trip_client.get("/api/expenses")
+        etag = first.headers["ETag"]
+        assert etag.startswith('W/"')
+
+        cached = trip_client.get("/api/expenses", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+        db.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+        fresh = trip_client.get("/api/expenses", headers={"If-None-Match": etag})
+        assert fresh.status_code == 200
+        assert fresh.headers["ETag"] != etag
+        assert [e["name"] for e in fresh.json()] == ["Taxi"]
+
+    def test_category_keywords_change_the_version(self, trip, trip_client):
+        trip_id, _ = trip
+        etag = trip_client.get("/api/settings/categories").headers["ETag"]
+        db.set_category_keywords(trip_id, {"Wellness": ["onsen"]})
+        response = trip_client.get("/api/settings/categories", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert "Wellness" in response.json()["categories"]
+
+    def test_etag_is_per_trip(self, trip, trip_client):
+        other = db.create_trip("Other")
+        etag = trip_client.get("/api/participants").headers["ETag"]
+        response = trip_client.get("/api/participants", headers={"If-None-Match": etag, "X-Trip-ID": other})
+        assert response.status_code == 200
+
+    def test_version_lookup_runs_off_the_event_loop(self, trip, trip_client, monkeypatch):
+        import threading
+        threads = []
+        get_trip_version = db.get_trip_version
+        monkeypatch.setattr(db, "get_trip_version", lambda trip_id: threads.append(
+            threading.current_thread().name) or get_trip_version(trip_id))
+        trip_client.get("/api/participants")
+        assert threads and threads[0].startswith("db")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,82 @@
+"""
+Unit Tests for Idempotency-Key handling on invoice and receipt generation
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+
+
+@pytest.fixture
+def trip(make_trip):
+    trip_id, (alice,) = make_trip("Idempotent Trip")
+    db.add_expense(trip_id, "Sushi", 4000, "JPY", 0.25, [alice])
+    return trip_id, alice
+
+
+class TestIdempotency:
+
+    def test_retried_invoice_is_created_once(self, trip, trip_client):
+        trip_id, alice = trip
+        first = trip_client.post("/api/invoices/Alice/generate", json={}, headers={"Idempotency-Key": "k1"})
+        retry = trip_client.post("/api/invoices/Alice/generate", json={}, headers={"Idempotency-Key": "k1"})
+        assert first.status_code == retry.status_code == 200
+        assert retry.json() == first.json()
+        assert retry.headers.get("Idempotent-Replayed") == "true"
+        assert len(db.get_previous_invoices(alice)) == 1
+
+        reused = trip_client.post("/api/invoices/Alice/generate", json={"expense_ids": [1]}, headers={"Idempotency-Key": "k1"})
+        assert reused.status_code == 422
+
+    def test_failed_request_can_be_retried_with_the_same_key(self, trip, trip_client):
+        trip_id, alice = trip
+        trip_client.post("/api/invoices/Alice/generate", json={})
+        failed = trip_client.post("/api/invoices/Alice/generate", json={}, headers={"Idempotency-Key": "k2"})
+        assert failed.status_code == 400  # nothing left to invoice
+
+        db.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+        retried = trip_client.post("/api/invoices/Alice/generate", json={}, headers={"Idempotency-Key": "k2"})
+        assert retried.status_code == 200
+        assert "Idempotent-Replayed" not in retried.headers
+
+    def test_receipt_replay_and_in_progress(self, trip, trip_client):
+        trip_id, alice = trip
+        invoice_id = trip_client.post("/api/invoices/Alice/generate", json={}).json()["invoice_id"]
+        body = {"payment_method": "Cash", "invoice_ids": [invoice_id]}
+        first = trip_client.post("/api/receipts/Alice/generate", json=body, headers={"Idempotency-Key": "r1"})
+        retry = trip_client.post("/api/receipts/Alice/generate", json=body, headers={"Idempotency-Key": "r1"})
+        assert retry.json()["receipt_id"] == first.json()["receipt_id"]
+        assert len(db.get_previous_receipts(alice)) == 1
+
+        assert db.claim_idempotency_key("s", "busy", "f", 60, 60) is None
+        assert db.claim_idempotency_key("s", "busy", "f", 60, 60)["response"] is None
+
+    def test_response_commits_with_the_document(self, trip, trip_client, monkeypatch):
+        import idempotency
+        trip_id, alice = trip
+
+        def die(*args):
+            raise RuntimeError("process died after the invoice committed")
+        monkeypatch.setattr(db, "complete_idempotency_key", die)
+        first = trip_client.post("/api/invoices/Alice/generate", json={}, headers={"Idempotency-Key": "k3"})
+        assert first.status_code == 200
+
+        # Even once the lease is over, the retry replays instead of issuing a second invoice
+        monkeypatch.setattr(idempotency, "IDEMPOTENCY_LEASE", 0)
+        db.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+        retry = trip_client.post("/api/invoices/Alice/generate", json={}, headers={"Idempotency-Key": "k3"})
+        assert retry.headers.get("Idempotent-Replayed") == "true"
+        assert retry.json() == first.json()
+        assert len(db.get_previous_invoices(alice)) == 1
+
+    def test_expired_keys_are_purged(self, trip):
+        db.claim_idempotency_key("s", "old", "f", -1, 60)
+        assert db.claim_idempotency_key("s", "old", "f", 60, 60) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
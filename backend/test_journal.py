@@ -0,0 +1,136 @@
+"""
+Unit Tests for the mutation journal and its projections
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+import projections
+
+
+@pytest.fixture
+def trip(make_trip):
+    """Fresh database with a trip, two participants and some activity"""
+    trip_id, (alice, bob) = make_trip("Journal Trip", ("Alice", "Bob"))
+
+    hotel = db.add_expense(trip_id, "Hotel", 40000, "JPY", 0.25, [alice, bob])
+    db.add_expense(trip_id, "Dinner", 1200, "THB", 1.0, [alice, bob])
+    db.log_expense_payment(hotel, "2025-01-10", "Card", 40000, "JPY", 9200)
+    invoice_id = db.create_invoice(trip_id, alice, 0, 5600, "", [hotel])
+    db.update_invoice_pdf(invoice_id, "", invoice_id)
+    db.create_receipt(trip_id, alice, 0, 5600, "Cash", "", [invoice_id])
+    return trip_id, alice, bob
+
+
+def assert_projections_match_tables(trip_id):
+    assert projections.get_projection(trip_id, "overview_stats") == db.get_overview_stats(trip_id)
+    assert projections.get_projection(trip_id, "cash_flow") == db.get_cash_flow_stats(trip_id)
+
+    ledger = [
+        {k: round(v, 2) if isinstance(v, float) else v for k, v in row.items()}
+        for row in db.get_participant_balances(trip_id)
+    ]
+    assert projections.get_projection(trip_id, "balances") == ledger
+
+
+class TestJournal:
+
+    def test_every_mutation_is_journaled(self, trip):
+        trip_id, _, _ = trip
+        actions = [(e['entity'], e['action']) for e in db.get_journal_events(trip_id)]
+        assert actions == [
+            ("trip", "created"),
+            ("participant", "created"),
+            ("participant", "created"),
+            ("expense", "created"),
+            ("expense", "created"),
+            ("expense", "paid"),
+            ("invoice", "created"),
+            ("invoice", "updated"),
+            ("receipt", "created"),
+        ]
+
+    def test_projections_match_tables(self, trip):
+        trip_id, alice, bob = trip
+        assert_projections_match_tables(trip_id)
+
+        # Incremental fold from the stored checkpoint picks up later mutations
+        receipt = db.get_previous_receipts(alice)[0]
+        db.delete_receipt(receipt['id'])
+        db.add_expense(trip_id, "Taxi", 900, "THB", 1.0, [bob])
+        assert_projections_match_tables(trip_id)
+
+        # Reads fold past the checkpoint without storing anything
+        assert db.get_projection_checkpoint(trip_id, "balances") is None
+        assert sorted(projections.advance_checkpoints(trip_id, every=1)) == sorted(projections.PROJECTIONS)
+        checkpoint = db.get_projection_checkpoint(trip_id, "balances")
+        assert checkpoint['seq'] == db.get_journal_events(trip_id)[-1]['seq']
+        assert_projections_match_tables(trip_id)
+
+    def test_commits_advance_checkpoints(self, trip, monkeypatch):
+        trip_id, alice, bob = trip
+        monkeypatch.setattr(projections, "CHECKPOINT_EVERY", 3)
+        db.add_expense(trip_id, "Taxi", 900, "THB", 1.0, [bob])
+        checkpoint = db.get_projection_checkpoint(trip_id, "balances")
+        assert checkpoint['seq'] == db.get_journal_events(trip_id)[-1]['seq']
+
+        # Under the threshold the checkpoint stays put and reads fold the rest
+        db.add_expense(trip_id, "Snack", 100, "THB", 1.0, [alice])
+        assert db.get_projection_checkpoint(trip_id, "balances")['seq'] == checkpoint['seq']
+        assert_projections_match_tables(trip_id)
+
+    def test_participant_delete_cascades(self, trip):
+        trip_id, alice, _ = trip
+        db.delete_receipt(db.get_previous_receipts(alice)[0]['id'])
+        db.delete_participant(alice)
+        assert_projections_match_tables(trip_id)
+
+    def test_historical_view(self, trip):
+        trip_id, alice, _ = trip
+        with db.get_db() as conn:
+            conn.execute("UPDATE journal SET created_at = '2025-01-01 09:00:00' WHERE trip_id = ?", (trip_id,))
+
+        before = projections.get_projection(trip_id, "balances")
+        db.delete_receipt(db.get_previous_receipts(alice)[0]['id'])
+
+        assert projections.get_projection(trip_id, "balances", as_of="2025-01-01") == before
+        assert projections.get_projection(trip_id, "balances", as_of="2024-12-31") == []
+        current = {r['participant_name']: r for r in projections.get_projection(trip_id, "balances")}
+        assert current["Alice"]["paid_thb"] == 0
+
+    def test_snapshots_bound_historical_folds(self, trip, monkeypatch):
+        trip_id, alice, bob = trip
+        monkeypatch.setattr(projections, "SNAPSHOT_INTERVAL", 3)
+        monkeypatch.setattr(projections, "CHECKPOINT_EVERY", 1)
+        for i in range(5):
+            db.add_expense(trip_id, f"Snack {i}", 100, "THB", 1.0, [alice, bob])
+
+        events = db.get_journal_events(trip_id)
+        snapshot = db.get_projection_snapshot(trip_id, "balances", events[-1]['seq'])
+        assert snapshot is not None
+
+    def test_reseeding_reproduces_state(self, trip):
+        trip_id, _, _ = trip
+        db.reset_journal()
+        assert_projections_match_tables(trip_id)
+
+    def test_backup_restore_keeps_the_journal(self, trip):
+        from routes.export import export_database
+        from routes.import_db import restore_backup
+        trip_id, alice, bob = trip
+        taxi = db.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+        db.update_expense(taxi, "Taxi", 450, "THB", 1.0, [alice, bob])
+        before = db.get_journal_events(trip_id)
+
+        restore_backup(export_database(x_admin_token="admin123").body)
+        # Restored as recorded, not re-seeded from the rows (which would drop the update)
+        assert db.get_journal_events(trip_id) == before
+        assert_projections_match_tables(trip_id)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
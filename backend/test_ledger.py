@@ -0,0 +1,103 @@
+"""
+Unit Tests for the participant balance ledger
+Checks that write functions keep participant_balances in sync with the raw tables
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+from routes.refunds import calculate_participant_refund, get_reconciliation
+
+
+@pytest.fixture
+def trip(make_trip):
+    """Fresh database with one trip and three participants"""
+    return make_trip("Ledger Trip", ("Alice", "Bob", "Carol"))
+
+
+def assert_ledger_matches_refunds(trip_id):
+    """Every ledger row must agree with the detailed refund calculation"""
+    for row in db.get_participant_balances(trip_id):
+        detail = calculate_participant_refund(trip_id, row['participant_id'], row['participant_name'])
+        assert round(row['collected_thb'], 2) == detail.total_collected
+        assert round(row['actual_thb'], 2) == detail.total_actual
+    assert db.verify_balance_ledger(trip_id) == []
+
+
+class TestBalanceLedger:
+
+    def test_new_participant_has_zero_row(self, trip):
+        trip_id, ids = trip
+        balances = db.get_participant_balances(trip_id)
+        assert [b['participant_name'] for b in balances] == ["Alice", "Bob", "Carol"]
+        assert all(b['collected_thb'] == 0 for b in balances)
+
+    def test_expense_lifecycle(self, trip):
+        trip_id, (alice, bob, carol) = trip
+        hotel = db.add_expense(trip_id, "Hotel", 30000, "JPY", 0.25, [alice, bob, carol])
+        db.add_expense(trip_id, "Dinner", 900, "THB", 1.0, [alice, bob])
+        assert_ledger_matches_refunds(trip_id)
+
+        db.update_expense(hotel, "Hotel", 30000, "JPY", 0.25, [alice, bob])
+        assert_ledger_matches_refunds(trip_id)
+
+        db.log_expense_payment(hotel, "2025-01-10", "Card", 30000, "JPY", 6900)
+        assert_ledger_matches_refunds(trip_id)
+
+        db.delete_expense(hotel)
+        assert_ledger_matches_refunds(trip_id)
+
+    def test_invoice_and_receipt_totals(self, trip):
+        trip_id, (alice, bob, _) = trip
+        expense_id = db.add_expense(trip_id, "Train", 1000, "THB", 1.0, [alice, bob])
+        invoice_id = db.create_invoice(trip_id, alice, 0, 500, "", [expense_id])
+        receipt_id = db.create_receipt(trip_id, alice, 0, 500, "Cash", "", [invoice_id])
+
+        row = next(b for b in db.get_participant_balances(trip_id) if b['participant_id'] == alice)
+        assert row['invoiced_thb'] == 500
+        assert row['paid_thb'] == 500
+
+        db.delete_receipt(receipt_id)
+        db.delete_invoice(invoice_id)
+        row = next(b for b in db.get_participant_balances(trip_id) if b['participant_id'] == alice)
+        assert row['invoiced_thb'] == 0
+        assert row['paid_thb'] == 0
+
+    def test_deleting_participant_updates_co_participants(self, trip):
+        trip_id, (alice, bob, carol) = trip
+        db.add_expense(trip_id, "Taxi", 900, "THB", 1.0, [alice, bob, carol])
+        db.delete_participant(carol)
+        assert_ledger_matches_refunds(trip_id)
+
+    def test_reconciliation_reads_ledger(self, trip):
+        trip_id, (alice, bob, _) = trip
+        expense_id = db.add_expense(trip_id, "Lift Pass", 35000, "JPY", 0.3, [alice, bob])
+        db.log_expense_payment(expense_id, "2025-01-11", "Cash", 35000, "JPY", 8400)
+
+        items = {item.participant_name: item for item in get_reconciliation(trip_id)}
+        assert items["Alice"].total_collected == 5250.0
+        assert items["Alice"].total_actual == 4200.0
+        assert items["Alice"].surplus_deficit == 1050.0
+        assert items["Carol"].total_collected == 0.0
+
+    def test_verify_detects_and_rebuild_repairs(self, trip):
+        trip_id, (alice, bob, _) = trip
+        db.add_expense(trip_id, "Museum", 400, "THB", 1.0, [alice, bob])
+        with db.get_db() as conn:
+            conn.execute("UPDATE participant_balances SET collected_thb = 999 WHERE participant_id = ?", (alice,))
+
+        mismatches = db.verify_balance_ledger(trip_id)
+        assert len(mismatches) == 1
+        assert mismatches[0]['participant_id'] == alice
+        assert 'collected_thb' in mismatches[0]['differences']
+
+        assert db.rebuild_balance_ledger(trip_id) == 3
+        assert db.verify_balance_ledger(trip_id) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,74 @@
+"""
+Unit Tests for the Prometheus metrics endpoint
+"""
+import os
+import pytest
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+import metrics
+
+
+def sample(text: str, line_start: str) -> float:
+    return next(float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(line_start))
+
+
+class TestMetrics:
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram("demo_seconds", "Demo", labels=("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, '/say "hi"')
+        lines = list(histogram.render())
+        assert lines[:3] == [
+            'demo_seconds_bucket{route="/say \\"hi\\"",le="0.1"} 1',
+            'demo_seconds_bucket{route="/say \\"hi\\"",le="1"} 3',
+            'demo_seconds_bucket{route="/say \\"hi\\"",le="+Inf"} 4',
+        ]
+        assert lines[-1] == 'demo_seconds_count{route="/say \\"hi\\""} 4'
+
+    def test_requests_are_labelled_by_route_template(self, trip):
+        from fastapi.testclient import TestClient
+        from main import app
+        trip_id, alice = trip
+        client = TestClient(app)
+        headers = {"X-Trip-ID": trip_id}
+        before = metrics.http_request_duration.count("GET", "/api/refunds/{participant_name}", "200")
+        client.get("/api/refunds/Alice", headers=headers)
+        etag = client.get("/api/expenses", headers=headers).headers["etag"]
+        client.get("/api/expenses", headers={**headers, "If-None-Match": etag})
+        client.get("/no/such/page")
+
+        assert metrics.http_request_duration.count("GET", "/api/refunds/{participant_name}", "200") == before + 1
+        # Answered by the ETag middleware before routing, still filed under its route
+        assert metrics.http_request_duration.count("GET", "/api/expenses", "304") >= 1
+        assert metrics.http_request_duration.count("GET", "unmatched", "404") >= 1
+
+        response = client.get("/metrics")
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert sample(response.text, 'db_function_duration_seconds_count{function="get_all_expenses"}') >= 1
+        assert sample(response.text, "db_connections_open") >= 0
+        assert "response_cache_hit_ratio" in response.text
+
+    def test_writes_count_their_statements_against_the_function(self, trip):
+        trip_id, alice = trip
+        before = metrics.db_queries.value("add_expense")
+        db.add_expense(trip_id, "Dinner", 100, "THB", 1.0, [alice])
+        # The statements run on the writer thread, but still belong to add_expense
+        assert metrics.db_queries.value("add_expense") > before
+
+    def test_pdf_renders_are_timed_by_document(self):
+        from pdf_generator import pdf_generator
+        from schemas import ReceiptData
+        before = metrics.pdf_render_duration.count("receipt")
+        pdf_generator.generate_receipt_pdf(ReceiptData(
+            participant_name="Alice", receipt_number=1, generated_at="2025-01-01", trip_name="Trip",
+            items=[], total_paid=0), "Trip")
+        assert metrics.pdf_render_duration.count("receipt") == before + 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
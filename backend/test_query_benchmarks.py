@@ -0,0 +1,44 @@
+"""
+Query regression benchmarks (opt-in: QUERY_BENCHMARKS=1)
+
+Times each database.py read function and fails if it got slower than the stored
+baseline allows, or its plan started scanning a table in full. Scales come from
+QUERY_BENCHMARK_SCALES (default "1000"); see benchmarks/queries.py.
+"""
+import os
+import pytest
+import sys
+
+# Add backend and benchmarks to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+import database as db
+import queries
+
+SCALES = [int(s) for s in os.environ.get("QUERY_BENCHMARK_SCALES", "1000").split()]
+
+pytestmark = pytest.mark.skipif(os.environ.get("QUERY_BENCHMARKS") != "1",
+                                reason="query benchmarks run with QUERY_BENCHMARKS=1")
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    original = db.DATABASE_PATH
+    data_dir = os.environ.get("QUERY_BENCHMARK_DATA") or str(tmp_path_factory.mktemp("queries"))
+    try:
+        yield lambda scale: queries.open_or_seed(data_dir, scale, 1000)
+    finally:
+        db.DATABASE_PATH = original
+
+
+@pytest.mark.parametrize("scale", SCALES)
+@pytest.mark.parametrize("name", sorted(queries.QUERIES))
+def test_query_within_baseline(seeded, scale, name):
+    ids = seeded(scale)
+    results = queries.run_scale(ids, rounds=10, names=[name])
+    assert queries.regressions(scale, results, queries.load_baseline(), tolerance=2.0) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
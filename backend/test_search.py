@@ -0,0 +1,82 @@
+"""
+Unit Tests for full-text search
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+
+
+@pytest.fixture
+def trips(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "test.db"))
+    db.init_db()
+    trip_a = db.create_trip("Trip A")
+    trip_b = db.create_trip("Trip B")
+    alice = db.add_participant(trip_a, "Alice")
+    db.add_participant(trip_b, "Alan")
+    return trip_a, trip_b, alice
+
+
+def titles(results):
+    return [(r['entity'], r['title']) for r in results]
+
+
+class TestSearch:
+
+    @pytest.mark.skipif(not db.FTS_AVAILABLE, reason="SQLite built without FTS5")
+    def test_prefix_match_scoped_to_trip(self, trips):
+        trip_a, trip_b, alice = trips
+        db.add_expense(trip_a, "Shinkansen to Osaka", 14000, "JPY", 0.25, [alice])
+        db.add_expense(trip_a, "Sushi dinner", 8000, "JPY", 0.25, [alice])
+
+        assert titles(db.search(trip_a, "shin")) == [("expense", "Shinkansen to Osaka")]
+        assert titles(db.search(trip_a, "al")) == [("participant", "Alice")]
+        assert titles(db.search(trip_b, "al")) == [("participant", "Alan")]
+        assert db.search(trip_b, "sushi") == []
+
+    @pytest.mark.skipif(not db.FTS_AVAILABLE, reason="SQLite built without FTS5")
+    def test_index_follows_writes(self, trips):
+        trip_a, _, alice = trips
+        expense_id = db.add_expense(trip_a, "Ramen", 1200, "JPY", 0.25, [alice])
+        db.update_expense(expense_id, "Udon", 1200, "JPY", 0.25, [alice])
+        assert db.search(trip_a, "ramen") == []
+        assert titles(db.search(trip_a, "udon")) == [("expense", "Udon")]
+
+        invoice_id = db.create_invoice(trip_a, alice, 0, 300, "", [expense_id])
+        db.update_invoice_pdf(invoice_id, "", invoice_id)
+        assert ("invoice", f"Invoice #{invoice_id} Alice") in titles(db.search(trip_a, str(invoice_id)))
+
+        db.delete_invoice(invoice_id)
+        db.delete_expense(expense_id)
+        assert db.search(trip_a, "udon") == []
+        assert db.search(trip_a, str(invoice_id), entities=["invoice"]) == []
+
+    def test_entity_filter_and_quoting(self, trips):
+        trip_a, _, alice = trips
+        db.add_expense(trip_a, 'Alice "special" tour', 500, "THB", 1.0, [alice])
+        assert [r['entity'] for r in db.search(trip_a, "alice", entities=["expense"])] == ["expense"]
+        assert isinstance(db.search(trip_a, 'tour "'), list)  # stray quotes must not raise
+        assert db.search(trip_a, "   ") == []
+
+    @pytest.mark.skipif(not db.FTS_AVAILABLE, reason="SQLite built without FTS5")
+    def test_trip_scoped_index_replaces_old_layout(self, trips):
+        trip_a, _, alice = trips
+        db.add_expense(trip_a, "Ferry", 900, "THB", 1.0, [alice])
+        with db.get_db() as conn:
+            conn.execute("DROP TABLE search_index")
+            conn.execute("""CREATE VIRTUAL TABLE search_index USING fts5(
+                title, trip_id UNINDEXED, entity UNINDEXED, entity_id UNINDEXED)""")
+        db.init_db()
+
+        assert titles(db.search(trip_a, "ferry")) == [("expense", "Ferry")]
+        # The trip id is indexed for scoping only; search terms never match it
+        assert db.search(trip_a, trip_a.split("-")[0]) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
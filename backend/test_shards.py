@@ -0,0 +1,122 @@
+"""
+Unit Tests for database-per-trip (sharded) storage
+"""
+import os
+import pytest
+import uuid
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+import shard_tool
+import shards
+
+ADMIN = {"X-Admin-Token": "admin123"}
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(db, "SHARDED", True)
+    db.init_db()
+    yield tmp_path
+    db._shards.close_all()
+
+
+def seed(name: str, people: int, expenses: int) -> str:
+    trip_id = db.create_trip(name)
+    ids = [db.add_participant(trip_id, f"P{i}") for i in range(people)]
+    for i in range(expenses):
+        db.add_expense(trip_id, f"{name} {i}", 100, "THB", 1.0, ids)
+    return trip_id
+
+
+class TestShardedStorage:
+
+    def test_each_trip_gets_its_own_file_and_catalog_entry(self, sharded):
+        tokyo = seed("Tokyo", 2, 3)
+        osaka = seed("Osaka", 1, 1)
+        assert os.path.exists(shards.shard_path(db.DATABASE_PATH, tokyo))
+        assert os.path.exists(shards.shard_path(db.DATABASE_PATH, osaka))
+        assert [e['name'] for e in db.get_all_expenses(osaka)] == ["Osaka 0"]
+
+        stats = {row['name']: row for row in db.get_admin_dashboard_stats()}
+        assert (stats["Tokyo"]['participant_count'], stats["Tokyo"]['expense_count']) == (2, 3)
+        assert stats["Osaka"]['total_spend'] == 100
+        assert {t['id'] for t in db.list_trips()} == {tokyo, osaka}
+
+    def test_requests_are_routed_by_trip_header(self, sharded):
+        from fastapi.testclient import TestClient
+        from main import app
+        tokyo = seed("Tokyo", 1, 1)
+        osaka = seed("Osaka", 1, 2)
+        client = TestClient(app)
+        # Expense ids restart in every file, so the header decides which row id 1 is
+        assert client.get("/api/expenses/1", headers={"X-Trip-ID": tokyo}).json()['name'] == "Tokyo 0"
+        assert client.get("/api/expenses/1", headers={"X-Trip-ID": osaka}).json()['name'] == "Osaka 0"
+        # Ids with no file are refused instead of reading the catalog
+        assert client.get("/api/expenses", headers={"X-Trip-ID": "../../etc"}).status_code == 404
+        assert client.get("/api/expenses", headers={"X-Trip-ID": str(uuid.uuid4())}).status_code == 404
+        assert client.post("/api/participants", headers={"X-Trip-ID": str(uuid.uuid4())},
+                           json={"name": "Eve"}).status_code == 404
+        with pytest.raises(db.TripNotFoundError):
+            db.get_all_expenses(str(uuid.uuid4()))
+
+    def test_whole_database_backups_are_refused(self, sharded):
+        from fastapi.testclient import TestClient
+        from main import app
+        client = TestClient(app)
+        assert client.get("/api/export/db", headers=ADMIN).status_code == 409
+        backup = {"file": ("backup.zip", b"PK", "application/zip")}
+        assert client.post("/api/import/db", headers=ADMIN, files=backup).status_code == 409
+
+    def test_open_connections_stay_bounded(self, sharded, monkeypatch):
+        monkeypatch.setattr(db._shards, "max_open", 2)
+        trips = [seed(f"Trip {i}", 1, 1) for i in range(4)]
+        for trip_id in trips:
+            db.get_all_expenses(trip_id)
+        assert db.shard_stats()["open"] <= 2
+        assert db.shard_stats()["evictions"] > 0
+
+    def test_maintenance_without_trip_id_covers_every_file(self, sharded):
+        import sqlite3
+        tokyo = seed("Tokyo", 2, 2)
+        osaka = seed("Osaka", 1, 1)
+        assert db.verify_balance_ledger() == []
+        conn = sqlite3.connect(shards.shard_path(db.DATABASE_PATH, osaka))
+        with conn:
+            conn.execute("UPDATE participant_balances SET collected_thb = collected_thb + 50")
+        conn.close()
+
+        mismatches = db.verify_balance_ledger()
+        assert [(m['trip_id'], m['participant_name']) for m in mismatches] == [(osaka, "P0")]
+        assert shard_tool.main(["verify"]) == 1
+        assert shard_tool.main(["rebuild"]) == 0
+        assert db.verify_balance_ledger() == []
+        assert db.rebuild_balance_ledger() == 3  # participants across both files
+
+    def test_split_existing_database(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "test.db"))
+        monkeypatch.setattr(db, "SHARDED", False)
+        db.init_db()
+        tokyo = seed("Tokyo", 2, 2)
+        alice = db.get_all_participants(tokyo)[0]['id']
+        invoice_id = db.issue_invoice(tokyo, alice, 100, [e['id'] for e in db.get_all_expenses(tokyo)])
+        expected = db.get_all_expenses(tokyo)
+        assert db.verify_balance_ledger() == []  # trip_id is optional here
+        try:
+            assert shard_tool.split() == 0
+            assert db.get_all_expenses(tokyo) == expected
+            assert [inv['id'] for inv in db.get_previous_invoices(alice)] == []  # needs the trip scope
+            with db.trip_scope(tokyo):
+                assert [inv['id'] for inv in db.get_previous_invoices(alice)] == [invoice_id]
+            assert db.search(tokyo, "Tokyo")
+            assert db.get_admin_dashboard_stats()[0]['expense_count'] == 2
+        finally:
+            db._shards.close_all()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,70 @@
+"""
+Unit Tests for the slow-query log and per-request SQL traces
+"""
+import json
+import os
+import pytest
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+import sql_trace
+
+ADMIN = {"X-Admin-Token": "admin123"}
+
+
+@pytest.fixture
+def trip(make_trip):
+    trip_id, (alice,) = make_trip("Trace Trip")
+    db.add_expense(trip_id, "Dinner", 100, "THB", 1.0, [alice])
+    db.add_expense(trip_id, "Taxi", 40, "THB", 1.0, [alice])
+    return trip_id, alice
+
+
+class TestSQLTrace:
+
+    def test_slow_statements_are_logged_as_json_lines(self, trip, client, tmp_path, monkeypatch):
+        trip_id, alice = trip
+        log = tmp_path / "slow.log"
+        monkeypatch.setattr(sql_trace, "SLOW_QUERY_MS", 0.0001)
+        monkeypatch.setattr(sql_trace, "SLOW_QUERY_LOG", str(log))
+        client.get("/api/expenses", headers={"X-Trip-ID": trip_id}).raise_for_status()
+
+        entries = [json.loads(line) for line in log.read_text().splitlines()]
+        select = next(e for e in entries if e["function"] == "get_all_expenses" and e["sql"].startswith("SELECT"))
+        assert select["event"] == "slow_query"
+        assert select["request"] == "GET /api/expenses"
+        assert select["trip_id"] == trip_id
+        assert select["rows"] >= 2
+        assert sql_trace.slow_queries.value("get_all_expenses") >= 1
+
+    def test_admin_trace_header_lists_the_request_statements(self, trip, client):
+        trip_id, alice = trip
+        response = client.get("/api/expenses", headers={"X-Trip-ID": trip_id, "X-SQL-Trace": "1", **ADMIN})
+        trace = json.loads(response.headers["x-sql-trace"])
+        assert trace["statements"] >= 1
+        assert trace["functions"]["get_all_expenses"]["rows"] >= 2
+        assert len(trace["slowest"]) <= sql_trace.TRACE_SLOWEST
+        assert response.headers["server-timing"].startswith("db;dur=")
+
+    def test_trace_needs_the_admin_token(self, trip, client):
+        trip_id, alice = trip
+        response = client.get("/api/expenses", headers={"X-Trip-ID": trip_id, "X-SQL-Trace": "1"})
+        assert response.status_code == 200
+        assert "x-sql-trace" not in response.headers
+        assert "server-timing" not in response.headers
+
+    def test_writes_on_the_writer_thread_join_the_trace(self, trip, client):
+        trip_id, alice = trip
+        response = client.post("/api/expenses", headers={"X-Trip-ID": trip_id, "X-SQL-Trace": "1", **ADMIN}, json={
+            "name": "Lunch", "amount": 60, "currency": "THB", "buffer_rate": 1.0, "participant_ids": [alice]})
+        response.raise_for_status()
+        trace = json.loads(response.headers["x-sql-trace"])
+        assert trace["functions"]["add_expense"]["statements"] >= 2
+        assert trace["functions"]["add_expense"]["rows"] >= 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,104 @@
+"""
+Unit Tests for delta sync
+"""
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+
+
+@pytest.fixture
+def trip(make_trip):
+    trip_id, (alice, bob) = make_trip("Sync Trip", ("Alice", "Bob"))
+    return trip_id, alice, bob
+
+
+class TestChangesSince:
+
+    def test_version_is_monotonic_and_per_trip(self, trip):
+        trip_id, alice, _ = trip
+        other = db.create_trip("Other")
+        before = db.get_trip_version(trip_id)
+        db.add_participant(other, "Carol")
+        assert db.get_trip_version(trip_id) == before
+
+        db.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+        assert db.get_trip_version(trip_id) > before
+
+    def test_reports_dependent_rows(self, trip):
+        trip_id, alice, bob = trip
+        expense_id = db.add_expense(trip_id, "Hotel", 1000, "THB", 1.0, [alice, bob])
+        since = db.get_trip_version(trip_id)
+
+        invoice_id = db.create_invoice(trip_id, alice, 0, 500, "", [expense_id])
+        changes = db.get_changes_since(trip_id, since)
+        assert changes["full"] is False
+        assert changes["upserted"]["invoice"] == [invoice_id]
+        assert changes["upserted"]["expense"] == [expense_id]  # now lists the invoice
+
+        since = changes["version"]
+        receipt_id = db.create_receipt(trip_id, alice, 0, 500, "Cash", "", [invoice_id])
+        db.delete_receipt(receipt_id)
+        changes = db.get_changes_since(trip_id, since)
+        assert changes["deleted"]["receipt"] == [receipt_id]
+        assert changes["upserted"]["invoice"] == [invoice_id]  # back to unpaid
+        assert changes["upserted"]["receipt"] == []
+
+    def test_participant_delete_tombstones_cascade(self, trip):
+        trip_id, alice, bob = trip
+        expense_id = db.add_expense(trip_id, "Hotel", 1000, "THB", 1.0, [alice, bob])
+        invoice_id = db.create_invoice(trip_id, alice, 0, 500, "", [expense_id])
+        since = db.get_trip_version(trip_id)
+
+        db.delete_participant(alice)
+        changes = db.get_changes_since(trip_id, since)
+        assert changes["deleted"]["participant"] == [alice]
+        assert changes["deleted"]["invoice"] == [invoice_id]
+        assert changes["upserted"]["expense"] == [expense_id]
+
+    def test_full_refetch_cases(self, trip, monkeypatch):
+        trip_id, alice, _ = trip
+        version = db.get_trip_version(trip_id)
+        assert db.get_changes_since(trip_id, 0)["full"] is True
+        assert db.get_changes_since(trip_id, version + 5)["full"] is True
+
+        monkeypatch.setattr(db, "SYNC_MAX_CHANGES", 2)
+        for name in ("A", "B", "C"):
+            db.add_expense(trip_id, name, 100, "THB", 1.0, [alice])
+        assert db.get_changes_since(trip_id, version)["full"] is True
+
+        current = db.get_trip_version(trip_id)
+        db.reset_sync_versions()
+        assert db.get_changes_since(trip_id, current)["full"] is True
+
+
+class TestSyncEndpoint:
+
+    def test_initial_then_delta(self, trip, trip_client):
+        trip_id, alice, bob = trip
+        db.add_expense(trip_id, "Sushi", 4000, "JPY", 0.25, [alice, bob])
+
+        first = trip_client.get("/api/sync").json()
+        assert first["full"] is True
+        assert first["settings"]["trip_name"] == "Sync Trip"
+        assert [p["name"] for p in first["participants"]["upserted"]] == ["Alice", "Bob"]
+        assert first["expenses"]["upserted"][0]["collected_thb"] == 1000
+
+        idle = trip_client.get(f"/api/sync?since={first['version']}").json()
+        assert idle["version"] == first["version"]
+        assert idle["settings"] is None
+        assert idle["expenses"] == {"upserted": [], "deleted": []}
+
+        db.add_expense(trip_id, "Ramen", 1200, "JPY", 0.25, [bob])
+        delta = trip_client.get(f"/api/sync?since={first['version']}").json()
+        assert delta["full"] is False
+        assert [e["name"] for e in delta["expenses"]["upserted"]] == ["Ramen"]
+        assert delta["participants"]["upserted"] == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
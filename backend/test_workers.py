@@ -0,0 +1,79 @@
+"""
+Unit Tests for cache coherence between worker processes sharing one database
+"""
+import sqlite3
+import time
+import pytest
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+from cache import ResponseCache
+
+
+@pytest.fixture
+def multi_process(monkeypatch):
+    monkeypatch.setattr(db, "MULTI_PROCESS", True)
+
+
+@pytest.fixture
+def trip(multi_process, make_trip):
+    # multi_process comes first, so init_db already sees it
+    trip_id, (alice,) = make_trip("Workers Trip")
+    return trip_id, alice
+
+
+def write_from_another_process(trip_id: str):
+    """What a commit in another worker looks like from here: only the file changes"""
+    conn = sqlite3.connect(db.DATABASE_PATH)
+    with conn:
+        conn.execute("UPDATE participants SET name = 'Alicia' WHERE trip_id = ?", (trip_id,))
+        conn.execute("UPDATE trip_versions SET version = version + 1 WHERE trip_id = ?", (trip_id,))
+    conn.close()
+
+
+class TestWorkerCoherence:
+
+    def test_other_process_commit_advances_known_version(self, trip):
+        trip_id, alice = trip
+        before = db.get_trip_version(trip_id)
+        write_from_another_process(trip_id)
+        assert db.get_trip_version(trip_id) == before + 1
+
+    def test_other_process_commit_invalidates_response_cache(self, trip, monkeypatch):
+        trip_id, alice = trip
+        monkeypatch.setattr(db, "EXTERNAL_POLL_SECONDS", 0.01)
+        cache = ResponseCache(ttl=60)
+        listener = lambda t, change: cache.invalidate(t)
+        db.add_change_listener(listener)
+        try:
+            names = lambda: [p['name'] for p in db.get_all_participants(trip_id)]
+            assert cache.get_or_compute(trip_id, "names", None, names) == ["Alice"]
+            write_from_another_process(trip_id)
+            # Hits only read memory; the watch thread drops the entry once it sees the commit
+            deadline = time.monotonic() + 5
+            while cache.get_or_compute(trip_id, "names", None, names) != ["Alicia"] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert cache.get_or_compute(trip_id, "names", None, names) == ["Alicia"]
+        finally:
+            db.remove_change_listener(listener)
+
+    def test_own_commits_are_not_republished(self, trip):
+        trip_id, alice = trip
+        db.get_trip_version(trip_id)
+        published = []
+        listener = lambda t, change: published.append(change)
+        db.add_change_listener(listener)
+        try:
+            db.add_expense(trip_id, "Taxi", 300, "THB", 1.0, [alice])
+            db.check_external_writes()
+        finally:
+            db.remove_change_listener(listener)
+        assert len(published) == 1 and published[0]["upserted"]["expense"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])